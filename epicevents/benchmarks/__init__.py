@@ -0,0 +1 @@
+""" Package contains load benchmarks of the API, run them from the project directory"""
@@ -0,0 +1,125 @@
+"""
+Compare the concurrent request capacity of the sync (WSGI) and async (ASGI) read paths.
+
+    python -m benchmarks.asgi_vs_wsgi --requests 500 --concurrency 50 --wsgi-threads 8
+
+Both runs use the in-process handlers on a seeded test database:
+- WSGI: django.test.Client requests on a pool of --wsgi-threads threads, the
+  way a threaded WSGI server holds one thread per request in flight.
+- ASGI: django.test.AsyncClient requests on the /api/async/ routes, at most
+  --concurrency in flight on one event loop.
+--query-delay-ms adds a sleep to every SQL query to stand for a remote
+database, which is where holding a thread per request costs capacity.
+Django's async ORM still runs each query through sync_to_async on a single
+thread per event loop, so the ASGI path trades query parallelism for
+connections and threads: compare both at the concurrency you expect.
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import access_token, disable_search_cache, seed, setup_django, summarize, test_database
+
+
+def run_wsgi(path, token, requests, threads):
+    from django.db import connection
+    from django.test import Client
+
+    local = threading.local()
+    latencies = []
+    errors = []
+
+    def fetch(_):
+        if not hasattr(local, 'client'):
+            local.client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+        start = time.perf_counter()
+        response = local.client.get(path)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+    def close(_):
+        connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(fetch, range(requests)))
+        list(executor.map(close, range(threads)))
+    return summarize(latencies, time.perf_counter() - start, len(errors))
+
+
+async def run_asgi(path, token, requests, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def fetch():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path, headers={"Authorization": f"Bearer {token}"})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(fetch() for _ in range(requests)))
+    return summarize(latencies, time.perf_counter() - start, len(errors))
+
+
+def add_query_delay(delay):
+    """ Sleep delay seconds in every SQL query of every new connection"""
+    from django.db.backends.signals import connection_created
+
+    def slow_query(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        if slow_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(slow_query)
+
+    connection_created.connect(install, weak=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resource', choices=['clients', 'contracts', 'events'], default='contracts')
+    parser.add_argument('--query', default='page_size=25', help="query string of the list requests")
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50, help="ASGI requests in flight")
+    parser.add_argument('--wsgi-threads', type=int, default=8, help="WSGI server threads")
+    parser.add_argument('--query-delay-ms', type=float, default=0.0)
+    parser.add_argument('--clients', type=int, default=200, help="seeded clients, 2 contracts and events each")
+    parser.add_argument('--search-cache', action='store_true', help="keep the response cache of the sync path")
+    parser.add_argument('--keepdb', action='store_true')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    settings.ALLOWED_HOSTS = ['*']
+    if not args.search_cache:
+        disable_search_cache()
+    if args.query_delay_ms:
+        add_query_delay(args.query_delay_ms / 1000)
+
+    with test_database(keepdb=args.keepdb):
+        users = seed(clients=args.clients)
+        token = access_token(users["Sales"])
+        results = {
+            "wsgi": run_wsgi(f"/api/{args.resource}/?{args.query}", token, args.requests, args.wsgi_threads),
+            "asgi": asyncio.run(run_asgi(f"/api/async/{args.resource}/?{args.query}", token,
+                                         args.requests, args.concurrency)),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+""" Module contains helpers shared by the benchmarks: test database, data and statistics"""
+
+import contextlib
+import os
+import statistics
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'epicevents.settings')
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database(keepdb=False):
+    """ Run the block against a fresh test database, as the test runner does"""
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from django.db import connection
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+PASSWORD = "bench-password"
+
+
+def seed(clients=200, contracts_per_client=2, random_seed=12):
+    """
+        Seed the database with the seed_epicevents command, one user per role,
+        clients with signed contracts (contracts_per_client on average) and
+        one event per contract, deterministically from random_seed.
+        Return {role name: user}.
+    """
+    from io import StringIO
+    from django.core.management import call_command
+    from usermodel.models import CustomUsers
+
+    call_command('seed_epicevents', clients=clients, management=1, sales=1, support=1, lead_ratio=0,
+                 inactive_ratio=0, contracts_per_client=contracts_per_client, signed_share=1,
+                 events_per_contract=1, seed=random_seed, prefix='bench', password=PASSWORD, stdout=StringIO())
+    return {role_name: CustomUsers.objects.get(username=f"bench_{role_name.lower()}_0")
+            for role_name in ("Management", "Sales", "Support")}
+
+
+def disable_search_cache():
+    """ Serve every search from the database, to measure the queries themselves"""
+    from django.conf import settings
+
+    settings.CACHES['benchmark'] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    settings.SEARCH_CACHE_ALIAS = 'benchmark'
+
+
+def access_token(user):
+    from usermodel.tokens import RoleRefreshToken
+
+    return str(RoleRefreshToken.for_user(user).access_token)
+
+
+def percentile(values, fraction):
+    """ Return the value below which fraction of values fall (nearest rank)"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """ Return the statistics of a run, latencies and elapsed in seconds"""
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
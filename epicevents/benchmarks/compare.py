@@ -0,0 +1,66 @@
+"""
+Compare two benchmarks.suite result files.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+
+Prints the change of every metric per scenario and exits with status 1 when
+a scenario regressed by more than --threshold percent: p95 latency or
+queries per request up, or throughput down.
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'errors')
+# metric: True when a higher value is better
+HIGHER_IS_BETTER = {'throughput_rps': True, 'p95_ms': False, 'queries_per_request': False}
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline, candidate, threshold):
+    """ Return (report lines, regressions) of candidate against baseline"""
+    lines = [f"{'scenario':18} {'metric':20} {'baseline':>10} {'candidate':>10} {'change':>8}"]
+    regressions = []
+    for name, new in candidate['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            lines.append(f"{name:18} (not in baseline)")
+            continue
+        for metric in METRICS:
+            delta = change(old.get(metric), new.get(metric))
+            shown = f"{delta:+.1f}%" if delta is not None else "-"
+            lines.append(f"{name:18} {metric:20} {str(old.get(metric)):>10} {str(new.get(metric)):>10} {shown:>8}")
+            if delta is not None and metric in HIGHER_IS_BETTER:
+                worse = -delta if HIGHER_IS_BETTER[metric] else delta
+                if worse > threshold:
+                    regressions.append(f"{name} {metric} {shown}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help="tolerated regression, in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        baseline = json.load(baseline_file)
+        candidate = json.load(candidate_file)
+
+    lines, regressions = compare(baseline, candidate, args.threshold)
+    print(f"baseline {baseline['meta'].get('commit')}  candidate {candidate['meta'].get('commit')}")
+    print("\n".join(lines))
+    if regressions:
+        print("\nRegressions over {}%:\n  {}".format(args.threshold, "\n  ".join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
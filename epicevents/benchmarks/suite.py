@@ -0,0 +1,262 @@
+"""
+Load test of the main API endpoints, results stored as JSON for benchmarks.compare.
+
+    python -m benchmarks.suite --requests 200 --workers 8 --output benchmarks/results/$(git rev-parse --short HEAD).json
+
+A test database is created and seeded (--clients, --contracts-per-client,
+deterministic with --seed), then each scenario sends --requests requests
+from --workers threads, through the Django test client or, with
+--live-server, over HTTP to a threaded server started in-process.
+Each scenario reports throughput, latency percentiles, errors (non 2xx) and
+SQL queries per request, read from the request metrics.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import PASSWORD, access_token, disable_search_cache, seed, setup_django, summarize, test_database
+
+
+class Scenario:
+    """ A named request builder: request(i) returns (method, path, body) of the i-th request"""
+
+    def __init__(self, name, role, request):
+        self.name = name
+        self.role = role
+        self.request = request
+
+
+def build_scenarios(users, requests, rng):
+    """ Return the scenarios, with the rows the write scenarios consume created up front"""
+    from django.utils import timezone
+    from client.models import Client
+    from contract.models import Contract
+    from event.models import Event
+
+    sales = users["Sales"]
+    client_ids = list(Client.objects.order_by('id').values_list('id', flat=True))
+    company_names = list(Client.objects.order_by('id').values_list('company_name', flat=True))
+
+    # one Open contract per sign request
+    open_contracts = Contract.objects.bulk_create([
+        Contract(client_id=rng.choice(client_ids), sales_contact=sales, amount=500,
+                 payment_due=timezone.now())
+        for _ in range(requests)
+    ])
+    # completed events cannot be reassigned, the seeder dates events in the past year too
+    events = list(Event.objects.filter(event_completed=False).select_related('contract').order_by('id')[:requests])
+    support_id = users["Support"].id
+
+    def login(i):
+        return 'post', '/api/login/', {'username': sales.username, 'password': PASSWORD}
+
+    def clients_list(i):
+        return 'get', '/api/clients/?page_size=25', None
+
+    def contracts_search(i):
+        term = rng.choice(company_names)[:-1]
+        return 'get', f'/api/contracts/?company_name={urllib.request.quote(term)}&page_size=25', None
+
+    def events_list(i):
+        return 'get', '/api/events/?page_size=25&expand=contract', None
+
+    def nested_create(i):
+        body = {'amount': 100 + i, 'payment_due': timezone.now().isoformat()}
+        return 'post', f'/api/clients/{client_ids[i % len(client_ids)]}/contracts/', body
+
+    def sign(i):
+        contract = open_contracts[i]
+        return ('patch', f'/api/clients/{contract.client_id}/contracts/{contract.id}/sign/',
+                {'contract_status': 'Signed'})
+
+    def assign_support(i):
+        event = events[i % len(events)]
+        return ('patch', f'/api/clients/{event.contract.client_id}/contracts/{event.contract_id}'
+                         f'/events/{event.id}/assign-support/', {'support_contact': support_id})
+
+    return [
+        Scenario('login', None, login),
+        Scenario('clients-list', "Sales", clients_list),
+        Scenario('contracts-search', "Sales", contracts_search),
+        Scenario('events-list', "Support", events_list),
+        Scenario('nested-create', "Sales", nested_create),
+        Scenario('sign', "Sales", sign),
+        Scenario('assign-support', "Management", assign_support),
+    ]
+
+
+class TestClientTransport:
+    """ Requests through django.test.Client, one client per worker thread"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def send(self, method, path, body, token):
+        from django.test import Client
+
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client(raise_request_exception=False)
+        send = getattr(self.local.client, method)
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {token}"} if token else {}
+        if body is None:
+            return send(path, **headers).status_code
+        return send(path, json.dumps(body), content_type='application/json', **headers).status_code
+
+
+class HttpTransport:
+    """ Requests over HTTP to base_url"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, method, path, body, token):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method.upper())
+        request.add_header('Content-Type', 'application/json')
+        if token:
+            request.add_header('Authorization', f"Bearer {token}")
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+
+def query_totals():
+    """ Return (SQL queries, requests) recorded by MetricsMiddleware so far"""
+    from epicevents import metrics
+
+    snapshot = metrics.registry.snapshot()
+    entries = snapshot['histograms']['epicevents_request_queries']
+    return sum(entry[2] for entry in entries), sum(entry[3] for entry in entries)
+
+
+def run_scenario(scenario, transport, tokens, requests, workers):
+    from django.db import connection
+
+    token = tokens.get(scenario.role)
+    latencies = []
+    errors = []
+    # built up front so the request building does not count in the latencies
+    calls = [scenario.request(i) for i in range(requests)]
+
+    def send(call):
+        method, path, body = call
+        start = time.perf_counter()
+        status = transport.send(method, path, body, token)
+        latencies.append(time.perf_counter() - start)
+        if not 200 <= status < 300:
+            errors.append(status)
+
+    def close(_):
+        connection.close()
+
+    queries_before, requests_before = query_totals()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(send, calls))
+        list(executor.map(close, range(workers)))
+    result = summarize(latencies, time.perf_counter() - start, len(errors))
+    queries_after, requests_after = query_totals()
+    served = requests_after - requests_before
+    result['queries_per_request'] = round((queries_after - queries_before) / served, 2) if served else None
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_live_server():
+    """ Start a threaded WSGI server on a free port, return (thread, base url)"""
+    from django.contrib.staticfiles.handlers import StaticFilesHandler
+    from django.test.testcases import LiveServerThread
+
+    thread = LiveServerThread('localhost', StaticFilesHandler, port=0)
+    thread.daemon = True
+    thread.start()
+    thread.is_ready.wait()
+    if thread.error:
+        raise thread.error
+    return thread, f"http://localhost:{thread.port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default='all', help="comma separated scenario names")
+    parser.add_argument('--requests', type=int, default=200, help="requests per scenario")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--contracts-per-client', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=12)
+    parser.add_argument('--live-server', action='store_true', help="send the requests over HTTP")
+    parser.add_argument('--search-cache', action='store_true', help="keep the search response cache")
+    parser.add_argument('--output', help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+
+    settings.ALLOWED_HOSTS = ['*']
+    if not args.search_cache:
+        disable_search_cache()
+
+    with test_database():
+        users = seed(clients=args.clients, contracts_per_client=args.contracts_per_client,
+                     random_seed=args.seed)
+        tokens = {role: access_token(user) for role, user in users.items()}
+        scenarios = build_scenarios(users, args.requests, random.Random(args.seed))
+        if args.scenarios != 'all':
+            names = set(args.scenarios.split(','))
+            scenarios = [scenario for scenario in scenarios if scenario.name in names]
+
+        server = None
+        if args.live_server:
+            server, base_url = start_live_server()
+            transport = HttpTransport(base_url)
+        else:
+            transport = TestClientTransport()
+
+        try:
+            results = {}
+            for scenario in scenarios:
+                results[scenario.name] = run_scenario(scenario, transport, tokens, args.requests, args.workers)
+                print(f"{scenario.name:18} {json.dumps(results[scenario.name])}")
+        finally:
+            if server is not None:
+                server.terminate()
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'transport': 'http' if args.live_server else 'test-client',
+                'args': vars(args),
+            },
+            'scenarios': results,
+        }
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+""" Module contains Tombstone Schema"""
+
+from django.db import models
+from django.utils import timezone
+
+
+# Create your models here.
+class Tombstone(models.Model):
+    """ Deletion of a client, contract or event, served by the change feed after the updated rows"""
+
+    model = models.CharField(max_length=50)
+    object_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # keyset order of the change feed
+            models.Index(fields=['model', 'deleted_at', 'id'], name='tombstone_feed_idx'),
+        ]
+
+
+def record_deletion(model, object_id):
+    """ Add the tombstone of the object_id row of model"""
+    return Tombstone.objects.create(model=model._meta.label_lower, object_id=object_id)
@@ -0,0 +1,21 @@
+""" Module contains signal receivers recording the tombstones of deleted rows"""
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from client.models import Client
+from contract.models import Contract
+from event.models import Event
+from .models import record_deletion
+
+
+@receiver(post_delete, sender=Contract)
+@receiver(post_delete, sender=Event)
+def record_tombstone(sender, instance, **kwargs):
+    record_deletion(sender, instance.pk)
+
+
+@receiver(post_delete, sender=Client)
+def record_client_tombstone(sender, instance, **kwargs):
+    # soft-deleted clients got theirs when they were hidden
+    if not instance.is_deleted:
+        record_deletion(sender, instance.pk)
@@ -0,0 +1,123 @@
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from client.models import Client
+from client.purge import purge_client, soft_delete
+from contract.models import Contract
+from epicevents.pagination import encode_cursor
+from epicevents.testing import QueryBudgetTestCase
+from event.models import Event
+from usermodel.models import CustomUsers, Roles
+from usermodel.tokens import RoleRefreshToken
+from .models import Tombstone
+
+
+# Create your tests here.
+class QueryBudgetTest(QueryBudgetTestCase):
+    """ Query budget of the change feeds"""
+
+    routes = [('changes', 'get')]
+    requests = {
+        'changes:get': ("Sales", {'feed': "events"}, None),
+    }
+
+
+@override_settings(CHANGE_FEED_LAG=0)
+class ChangeFeedTest(TestCase):
+    """ GET changes/<feed>/ paging, tombstones and lag"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                                   role=Roles.objects.create(role_name="Sales"))
+        cls.clients = [Client.objects.create(first_name="First", last_name=f"Last{i}", email=f"client{i}@example.com",
+                                             company_name=f"Company {i}", sales_contact=cls.user)
+                       for i in range(5)]
+        cls.contract = Contract.objects.create(client=cls.clients[0], sales_contact=cls.user, amount=100,
+                                               payment_due=timezone.now(), contract_status="Signed")
+        cls.event = Event.objects.create(contract=cls.contract, attendees=10)
+
+    def setUp(self):
+        self.api_client = APIClient()
+        token = RoleRefreshToken.for_user(self.user).access_token
+        self.api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def changes(self, feed, cursor=None, **params):
+        if cursor is not None:
+            params['updated_since'] = cursor
+        response = self.api_client.get(f"/api/changes/{feed}/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def sync(self, feed, cursor=None, limit=2):
+        """ Return (updated ids, deleted ids, cursor) of every page after cursor"""
+        updated, deleted = [], []
+        while True:
+            page = self.changes(feed, cursor, limit=limit)
+            updated += [row['id'] for row in page['results']]
+            deleted += page['deleted']
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                return updated, deleted, cursor
+
+    def test_paging(self):
+        expected = list(Client.objects.order_by('date_updated', 'id').values_list('id', flat=True))
+        page = self.changes('clients', limit=2)
+        self.assertEqual([row['id'] for row in page['results']], expected[:2])
+        self.assertTrue(page['has_more'])
+
+        updated, deleted, cursor = self.sync('clients')
+        self.assertEqual(updated, expected)
+        self.assertEqual(deleted, [])
+        self.assertEqual(self.sync('clients', cursor)[:2], ([], []))
+
+        changed = self.clients[3]
+        changed.company_name = "Renamed"
+        changed.save()
+        self.assertEqual(self.sync('clients', cursor)[:2], ([changed.pk], []))
+
+    def test_iso_datetime(self):
+        since = timezone.now()
+        self.clients[1].save()
+        self.assertEqual(self.sync('clients', since.isoformat())[0], [self.clients[1].pk])
+
+    def test_deleted(self):
+        cursors = {feed: self.sync(feed)[2] for feed in ('contracts', 'events')}
+        contract_id, event_id = self.contract.pk, self.event.pk
+        self.contract.delete()
+        self.assertEqual(self.sync('contracts', cursors['contracts'])[1], [contract_id])
+        # cascaded
+        self.assertEqual(self.sync('events', cursors['events'])[1], [event_id])
+
+    def test_soft_deleted_client(self):
+        cursors = {feed: self.sync(feed)[2] for feed in ('clients', 'contracts', 'events')}
+        deleted_client = self.clients[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            soft_delete(deleted_client)
+        self.assertEqual(self.sync('clients', cursors['clients'])[:2], ([], [deleted_client.pk]))
+        # hidden with the client, not yet deleted
+        self.assertNotIn(self.contract.pk, self.sync('contracts')[0])
+
+        purge_client(deleted_client.pk)
+        self.assertEqual(self.sync('clients', cursors['clients'])[1], [deleted_client.pk])
+        self.assertEqual(self.sync('contracts', cursors['contracts'])[1], [self.contract.pk])
+        self.assertEqual(self.sync('events', cursors['events'])[1], [self.event.pk])
+        self.assertEqual(Tombstone.objects.filter(model='client.client').count(), 1)
+
+    @override_settings(CHANGE_FEED_LAG=60)
+    def test_lag(self):
+        self.contract.delete()
+        self.assertEqual(self.sync('clients')[:2], ([], []))
+        self.assertEqual(self.sync('contracts')[:2], ([], []))
+
+    def test_errors(self):
+        self.assertEqual(self.api_client.get("/api/changes/users/").status_code, 404)
+        self.assertEqual(self.api_client.get("/api/changes/clients/", {'updated_since': "garbage"}).status_code, 400)
+        moment = timezone.now().isoformat()
+        for since in ("2025-13-01T00:00:00", "2025-02-30T00:00:00+00:00",
+                      encode_cursor(["x", 1, None, None]), encode_cursor([moment, "y", None, None]),
+                      encode_cursor([None, None, moment, 2 ** 70]), encode_cursor([moment, None, None, None]),
+                      encode_cursor([[moment], 1, moment, 1])):
+            with self.subTest(since=since):
+                response = self.api_client.get("/api/changes/clients/", {'updated_since': since})
+                self.assertEqual(response.status_code, 400)
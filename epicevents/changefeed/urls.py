@@ -0,0 +1,8 @@
+""" Module contains url endpoints for the change feed"""
+
+from django.urls import path
+from .views import ChangeFeedView
+
+urlpatterns = [
+    path('changes/<str:feed>/', ChangeFeedView.as_view(), name='changes'),
+]
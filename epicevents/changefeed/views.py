@@ -0,0 +1,155 @@
+""" Module contains the change feed view of the clients, contracts and events"""
+
+import datetime
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from client.models import Client
+from client.serializers import ClientSerializer
+from contract.models import Contract
+from contract.serializers import ContractSerializer
+from epicevents.pagination import decode_cursor, encode_cursor, keyset_filter, ordering_values
+from event.models import Event
+from event.serializers import EventSerializer
+from .models import Tombstone
+
+ROW_ORDERING = ('date_updated', 'id')
+TOMBSTONE_ORDERING = ('deleted_at', 'id')
+
+
+def feed_queryset(feed):
+    """ Return (model, rows visible in the feed, serializer class), rows of clients being purged are not"""
+    if feed == 'clients':
+        return Client, Client.objects.all(), ClientSerializer
+    if feed == 'contracts':
+        return Contract, Contract.objects.filter(client__is_deleted=False), ContractSerializer
+    if feed == 'events':
+        return Event, Event.objects.filter(contract__client__is_deleted=False), EventSerializer
+    return None
+
+
+def since_pair(model, ordering, values):
+    """ Return a (moment, id) pair of a cursor converted by the model fields, None when malformed"""
+    if values == [None, None]:
+        # nothing read from that table yet
+        return values
+    return ordering_values(model, ordering, values)
+
+
+def parse_since(value, model):
+    """
+        Return the [date_updated, id, deleted_at, id] position of ?updated_since=,
+        a next_cursor of a previous page or an ISO datetime. None when malformed.
+    """
+    if not value:
+        return [None, None, None, None]
+    values = decode_cursor(value)
+    if values is not None and len(values) == 4:
+        rows = since_pair(model, ROW_ORDERING, values[:2])
+        tombstones = since_pair(Tombstone, TOMBSTONE_ORDERING, values[2:])
+        if rows is None or tombstones is None:
+            return None
+        return rows + tombstones
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        # well formed but out of range, e.g. month 13
+        return None
+    if moment is None:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return [moment, 0, moment, 0]
+
+
+def horizon():
+    """
+        Return the time before which the feed is complete: changes are read
+        up to CHANGE_FEED_LAG seconds ago, and on PostgreSQL up to the start
+        of the oldest transaction still open, whose rows are stamped later
+        than that but not committed yet.
+    """
+    moment = timezone.now() - datetime.timedelta(seconds=settings.CHANGE_FEED_LAG)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT min(xact_start) FROM pg_stat_activity "
+                           "WHERE datname = current_database() AND pid <> pg_backend_pid() "
+                           "AND backend_xid IS NOT NULL")
+            oldest = cursor.fetchone()[0]
+        if oldest is not None:
+            moment = min(moment, oldest)
+    return moment
+
+
+def after(queryset, ordering, values):
+    if values[0] is None:
+        return queryset
+    return queryset.filter(keyset_filter(ordering, values))
+
+
+# Create your views here.
+class ChangeFeedView(APIView):
+    """
+        GET changes/<clients|contracts|events>/?updated_since=<cursor>&limit=
+        Rows updated and ids deleted after the cursor, oldest first:
+        {"results": [...], "deleted": [ids], "next_cursor": ..., "has_more": ...}
+        - Start without updated_since (or with an ISO datetime), then send
+          next_cursor back until has_more is false, and keep it for the
+          next sync.
+        - Rows are read in (date_updated, id) order, tombstones in
+          (deleted_at, id) order, both by index range scans.
+        - date_updated is stamped when a row is saved, not when it is
+          committed, so changes are only served up to horizon(): the last
+          CHANGE_FEED_LAG seconds are held back and, on PostgreSQL, so is
+          everything since the start of the oldest writing transaction.
+          Elsewhere (SQLite) a transaction committing more than
+          CHANGE_FEED_LAG seconds after its writes can land behind a cursor
+          already handed out, its rows are then missed.
+        - Apply results before deleted, a row deleted then created again
+          (another id) is never lost.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, feed):
+        found = feed_queryset(feed)
+        if found is None:
+            return Response({"error": "Unknown feed, expected clients, contracts or events."},
+                            status=status.HTTP_404_NOT_FOUND)
+        model, queryset, serializer_class = found
+
+        position = parse_since(request.query_params.get('updated_since'), model)
+        if position is None:
+            return Response({"error": "updated_since must be a next_cursor or an ISO datetime."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', settings.REST_FRAMEWORK['PAGE_SIZE']))
+        except ValueError:
+            limit = settings.REST_FRAMEWORK['PAGE_SIZE']
+        limit = min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+        complete_until = horizon()
+        rows = list(after(queryset.filter(date_updated__lt=complete_until), ROW_ORDERING, position[:2])
+                    .order_by(*ROW_ORDERING)[:limit + 1])
+        tombstones = list(after(Tombstone.objects.filter(model=model._meta.label_lower, deleted_at__lt=complete_until),
+                                TOMBSTONE_ORDERING, position[2:])
+                          .order_by(*TOMBSTONE_ORDERING).values_list('deleted_at', 'id', 'object_id')[:limit + 1])
+
+        has_more = len(rows) > limit or len(tombstones) > limit
+        rows, tombstones = rows[:limit], tombstones[:limit]
+        if rows:
+            position[:2] = [rows[-1].date_updated, rows[-1].id]
+        if tombstones:
+            position[2:] = list(tombstones[-1][:2])
+
+        return Response({
+            "results": serializer_class(rows, many=True).data,
+            "deleted": [object_id for _, _, object_id in tombstones],
+            "next_cursor": encode_cursor(position),
+            "has_more": has_more,
+        })
@@ -0,0 +1,154 @@
+""" Module contains the maintenance of the per-client contract and event counters"""
+
+import math
+from collections import defaultdict
+from itertools import chain
+from types import SimpleNamespace
+from django.db import transaction
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from contract.models import Contract
+from epicevents.response_cache import invalidate
+from event.models import Event
+from .models import Client
+
+
+def next_event_date(client_ref):
+    """ Subquery of the earliest date of the client's events not completed yet"""
+    return Subquery(Event.objects.filter(contract__client_id=client_ref, event_completed=False)
+                    .order_by().values('contract__client_id')
+                    .annotate(next_date=Min('event_date')).values('next_date'))
+
+
+def invalidate_clients():
+    transaction.on_commit(lambda: invalidate(Client))
+
+
+def contracts_changed(previous, current):
+    """
+        Move contracts from their previous state to current, both lists of
+        contracts (or rows with client_id, contract_status and amount).
+        One UPDATE per client, in client id order so concurrent writers
+        never deadlock.
+    """
+    deltas = defaultdict(lambda: (0, 0.0, 0.0))
+    for contracts, sign in ((previous, -1), (current, 1)):
+        for contract in contracts:
+            count, signed, open_amount = deltas[contract.client_id]
+            if contract.contract_status == 'Signed':
+                signed += sign * contract.amount
+            else:
+                open_amount += sign * contract.amount
+            deltas[contract.client_id] = (count + sign, signed, open_amount)
+
+    now = timezone.now()
+    for client_id in sorted(deltas):
+        count, signed, open_amount = deltas[client_id]
+        if not count and not signed and not open_amount:
+            continue
+        Client.objects.filter(pk=client_id).update(
+            contract_count=F('contract_count') + count, signed_amount=F('signed_amount') + signed,
+            open_amount=F('open_amount') + open_amount, date_updated=now)
+    invalidate_clients()
+
+
+def status_changed(contract, previous_status):
+    """ Move contract out of its previous_status counters, for updates which bypass the signals"""
+    previous = SimpleNamespace(client_id=contract.client_id, contract_status=previous_status,
+                               amount=contract.amount)
+    contracts_changed([previous], [contract])
+
+
+def events_changed(previous, current):
+    """
+        Move events from their previous state to current, both lists of
+        events (or rows with contract_id). The event count moves with F(),
+        the next event date of the clients concerned is computed again.
+        A client whose count and next event date stay the same is not
+        updated, so its date_updated (ETags, change feed) does not move.
+    """
+    contract_ids = {event.contract_id for event in previous} | {event.contract_id for event in current}
+    if not contract_ids:
+        return
+    # contracts already loaded on the events (signing, cascades) need no query
+    client_of = {event.contract_id: event.contract.client_id for event in chain(previous, current)
+                 if isinstance(event, Event) and Event.contract.is_cached(event)}
+    if contract_ids - client_of.keys():
+        client_of.update(Contract.objects.filter(pk__in=contract_ids - client_of.keys())
+                         .values_list('id', 'client_id'))
+
+    deltas = defaultdict(int)
+    for events, sign in ((previous, -1), (current, 1)):
+        for event in events:
+            if event.contract_id in client_of:
+                deltas[client_of[event.contract_id]] += sign
+
+    now = timezone.now()
+    updated = 0
+    for client_id in sorted(deltas):
+        rows = Client.objects.filter(pk=client_id)
+        if not deltas[client_id]:
+            rows = rows.alias(expected=next_event_date(OuterRef('pk'))).exclude(
+                Q(next_event_date=F('expected')) | Q(next_event_date__isnull=True, expected__isnull=True))
+        updated += rows.update(
+            event_count=F('event_count') + deltas[client_id], next_event_date=next_event_date(OuterRef('pk')),
+            date_updated=now)
+    if updated:
+        invalidate_clients()
+
+
+def expected_counters():
+    """ Return the counter annotations computed from the contract and event tables"""
+    contracts = Contract.objects.filter(client_id=OuterRef('pk')).order_by().values('client_id')
+    events = Event.objects.filter(contract__client_id=OuterRef('pk')).order_by().values('contract__client_id')
+    return {
+        'expected_contract_count': Coalesce(Subquery(contracts.annotate(total=Count('id')).values('total')),
+                                            Value(0)),
+        'expected_signed_amount': Coalesce(Subquery(contracts.annotate(
+            total=Sum('amount', filter=Q(contract_status='Signed'))).values('total')), Value(0.0)),
+        'expected_open_amount': Coalesce(Subquery(contracts.annotate(
+            total=Sum('amount', filter=~Q(contract_status='Signed'))).values('total')), Value(0.0)),
+        'expected_event_count': Coalesce(Subquery(events.annotate(total=Count('id')).values('total')), Value(0)),
+        'expected_next_event_date': next_event_date(OuterRef('pk')),
+    }
+
+
+def drifted(row):
+    """ Return True when the stored counters of row differ from the expected ones"""
+    return (row.contract_count != row.expected_contract_count
+            or row.event_count != row.expected_event_count
+            or row.next_event_date != row.expected_next_event_date
+            or not math.isclose(row.signed_amount, row.expected_signed_amount, abs_tol=0.005)
+            or not math.isclose(row.open_amount, row.expected_open_amount, abs_tol=0.005))
+
+
+def reconcile(chunk_size=2000, fix=True, progress=None):
+    """
+        Compare the counters of every client with the contract and event
+        tables, chunk by chunk in id order, and with fix correct the drifted
+        ones. Return (clients checked, clients drifted).
+    """
+    checked = drifted_count = 0
+    last_id = 0
+    while True:
+        rows = list(Client.objects.filter(pk__gt=last_id).order_by('pk')
+                    .annotate(**expected_counters())[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1].pk
+        checked += len(rows)
+        stale = [row for row in rows if drifted(row)]
+        drifted_count += len(stale)
+        if stale and fix:
+            now = timezone.now()
+            with transaction.atomic():
+                for row in stale:
+                    Client.objects.filter(pk=row.pk).update(
+                        contract_count=row.expected_contract_count, signed_amount=row.expected_signed_amount,
+                        open_amount=row.expected_open_amount, event_count=row.expected_event_count,
+                        next_event_date=row.expected_next_event_date, date_updated=now)
+            invalidate_clients()
+        if progress is not None:
+            progress(checked, drifted_count)
+    return checked, drifted_count
@@ -0,0 +1,10 @@
+""" Module contains the background jobs of the client app"""
+
+from jobs.registry import job
+from .purge import purge_client
+
+
+@job('client.purge_client', max_attempts=5)
+def purge_deleted_client(client_id):
+    """ Purge the contracts, events and row of a soft-deleted client"""
+    purge_client(client_id)
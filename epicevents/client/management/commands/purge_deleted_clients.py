@@ -0,0 +1,20 @@
+""" Module contains the purge_deleted_clients command"""
+
+from django.core.management.base import BaseCommand
+from client.models import Client
+from client.purge import purge_client
+
+
+class Command(BaseCommand):
+    help = "Purge the rows of the soft-deleted clients, e.g. when a background purge was cut short"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help="rows deleted per transaction")
+
+    def handle(self, *args, **options):
+        client_ids = list(Client.all_objects.filter(is_deleted=True).order_by('deleted_at')
+                          .values_list('pk', flat=True))
+        for client_id in client_ids:
+            purge_client(client_id, chunk_size=options['chunk_size'])
+            self.stdout.write(f"Client {client_id} purged")
+        self.stdout.write(self.style.SUCCESS(f"{len(client_ids)} deleted clients purged."))
@@ -0,0 +1,22 @@
+""" Module contains the reconcile_client_counters command"""
+
+from django.core.management.base import BaseCommand
+from client.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Check the client counters against the contracts and events tables and correct the drifted ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help="clients compared per query")
+        parser.add_argument('--dry-run', action='store_true', help="only report the drifted clients")
+
+    def handle(self, *args, **options):
+        def progress(checked, drifted):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{checked} clients checked, {drifted} drifted")
+
+        checked, drifted = reconcile(chunk_size=options['chunk_size'], fix=not options['dry_run'],
+                                     progress=progress)
+        action = "found" if options['dry_run'] else "corrected"
+        self.stdout.write(self.style.SUCCESS(f"{checked} clients checked, {drifted} drifted counters {action}."))
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:34
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # GIN trigram indexes serve UPPER(col) LIKE '%term%' (icontains), PostgreSQL only
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS client_company_name_trgm_idx "
+        "ON client_client USING gin (UPPER(company_name::text) gin_trgm_ops)")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS client_email_trgm_idx "
+        "ON client_client USING gin (UPPER(email::text) gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS client_company_name_trgm_idx")
+    schema_editor.execute("DROP INDEX IF EXISTS client_email_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0004_client_updated_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='client_email_upper_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """ Compute the counters of the existing clients"""
+    Client = apps.get_model('client', 'Client')
+    Contract = apps.get_model('contract', 'Contract')
+    Event = apps.get_model('event', 'Event')
+    contracts = Contract.objects.filter(client_id=OuterRef('pk')).order_by().values('client_id')
+    events = Event.objects.filter(contract__client_id=OuterRef('pk')).order_by().values('contract__client_id')
+    Client.objects.update(
+        contract_count=Coalesce(Subquery(contracts.annotate(total=Count('id')).values('total')), Value(0)),
+        signed_amount=Coalesce(Subquery(contracts.annotate(
+            total=Sum('amount', filter=Q(contract_status='Signed'))).values('total')), Value(0.0)),
+        open_amount=Coalesce(Subquery(contracts.annotate(
+            total=Sum('amount', filter=~Q(contract_status='Signed'))).values('total')), Value(0.0)),
+        event_count=Coalesce(Subquery(events.annotate(total=Count('id')).values('total')), Value(0)),
+        next_event_date=Subquery(events.filter(event_completed=False)
+                                 .annotate(next_date=Min('event_date')).values('next_date')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0005_client_search_indexes'),
+        ('contract', '0004_contract_date_indexes'),
+        ('event', '0007_event_signing_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='contract_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='event_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='next_event_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='open_amount',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='signed_amount',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,30 @@
 """ Module contains Client Schema"""
 
 from django.db import models
+from django.db.models.functions import Upper
 from usermodel.models import CustomUsers
 
 
+class ClientQuerySet(models.QuerySet):
+    """ Client queryset class"""
+
+    def filter_for_user(self, user):
+        """ Keep the clients user may edit, same rules as RoleBasedPermission"""
+        if user.is_staff:
+            return self
+        role = getattr(user, 'role', None)
+        if role is not None and role.role_name == "Sales":
+            return self.filter(sales_contact_id=user.id)
+        return self.none()
+
+
+class ClientManager(models.Manager.from_queryset(ClientQuerySet)):
+    """ Default manager, soft-deleted clients are hidden (see purge.py), Client.all_objects has them all"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 # Create your models here.
 class Client(models.Model):
     """ Client model class"""
@@ -13,6 +34,7 @@ class Client(models.Model):
         ('Active', 'Active'),
         ('Inactive', 'Inactive')
     ]
+    COUNTER_FIELDS = ['contract_count', 'signed_amount', 'open_amount', 'event_count', 'next_event_date']
 
     first_name = models.CharField(max_length=25)
     last_name = models.CharField(max_length=30)
@@ -24,5 +46,29 @@ class Client(models.Model):
     date_updated = models.DateTimeField(auto_now=True)
     client_status = models.CharField(max_length=15, choices=CLIENT_STATUS_CHOICES, default='Lead')
 
+    # maintained from the contract and event writes, see counters.py
+    contract_count = models.PositiveIntegerField(default=0)
+    signed_amount = models.FloatField(default=0)
+    open_amount = models.FloatField(default=0)
+    event_count = models.PositiveIntegerField(default=0)
+    # earliest date of the events not completed yet
+    next_event_date = models.DateTimeField(blank=True, null=True)
+    # hidden at once by destroy, the rows are purged in the background
+    is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(blank=True, null=True)
+
     # Sales member would be only one-one with client
     sales_contact = models.ForeignKey(CustomUsers, on_delete=models.CASCADE, related_name='client_sales_contact')
+
+    objects = ClientManager()
+    all_objects = ClientQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination order of list endpoints
+            models.Index(fields=['date_updated', 'id'], name='client_updated_id_idx'),
+            # case-insensitive exact match on email (iexact)
+            models.Index(Upper('email'), name='client_email_upper_idx'),
+            # purges left to resume
+            models.Index(fields=['deleted_at'], condition=models.Q(is_deleted=True), name='client_deleted_idx'),
+        ]
@@ -0,0 +1,58 @@
+""" Module contains the soft delete of clients and the chunked purge of their rows"""
+
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from changefeed.models import record_deletion
+from contract.models import Contract
+from epicevents.response_cache import invalidate
+from event.models import Event
+from jobs.registry import enqueue
+from .models import Client
+
+logger = logging.getLogger("client")
+
+
+def soft_delete(client_obj):
+    """
+        Hide client_obj with its contracts and events at once, the rows are
+        then purged by the client.purge_client job (see jobs.py), queued in
+        the same transaction. purge_deleted_clients purges the clients whose
+        job failed. The change feed lists the client as deleted from now on.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        Client.objects.filter(pk=client_obj.pk).update(is_deleted=True, deleted_at=now, date_updated=now)
+        record_deletion(Client, client_obj.pk)
+        enqueue('client.purge_client', {'client_id': client_obj.pk})
+    transaction.on_commit(lambda: invalidate(Client, Contract, Event))
+
+
+def purge_client(client_id, chunk_size=None):
+    """
+        Delete the events, then the contracts, then the row of a soft-deleted
+        client, each transaction deleting at most chunk_size rows so locks
+        are held briefly. The usual delete signals run (rollups, counters,
+        caches). Return False when the client is not soft-deleted.
+    """
+    chunk_size = chunk_size or settings.CLIENT_PURGE_CHUNK_SIZE
+    if not Client.all_objects.filter(pk=client_id, is_deleted=True).exists():
+        return False
+
+    deleted = 0
+    for queryset in (Event.objects.filter(contract__client_id=client_id),
+                     Contract.objects.filter(client_id=client_id)):
+        while True:
+            with transaction.atomic():
+                # locked, a second run of the job waits then finds them gone
+                ids = list(queryset.select_for_update(of=('self',)).order_by('pk')
+                           .values_list('pk', flat=True)[:chunk_size])
+                if not ids:
+                    break
+                deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+
+    with transaction.atomic():
+        deleted += Client.all_objects.filter(pk=client_id, is_deleted=True).delete()[0]
+    logger.info("Client %s purged, %s rows deleted", client_id, deleted)
+    return True
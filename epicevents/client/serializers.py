@@ -1,13 +1,32 @@
 """ Module contains class to serialize Clien data"""
 
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from epicevents.fieldsets import DynamicFieldsMixin
 from .models import Client
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """ Client serializer class"""
 
     class Meta:
         model = Client
         fields = ['id', 'sales_contact', 'first_name', 'last_name',
-                  'email', 'mobile', 'company_name', 'client_status']
+                  'email', 'mobile', 'company_name', 'client_status', *Client.COUNTER_FIELDS]
+        read_only_fields = Client.COUNTER_FIELDS
+        # emails of the clients being purged are still taken
+        extra_kwargs = {'email': {'validators': [UniqueValidator(queryset=Client.all_objects.all())]}}
+        expandable_fields = {
+            'sales_contact': 'usermodel.serializers.UserSummarySerializer',
+        }
+
+
+class ClientBulkSerializer(ClientSerializer):
+    """
+        Client serializer used by bulk creation, sales contact and email
+        uniqueness are checked once for the whole batch by the viewset.
+    """
+
+    class Meta(ClientSerializer.Meta):
+        read_only_fields = ['sales_contact', *Client.COUNTER_FIELDS]
+        extra_kwargs = {'email': {'validators': []}}
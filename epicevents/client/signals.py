@@ -0,0 +1,63 @@
+""" Module contains signal receivers keeping the client counters up to date"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from contract.models import Contract
+from epicevents.signals import post_bulk_create, track_previous
+from event.models import Event
+from .counters import contracts_changed, events_changed
+
+CONTRACT_FIELDS = ('client_id', 'contract_status', 'amount')
+EVENT_FIELDS = ('contract_id', 'event_date', 'event_completed')
+
+
+track_previous(Contract, CONTRACT_FIELDS)
+track_previous(Event, EVENT_FIELDS)
+
+
+@receiver(post_save, sender=Contract)
+def update_counters_on_contract_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is not None and all(getattr(previous, field) == getattr(instance, field)
+                                    for field in CONTRACT_FIELDS):
+        return
+    contracts_changed([previous] if previous is not None else [], [instance])
+
+
+@receiver(post_delete, sender=Contract)
+def update_counters_on_contract_delete(sender, instance, **kwargs):
+    contracts_changed([instance], [])
+    events = getattr(instance, '_deleted_events', None)
+    if events:
+        events_changed(events, [])
+
+
+@receiver(post_bulk_create, sender=Contract)
+def update_counters_on_contract_bulk_create(sender, instances, **kwargs):
+    contracts_changed([], instances)
+
+
+@receiver(post_save, sender=Event)
+def update_counters_on_event_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is not None and all(getattr(previous, field) == getattr(instance, field)
+                                    for field in EVENT_FIELDS):
+        return
+    events_changed([previous] if previous is not None else [], [instance])
+
+
+@receiver(post_delete, sender=Event)
+def update_counters_on_event_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Contract) and origin.pk == instance.contract_id:
+        # cascaded from contract.delete(), the events of the contract are counted at once after it
+        Event.contract.field.set_cached_value(instance, origin)
+        if not hasattr(origin, '_deleted_events'):
+            origin._deleted_events = []
+        origin._deleted_events.append(instance)
+        return
+    events_changed([instance], [])
+
+
+@receiver(post_bulk_create, sender=Event)
+def update_counters_on_event_bulk_create(sender, instances, **kwargs):
+    events_changed([], instances)
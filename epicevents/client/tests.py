@@ -1,3 +1,630 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from contract.models import Contract
+from epicevents.pagination import encode_cursor
+from epicevents.search import invalidate_indexes
+from epicevents.testing import QueryBudgetTestCase, pk
+from event.models import Event
+from jobs.models import Job
+from usermodel.models import CustomUsers, Roles
+from usermodel.tokens import RoleRefreshToken
+from .counters import reconcile
+from .purge import purge_client, soft_delete
+from .models import Client
+from .serializers import ClientSerializer
+from .urls import router
+from .views import ClientViewSet
+
+
+def client_body(case, number=1):
+    return {'first_name': "New", 'last_name': f"Client{number}", 'email': f"new{number}@example.com",
+            'company_name': f"New company {number}", 'client_status': "Active",
+            'sales_contact': case.users["Sales"].id}
+
+
+def lead_client(case):
+    lead = Client.objects.create(first_name="Lead", last_name="Client", email="lead@example.com",
+                                 company_name="Lead company", sales_contact=case.users["Sales"])
+    return "Sales", {'pk': lead.pk}, {'client_status': "Active"}
+
 
 # Create your tests here.
+class QueryBudgetTest(QueryBudgetTestCase):
+    """ Query budgets of the client routes"""
+
+    router = router
+    requests = {
+        'clients-list:get': ("Sales", {}, None),
+        'clients-list:post': ("Sales", {}, client_body),
+        'clients-bulk-create:post': ("Sales", {}, lambda case: [client_body(case, i) for i in range(5)]),
+        'clients-export:get': ("Sales", {}, None),
+        'clients-detail:get': ("Sales", {'pk': pk('client_obj')}, None),
+        'clients-detail:put': ("Sales", {'pk': pk('client_obj')}, lambda case: client_body(case, 2)),
+        'clients-detail:patch': ("Sales", {'pk': pk('client_obj')}, {'mobile': "0600000000"}),
+        'clients-detail:delete': ("Sales", {'pk': pk('client_obj')}, None),
+        'clients-activate-client:patch': lead_client,
+    }
+
+
+class TiedPaginationTest(TestCase):
+    """ Cursor pages of rows sharing their date_updated, as written by bulk updates"""
+
+    rows = 1500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                                   role=Roles.objects.create(role_name="Sales"))
+        Client.objects.bulk_create(Client(first_name="First", last_name=f"Last{i}", email=f"client{i}@example.com",
+                                          company_name=f"Company {i}", sales_contact=cls.user)
+                                   for i in range(cls.rows))
+        Client.objects.update(date_updated=timezone.now())
+
+    def setUp(self):
+        self.api_client = APIClient()
+        token = RoleRefreshToken.for_user(self.user).access_token
+        self.api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def walk(self, url, link):
+        pages = []
+        while url is not None and len(pages) <= self.rows:
+            response = self.api_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_every_row_once(self):
+        pages = self.walk("/api/clients/?page_size=100", 'next')
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual(len(pages), 15)
+        self.assertEqual(len(ids), self.rows)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_previous_pages(self):
+        response = None
+        url = "/api/clients/?page_size=100"
+        for _ in range(15):
+            response = self.api_client.get(url)
+            url = response.data['next']
+        last_page = [row['id'] for row in response.data['results']]
+        pages = self.walk(response.data['previous'], 'previous')
+        ids = [pk for page in reversed(pages) for pk in page] + last_page
+        self.assertEqual(len(ids), self.rows)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_tampered_cursor(self):
+        url = self.api_client.get("/api/clients/?page_size=100").data['next']
+        self.assertEqual(self.api_client.get(url).status_code, 200)
+        date_updated = Client.objects.values_list('date_updated', flat=True).first().isoformat()
+        for values in ([False, ["x", "y"]], [False, [None, None]], [False, [date_updated, "x"]],
+                       [False, ["2025-13-01T00:00:00+00:00", 1]], [False, [date_updated, 2 ** 70]],
+                       [False, [date_updated, [1]]], ["x", [date_updated, 1]], [False, [date_updated]],
+                       {"x": 1}, "x"):
+            with self.subTest(values=values):
+                response = self.api_client.get(f"/api/clients/?cursor={encode_cursor(values)}")
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.data['detail'], "Invalid cursor")
+        self.assertEqual(self.api_client.get("/api/clients/?cursor=not-base64!").status_code, 404)
+
+    def test_counter_ordering(self):
+        # every client has 0 contracts
+        pages = self.walk("/api/clients/?page_size=100&ordering=contract_count", 'next')
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual(sorted(ids), sorted(set(ids)))
+        self.assertEqual(len(ids), self.rows)
+
+
+class AsyncListTest(TestCase):
+    """ GET async/clients/, the ASGI read path, paginated like the sync list"""
+
+    url = "/api/async/clients/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                                   role=Roles.objects.create(role_name="Sales"))
+        Client.objects.bulk_create(Client(first_name="First", last_name=f"Last{i}", email=f"client{i}@example.com",
+                                          company_name=f"Company {i}", sales_contact=cls.user)
+                                   for i in range(5))
+        Client.objects.update(date_updated=timezone.now())
+
+    def setUp(self):
+        self.headers = {'Authorization': f"Bearer {RoleRefreshToken.for_user(self.user).access_token}"}
+
+    async def get(self, url):
+        return await AsyncClient().get(url, headers=self.headers)
+
+    async def test_list(self):
+        response = await self.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body['results']), 5)
+        self.assertIsNone(body['next'])
+        self.assertEqual(body['results'][0]['company_name'], "Company 4")
+        self.assertEqual((await AsyncClient().get(self.url)).status_code, 401)
+
+    async def test_pages(self):
+        ids = []
+        url = f"{self.url}?page_size=2"
+        while url is not None:
+            body = (await self.get(url)).json()
+            ids += [row['id'] for row in body['results']]
+            url = body['next']
+        expected = [pk async for pk in Client.objects.order_by('-id').values_list('id', flat=True)]
+        self.assertEqual(ids, expected)
+
+    async def test_invalid_cursor(self):
+        for values in (["x", "y"], [None, None], [timezone.now().isoformat()], "x"):
+            with self.subTest(values=values):
+                response = await self.get(f"{self.url}?cursor={encode_cursor(values)}")
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'detail': "Invalid cursor"})
+
+
+class SearchTest(TestCase):
+    """ ?name= searches within the rows left by the other filters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Roles.objects.create(role_name="Sales")
+        cls.users = [CustomUsers.objects.create_user(username=f"sales{i}", password="pw12345!", role=role)
+                     for i in range(2)]
+        # saved one by one, the n-gram index follows post_save
+        for i in range(10):
+            Client.objects.create(first_name="First", last_name=f"Last{i}", email=f"client{i}@example.com",
+                                  company_name="Acme", sales_contact=cls.users[0])
+        cls.other = Client.objects.create(first_name="First", last_name="Other", email="other@example.com",
+                                          company_name="Acme Corporation Holdings", sales_contact=cls.users[1])
+
+    @override_settings(SEARCH_MAX_RESULTS=5)
+    def test_owned_search(self):
+        api_client = APIClient()
+        token = RoleRefreshToken.for_user(self.users[1]).access_token
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = api_client.get("/api/clients/?name=acme&owned=true")
+        self.assertEqual([row['id'] for row in response.data['results']], [self.other.pk])
+        response = api_client.get("/api/clients/?name=acme&page_size=20")
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['results'][0]['company_name'], "Acme")
+
+    @mock.patch('epicevents.search.SEARCH_CHUNK_SIZE', 3)
+    def test_chunked_search(self):
+        api_client = APIClient()
+        api_client.force_authenticate(self.users[0])
+        self.addCleanup(invalidate_indexes, Client)
+        api_client.get("/api/clients/?name=acme")
+        # the 11 matching keys read by chunks of 3, then the page
+        with self.assertNumQueries(4 + 1):
+            response = api_client.get("/api/clients/?name=acme&page_size=20")
+        self.assertEqual(len(response.data['results']), 11)
+        # best match first, ties by id as the list orders them
+        self.assertEqual(response.data['results'][0]['id'], Client.objects.filter(company_name="Acme").last().pk)
+
+    def test_invalidated_index(self):
+        api_client = APIClient()
+        api_client.force_authenticate(self.users[0])
+        # the index outlives the test transaction
+        self.addCleanup(invalidate_indexes, Client)
+        self.assertEqual(api_client.get("/api/clients/?name=zebra").data['results'], [])
+        # written without signals, as COPY or another process would
+        Client.objects.filter(pk=self.other.pk).update(company_name="Zebra Corporation")
+        self.assertEqual(api_client.get("/api/clients/?name=zebra&page_size=5").data['results'], [])
+
+        invalidate_indexes(Client)
+        response = api_client.get("/api/clients/?name=zebra&page_size=10")
+        self.assertEqual([row['id'] for row in response.data['results']], [self.other.pk])
+
+
+class CounterTest(TestCase):
+    """ Contract and event counters kept on Client, and reconcile_client_counters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                                   role=Roles.objects.create(role_name="Sales"))
+        cls.client_obj = Client.objects.create(first_name="a", last_name="b", email="client@example.com",
+                                               company_name="Company", sales_contact=cls.user)
+        cls.contract = Contract.objects.create(client=cls.client_obj, sales_contact=cls.user, amount=100,
+                                               payment_due=timezone.now(), contract_status="Signed")
+
+    def counters(self):
+        return Client.objects.values(*Client.COUNTER_FIELDS).get(pk=self.client_obj.pk)
+
+    def create_event(self, days, **fields):
+        return Event.objects.create(contract=self.contract, event_date=timezone.now() + timedelta(days=days),
+                                    **fields)
+
+    def test_contract_counters(self):
+        other = Contract.objects.create(client=self.client_obj, sales_contact=self.user, amount=40,
+                                        payment_due=timezone.now())
+        self.assertEqual(self.counters(), dict(self.counters(), contract_count=2, signed_amount=100,
+                                               open_amount=40))
+
+        other.amount = 60
+        other.save()
+        self.assertEqual(self.counters()['open_amount'], 60)
+        other.contract_status = "Signed"
+        other.save()
+        self.assertEqual((self.counters()['signed_amount'], self.counters()['open_amount']), (160, 0))
+
+        other.delete()
+        self.assertEqual(self.counters(), dict(self.counters(), contract_count=1, signed_amount=100,
+                                               open_amount=0))
+
+    def test_next_event_date(self):
+        first, second = self.create_event(2), self.create_event(5)
+        self.create_event(1, event_completed=True)
+        counters = self.counters()
+        self.assertEqual((counters['event_count'], counters['next_event_date']), (3, first.event_date))
+
+        first.event_completed = True
+        first.save()
+        self.assertEqual(self.counters()['next_event_date'], second.event_date)
+        second.delete()
+        self.assertEqual((self.counters()['event_count'], self.counters()['next_event_date']), (2, None))
+
+    def test_contract_delete_cascades_event_counters(self):
+        self.create_event(2)
+        self.create_event(5)
+        with CaptureQueriesContext(connection) as queries:
+            self.contract.delete()
+        # the cascaded events are counted at once, no query per event
+        client_queries = [query['sql'] for query in queries if 'client_client' in query['sql']]
+        self.assertEqual(len(client_queries), 2, client_queries)
+        counters = self.counters()
+        self.assertEqual((counters['contract_count'], counters['event_count'], counters['next_event_date']),
+                         (0, 0, None))
+
+    def test_unchanged_counters_keep_date_updated(self):
+        self.create_event(2)
+        later = self.create_event(5)
+        date_updated = Client.objects.get(pk=self.client_obj.pk).date_updated
+
+        # neither the count nor the earliest date moves
+        later.event_date += timedelta(days=1)
+        later.save()
+        later.attendees = 50
+        later.save()
+        self.assertEqual(Client.objects.get(pk=self.client_obj.pk).date_updated, date_updated)
+
+        later.event_date -= timedelta(days=10)
+        later.save()
+        client_obj = Client.objects.get(pk=self.client_obj.pk)
+        self.assertEqual(client_obj.next_event_date, later.event_date)
+        self.assertGreater(client_obj.date_updated, date_updated)
+
+    def test_reconcile(self):
+        event = self.create_event(2)
+        expected = self.counters()
+        Client.objects.update(contract_count=7, signed_amount=0, event_count=0, next_event_date=None)
+        Client.objects.create(first_name="c", last_name="d", email="other@example.com",
+                              company_name="Other", sales_contact=self.user)
+
+        self.assertEqual(reconcile(chunk_size=1, fix=False), (2, 1))
+        self.assertEqual(self.counters()['contract_count'], 7)
+
+        out = StringIO()
+        call_command('reconcile_client_counters', '--chunk-size', '1', stdout=out)
+        self.assertIn("2 clients checked, 1 drifted counters corrected", out.getvalue())
+        self.assertEqual(self.counters(), expected)
+        self.assertEqual(expected['next_event_date'], event.event_date)
+        self.assertEqual(reconcile(), (2, 0))
+
+
+class AtomicCounterTest(TransactionTestCase):
+    """ Counter deltas commit or roll back with the contract write, outside any request transaction"""
+
+    def setUp(self):
+        user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                               role=Roles.objects.create(role_name="Sales"))
+        self.client_obj = Client.objects.create(first_name="a", last_name="b", email="client@example.com",
+                                                company_name="Company", sales_contact=user)
+        self.contract = Contract.objects.create(client=self.client_obj, sales_contact=user, amount=100,
+                                                payment_due=timezone.now())
+
+    def counters(self):
+        return Client.objects.values(*Client.COUNTER_FIELDS).get(pk=self.client_obj.pk)
+
+    def test_failed_write_rolls_back_counters(self):
+        expected = self.counters()
+
+        def fail(**kwargs):
+            raise RuntimeError("write failed")
+
+        # runs after the counter receivers have applied their deltas
+        post_save.connect(fail, sender=Contract, dispatch_uid='test-failed-write')
+        self.addCleanup(post_save.disconnect, sender=Contract, dispatch_uid='test-failed-write')
+
+        with self.assertRaises(RuntimeError):
+            Contract.objects.create(client=self.client_obj, sales_contact_id=self.contract.sales_contact_id,
+                                    amount=40, payment_due=timezone.now())
+        self.contract.amount, self.contract.contract_status = 60, "Signed"
+        with self.assertRaises(RuntimeError):
+            self.contract.save()
+
+        self.assertEqual(list(Contract.objects.values_list('amount', 'contract_status')), [(100, "Open")])
+        self.assertEqual(self.counters(), expected)
+
+
+class SoftDeleteTest(TestCase):
+    """ Soft-deleted clients are hidden with their contracts and events, then purged in chunks"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                                   role=Roles.objects.create(role_name="Sales"))
+        cls.clients = [Client.objects.create(first_name="First", last_name=f"Last{i}", email=f"client{i}@example.com",
+                                             company_name=f"Deleted{i}", sales_contact=cls.user)
+                       for i in range(2)]
+        cls.contracts = [Contract.objects.create(client=client_obj, sales_contact=cls.user, amount=100,
+                                                 payment_due=timezone.now(), contract_status="Signed")
+                         for client_obj in cls.clients for _ in range(3)]
+        cls.events = [Event.objects.create(contract=contract, attendees=10)
+                      for contract in cls.contracts for _ in range(2)]
+
+    def setUp(self):
+        self.api_client = APIClient()
+        token = RoleRefreshToken.for_user(self.user).access_token
+        self.api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def ids(self, url, **params):
+        response = self.api_client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {row['id'] for row in response.data['results']}
+
+    def exported_ids(self, url):
+        response = self.api_client.get(url, {'export_format': "csv"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        column = lines[0].split(",").index("id")
+        return {int(line.split(",")[column]) for line in lines[1:]}
+
+    def test_hidden(self):
+        deleted, kept = self.clients
+        contract = self.contracts[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api_client.delete(f"/api/clients/{deleted.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Job.objects.filter(name='client.purge_client', payload={'client_id': deleted.pk}).exists())
+
+        deleted_contracts = {c.pk for c in self.contracts if c.client_id == deleted.pk}
+        deleted_events = {e.pk for e in self.events if e.contract_id in deleted_contracts}
+        self.assertEqual(self.ids("/api/clients/"), {kept.pk})
+        self.assertEqual(self.ids("/api/clients/", name="deleted"), {kept.pk})
+        self.assertEqual(self.api_client.get(f"/api/clients/{deleted.pk}/").status_code, 404)
+        self.assertEqual(self.ids(f"/api/clients/{deleted.pk}/contracts/"), set())
+        self.assertEqual(self.api_client.get(f"/api/clients/{deleted.pk}/contracts/{contract.pk}/").status_code, 404)
+        events_url = f"/api/clients/{deleted.pk}/contracts/{contract.pk}/events/"
+        self.assertEqual(self.ids(events_url), set())
+        self.assertEqual(self.api_client.get(f"{events_url}{min(deleted_events)}/").status_code, 404)
+        self.assertFalse(self.ids("/api/contracts/") & deleted_contracts)
+        self.assertFalse(self.ids("/api/events/") & deleted_events)
+
+        self.assertEqual(self.exported_ids("/api/clients/export/"), {kept.pk})
+        self.assertFalse(self.exported_ids("/api/contracts/export/") & deleted_contracts)
+        self.assertFalse(self.exported_ids("/api/events/export/") & deleted_events)
+
+        with override_settings(CHANGE_FEED_LAG=0):
+            self.assertEqual(self.api_client.get("/api/changes/clients/").data['deleted'], [deleted.pk])
+            self.assertFalse(self.ids("/api/changes/contracts/") & deleted_contracts)
+
+    def test_purge_in_chunks(self):
+        deleted = self.clients[0]
+        soft_delete(deleted)
+        self.assertFalse(purge_client(self.clients[1].pk))
+
+        # the purge is cut short on the contracts, after the events were deleted
+        def interrupt(**kwargs):
+            raise RuntimeError("worker killed")
+
+        post_delete.connect(interrupt, sender=Contract)
+        try:
+            with self.assertRaises(RuntimeError):
+                purge_client(deleted.pk, chunk_size=2)
+        finally:
+            post_delete.disconnect(interrupt, sender=Contract)
+        self.assertFalse(Event.objects.filter(contract__client_id=deleted.pk).exists())
+        self.assertEqual(Contract.objects.filter(client_id=deleted.pk).count(), 3)
+
+        out = StringIO()
+        call_command('purge_deleted_clients', '--chunk-size', '2', stdout=out)
+        self.assertIn("1 deleted clients purged", out.getvalue())
+        self.assertFalse(Client.all_objects.filter(pk=deleted.pk).exists())
+        self.assertFalse(Contract.objects.filter(client_id=deleted.pk).exists())
+        # the rows of the other client are untouched
+        self.assertEqual(Event.objects.count(), 6)
+        self.assertEqual(Client.objects.get().contract_count, 3)
+
+
+class BulkConflictTest(TestCase):
+    """ POST clients/bulk/ racing another request on the same email"""
+
+    def test_concurrent_email(self):
+        user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                               role=Roles.objects.create(role_name="Sales"))
+        Client.objects.create(first_name="a", last_name="b", email="taken@example.com", company_name="Company",
+                              sales_contact=user)
+        get_bulk_context = ClientViewSet.get_bulk_context
+
+        def checked_before_the_insert(view, request, items):
+            # the other request inserts its row once the emails were checked
+            context = get_bulk_context(view, request, items)
+            context['emails'].clear()
+            return context
+
+        api_client = APIClient()
+        api_client.force_authenticate(user)
+        body = [{'first_name': "New", 'last_name': "Client", 'email': email, 'company_name': "New company"}
+                for email in ("free@example.com", "taken@example.com")]
+        with mock.patch.object(ClientViewSet, 'get_bulk_context', checked_before_the_insert), \
+                self.assertLogs("client", "WARNING") as logs:
+            response = api_client.post("/api/clients/bulk/", body, format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([record.levelname for record in logs.records], ["WARNING"])
+        self.assertEqual(response.data['errors'], [{}, {'email': ["client with this email already exists."]}])
+        self.assertFalse(Client.objects.filter(email="free@example.com").exists())
+
+
+class ConditionalListTest(TestCase):
+    """ Lists are validated by their ETag only, a deleted row changes it"""
+
+    def test_deleted_row(self):
+        user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                               role=Roles.objects.create(role_name="Sales"))
+        clients = [Client.objects.create(first_name="a", last_name="b", email=f"client{i}@example.com",
+                                         company_name="Company", sales_contact=user)
+                   for i in range(2)]
+        api_client = APIClient()
+        api_client.force_authenticate(user)
+
+        response = api_client.get("/api/clients/")
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(api_client.get("/api/clients/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertIn('Last-Modified', api_client.get(f"/api/clients/{clients[0].pk}/"))
+
+        # the older row goes, max(date_updated) of the page stays the same
+        Client.objects.filter(pk=clients[0].pk).delete()
+        self.assertEqual(api_client.get("/api/clients/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ExportTest(TestCase):
+    """ GET clients/export/ streams the rows of the list, filters and ?owned= included"""
+
+    url = "/api/clients/export/"
+
+    @classmethod
+    def setUpTestData(cls):
+        sales = Roles.objects.create(role_name="Sales")
+        cls.users = [CustomUsers.objects.create_user(username=f"sales{i}", password="pw12345!", role=sales)
+                     for i in range(2)]
+        cls.support = CustomUsers.objects.create_user(username="support", password="pw12345!",
+                                                      role=Roles.objects.create(role_name="Support"))
+        cls.clients = [Client.objects.create(first_name="First", last_name=f"Last{i}", email=f"client{i}@example.com",
+                                             company_name=f"Company, {i}", sales_contact=cls.users[i % 2])
+                       for i in range(4)]
+        soft_delete(cls.clients[3])
+
+    def setUp(self):
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.users[0])
+
+    def read_csv(self, query=""):
+        response = self.api_client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+
+    def test_csv(self):
+        response = self.api_client.get(self.url)
+        self.assertEqual(response['Content-Type'], "text/csv")
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="clients.csv"')
+
+        header, *rows = self.read_csv()
+        self.assertEqual(header, ClientSerializer.Meta.fields)
+        # in the list order, the soft-deleted client left out
+        self.assertEqual([int(row[0]) for row in rows], [client.pk for client in reversed(self.clients[:3])])
+        first = dict(zip(header, rows[-1]))
+        self.assertEqual((first['email'], first['company_name'], first['sales_contact'], first['mobile']),
+                         ("client0@example.com", "Company, 0", str(self.users[0].pk), ""))
+
+    def test_ndjson(self):
+        response = self.api_client.get(f"{self.url}?export_format=ndjson&email=CLIENT1@example.com")
+        self.assertEqual(response['Content-Type'], "application/x-ndjson")
+        [line] = b"".join(response.streaming_content).decode().splitlines()
+        row = json.loads(line)
+        self.assertEqual((row['id'], row['sales_contact'], row['contract_count']),
+                         (self.clients[1].pk, self.users[1].pk, 0))
+
+    def test_owned(self):
+        _, *rows = self.read_csv("?owned=true")
+        self.assertEqual({int(row[0]) for row in rows}, {self.clients[0].pk, self.clients[2].pk})
+        self.api_client.force_authenticate(self.users[1])
+        _, *rows = self.read_csv("?owned=true")
+        self.assertEqual([int(row[0]) for row in rows], [self.clients[1].pk])
+        # support users own no client, they still read them all
+        self.api_client.force_authenticate(self.support)
+        self.assertEqual(len(self.read_csv("?owned=true")), 1)
+        self.assertEqual(len(self.read_csv()), 4)
+
+    def test_refused(self):
+        response = self.api_client.get(f"{self.url}?export_format=xml")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+
+
+class SparseFieldsetTest(TestCase):
+    """ ?fields= and ?expand= of the client list and detail"""
+
+    url = "/api/clients/"
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Roles.objects.create(role_name="Sales")
+        cls.users = [CustomUsers.objects.create_user(username=f"sales{i}", password="pw12345!", role=role,
+                                                     first_name=f"Sales{i}") for i in range(2)]
+        cls.clients = [Client.objects.create(first_name="First", last_name=f"Last{i}", email=f"client{i}@example.com",
+                                             company_name="Company", sales_contact=cls.users[i % 2])
+                       for i in range(5)]
+
+    def setUp(self):
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.users[0])
+
+    def rows(self, query):
+        response = self.api_client.get(f"{self.url}?page_size=10&{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_fields(self):
+        rows = self.rows("fields=id,email")
+        self.assertEqual([set(row) for row in rows], [{'id', 'email'}] * 5)
+        with CaptureQueriesContext(connection) as queries:
+            self.rows("fields=email")
+        [query] = queries.captured_queries
+        self.assertNotIn("company_name", query['sql'])
+        self.assertIn("date_updated", query['sql'])
+
+    def test_unknown_names(self):
+        # unknown fields are ignored, only unknown ones leave empty rows
+        self.assertEqual([set(row) for row in self.rows("fields=id,nope")], [{'id'}] * 5)
+        self.assertEqual(self.rows("fields=nope"), [{}] * 5)
+        rows = self.rows("expand=nope,email")
+        self.assertEqual(rows[0]['sales_contact'], self.clients[4].sales_contact_id)
+        self.assertEqual(rows[0]['email'], "client4@example.com")
+
+    def test_fields_and_expand(self):
+        [row, *_] = self.rows("fields=id,sales_contact&expand=sales_contact")
+        self.assertEqual(set(row), {'id', 'sales_contact'})
+        self.assertEqual(row['sales_contact'], {'id': self.users[0].pk, 'username': "sales0", 'first_name': "Sales0",
+                                                'last_name': "", 'email': ""})
+        # an expansion left out of ?fields= is neither serialized nor joined
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.rows("fields=id&expand=sales_contact")
+        self.assertEqual(set(rows[0]), {'id'})
+        self.assertNotIn("JOIN", queries.captured_queries[0]['sql'])
+
+        url = f"{self.url}{self.clients[1].pk}/?fields=email,sales_contact&expand=sales_contact"
+        response = self.api_client.get(url)
+        self.assertEqual((response.data['email'], response.data['sales_contact']['username']),
+                         ("client1@example.com", "sales1"))
+
+    def test_expanded_query_count(self):
+        # one query whatever the page size, the contacts are joined
+        with self.assertNumQueries(1):
+            rows = self.rows("expand=sales_contact")
+        self.assertEqual([row['sales_contact']['username'] for row in rows],
+                         [f"sales{client.sales_contact_id == self.users[1].pk:d}" for client in reversed(self.clients)])
+        with self.assertNumQueries(1):
+            response = self.api_client.get(f"{self.url}?expand=sales_contact&page_size=2")
+        self.assertEqual(len(response.data['results']), 2)
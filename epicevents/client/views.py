@@ -1,15 +1,24 @@
 """ Module contains ClientViewSet class for client CRUD operations"""
 
 import logging
+from django.http import Http404
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from usermodel.permissions import RoleBasedPermission
 from usermodel.models import CustomUsers
+from epicevents.bulk import BulkCreateMixin, referenced_user, user_ids, users_with_role
+from epicevents.conditional import ConditionalGetMixin
+from epicevents.export import ExportMixin
+from epicevents.fieldsets import SparseFieldsetMixin
+from epicevents.filters import filter_owned
+from epicevents.search import get_search_backend
 from .models import Client
-from .serializers import ClientSerializer
+from .purge import soft_delete
+from .serializers import ClientBulkSerializer, ClientSerializer
 
 
 # app_logger = logging.getLogger("epicevents")
@@ -17,31 +26,42 @@ logger = logging.getLogger("client")
 
 
 # Create your views here.
-class ClientViewSet(ModelViewSet):
-    """ View set for performing Client CRUD operations"""
+class ClientViewSet(BulkCreateMixin, ExportMixin, ConditionalGetMixin, SparseFieldsetMixin,
+                    ModelViewSet):
+    """ View set for performing Client CRUD operations, lists can be sorted on the counters (?ordering=)"""
 
     serializer_class = ClientSerializer
+    bulk_serializer_class = ClientBulkSerializer
     permission_classes = [IsAuthenticated, RoleBasedPermission]
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['date_updated', 'contract_count', 'signed_amount', 'open_amount', 'event_count']
+    ordering = ('-date_updated', '-id')
 
     def get_object(self):
         try:
             return super().get_object()
-        except Client.DoesNotExist:
+        except Http404:
             message = "Client with given id does not exist"
             logger.error(message)
-            return Response({"error": message},
-                            status=status.HTTP_404_NOT_FOUND)
+            raise
 
     def get_queryset(self):
         queryset = Client.objects.all()
         company_name = self.request.query_params.get('name', None)
         client_email = self.request.query_params.get('email', None)
+        email_contains = self.request.query_params.get('email_contains', None)
 
-        if company_name:
-            queryset = queryset.filter(company_name__icontains=company_name)
         if client_email:
             queryset = queryset.filter(email__iexact=client_email)
+        queryset = filter_owned(queryset, self.request)
 
+        search_terms = {}
+        if company_name:
+            search_terms['company_name'] = company_name
+        if email_contains:
+            search_terms['email'] = email_contains
+        if search_terms:
+            queryset = get_search_backend().search(queryset, **search_terms)
         return queryset
 
     def create(self, request, *args, **kwargs):
@@ -79,15 +99,56 @@ class ClientViewSet(ModelViewSet):
         logger.error(str(serializer.errors))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def get_bulk_context(self, request, items):
+        role_name = request.user.role.role_name
+        if role_name == "Management":
+            sales_ids = users_with_role(user_ids(items, 'sales_contact'), "Sales")
+        elif role_name == "Sales":
+            sales_ids = set()
+        else:
+            message = "You do not have permission to create clients."
+            logger.error(message)
+            return Response({"error": message},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        emails = [item.get('email') for item in items if isinstance(item.get('email'), str)]
+        existing_emails = set(Client.all_objects.filter(email__in=emails).values_list('email', flat=True))
+        return {'role_name': role_name, 'sales_ids': sales_ids, 'emails': existing_emails}
+
+    def build_bulk_instance(self, validated_data, item, context):
+        errors = {}
+        email = validated_data['email']
+        if email in context['emails']:
+            errors['email'] = ["client with this email already exists."]
+        context['emails'].add(email)
+
+        if context['role_name'] == "Management":
+            sales_contact_id = referenced_user(item, 'sales_contact', context['sales_ids'])
+            if sales_contact_id is None:
+                errors['sales_contact'] = ["Invalid Sales contact ID." if item.get('sales_contact')
+                                           else "Sales contact is required for Management Users."]
+        else:
+            sales_contact_id = self.request.user.id
+
+        if errors:
+            logger.error(str(errors))
+        return Client(sales_contact_id=sales_contact_id, **validated_data), errors
+
+    def get_bulk_conflicts(self, instances):
+        # emails taken by a concurrent request since get_bulk_context
+        taken = set(Client.all_objects.filter(email__in=[instance.email for instance in instances])
+                    .values_list('email', flat=True))
+        errors = [{'email': ["client with this email already exists."]} if instance.email in taken else {}
+                  for instance in instances]
+        if any(errors):
+            logger.warning(str(errors))
+        return errors
+
     @action(detail=True, methods=['patch'], url_path='activate-client')
     def activate_client(self, request, pk=None):
         client_obj = self.get_object()
 
-        # Send custom response if client does not exist
-        if isinstance(client_obj, Response):
-            return client_obj
-
-        if request.user != client_obj.sales_contact and request.user.role.role_name != 'Management':
+        if client_obj.sales_contact_id != request.user.id and request.user.role.role_name != 'Management':
             message = "You do not have permission to update this client, you are not its owner!"
             logger.error(message)
             return Response(
@@ -115,14 +176,14 @@ class ClientViewSet(ModelViewSet):
                 {"message": message},
                 status=status.HTTP_400_BAD_REQUEST)
 
+    def perform_destroy(self, instance):
+        # contracts and events are purged in the background, see purge.py
+        soft_delete(instance)
+
     def destroy(self, request, *args, **kwargs):
         client_obj = self.get_object()
 
-        # Send custom response if client does not exist
-        if isinstance(client_obj, Response):
-            return client_obj
-
-        if request.user != client_obj.sales_contact and request.user.role.role_name != 'Management':
+        if client_obj.sales_contact_id != request.user.id and request.user.role.role_name != 'Management':
             message = "You do not have permission to delete this client, you are not its owner!"
             logger.error(message)
             return Response(
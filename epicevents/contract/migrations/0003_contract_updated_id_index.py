@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0004_client_updated_id_index'),
+        ('contract', '0002_alter_contract_sales_contact'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['date_updated', 'id'], name='contract_updated_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contract', '0003_contract_updated_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contract',
+            name='date_created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='contract',
+            name='payment_due',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -3,10 +3,24 @@
 from django.db import models
 from usermodel.models import CustomUsers
 from client.models import Client
+from epicevents.models import AtomicSaveMixin
+
+
+class ContractQuerySet(models.QuerySet):
+    """ Contract queryset class"""
+
+    def filter_for_user(self, user):
+        """ Keep the contracts user may edit, same rules as RoleBasedPermission"""
+        if user.is_staff:
+            return self
+        role = getattr(user, 'role', None)
+        if role is not None and role.role_name == "Sales":
+            return self.filter(models.Q(sales_contact_id=user.id) | models.Q(client__sales_contact_id=user.id))
+        return self.none()
 
 
 # Create your models here.
-class Contract(models.Model):
+class Contract(AtomicSaveMixin, models.Model):
     """ Contract model class"""
 
     CONTRACT_STATUS_CHOICES = [
@@ -19,9 +33,17 @@ class Contract(models.Model):
                                       related_name='contract_sales_contact')
 
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='client_id')
-    date_created = models.DateTimeField(auto_now_add=True)
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True)
     date_updated = models.DateTimeField(auto_now=True)
     contract_status = models.CharField(max_length=15, choices=CONTRACT_STATUS_CHOICES,
                                        default='Open')
     amount = models.FloatField()
-    payment_due = models.DateTimeField()
+    payment_due = models.DateTimeField(db_index=True)
+
+    objects = ContractQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination order of list endpoints
+            models.Index(fields=['date_updated', 'id'], name='contract_updated_id_idx'),
+        ]
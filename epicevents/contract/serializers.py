@@ -1,11 +1,22 @@
 """ Module contains class to serialize Contract data"""
 
 from rest_framework import serializers
+from epicevents.fieldsets import DynamicFieldsMixin
 from .models import Contract
 
 
-class ContractSerializer(serializers.ModelSerializer):
+class ContractSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """ Contract serializer class"""
     class Meta:
         model = Contract
         fields = "__all__"
+        expandable_fields = {
+            'client': 'client.serializers.ClientSerializer',
+            'sales_contact': 'usermodel.serializers.UserSummarySerializer',
+        }
+
+
+class ContractBulkSerializer(ContractSerializer):
+    """ Contract serializer used by bulk creation, related users are resolved by the viewset"""
+    class Meta(ContractSerializer.Meta):
+        read_only_fields = ['client', 'sales_contact']
@@ -1,3 +1,205 @@
-from django.test import TestCase
+import threading
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, IntegrityError
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+from client.models import Client
+from epicevents.response_cache import get_cache
+from epicevents.testing import QueryBudgetTestCase, pk
+from event.models import Event
+from usermodel.models import CustomUsers, Roles
+from .models import Contract
+from .urls import router
+
 
 # Create your tests here.
+class SignContractConcurrencyTest(TransactionTestCase):
+    """
+        Concurrent PATCH .../sign/ requests create exactly one event per
+        contract. The requests need a database accepting concurrent writers
+        (SQLite locks the whole file).
+    """
+
+    threads = 8
+    contracts = 10
+
+    def setUp(self):
+        role = Roles.objects.create(role_name="Sales")
+        self.user = CustomUsers.objects.create_user(username="sales", password="pw12345!", role=role)
+        self.client_obj = Client.objects.create(first_name="a", last_name="b", email="client@example.com",
+                                                company_name="Company", sales_contact=self.user,
+                                                client_status="Active")
+
+    def sign_concurrently(self, contract):
+        """ Send self.threads sign requests at once, return their status codes"""
+        barrier = threading.Barrier(self.threads)
+        codes = []
+        errors = []
+        lock = threading.Lock()
+        url = f"/api/clients/{self.client_obj.id}/contracts/{contract.id}/sign/"
+
+        def worker():
+            api_client = APIClient()
+            api_client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                response = api_client.patch(url, {"contract_status": "Signed"}, format="json")
+                with lock:
+                    codes.append(response.status_code)
+            except Exception as exc:
+                with lock:
+                    errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return codes
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_sign_creates_one_event(self):
+        contracts = [Contract.objects.create(client=self.client_obj, sales_contact=self.user, amount=100,
+                                             payment_due=timezone.now())
+                     for _ in range(self.contracts)]
+
+        for contract in contracts:
+            codes = self.sign_concurrently(contract)
+            self.assertEqual(codes.count(200), 1, codes)
+            self.assertEqual(codes.count(409), self.threads - 1, codes)
+            self.assertEqual(Event.objects.filter(contract=contract).count(), 1)
+
+        self.assertEqual(Contract.objects.filter(contract_status="Signed").count(), self.contracts)
+
+    def test_signing_event_is_unique(self):
+        contract = Contract.objects.create(client=self.client_obj, sales_contact=self.user, amount=100,
+                                           payment_due=timezone.now())
+        Event.objects.create(contract=contract, signing_event=True)
+        Event.objects.create(contract=contract)
+        with self.assertRaises(IntegrityError):
+            Event.objects.create(contract=contract, signing_event=True)
+
+
+def contract_body(case):
+    return {'client': case.client_obj.id, 'sales_contact': case.users["Sales"].id, 'amount': 750,
+            'payment_due': timezone.now().isoformat()}
+
+
+CLIENT = {'client_id': pk('client_obj')}
+CLIENT_CONTRACT = {'client_id': pk('client_obj'), 'pk': pk('open_contract')}
+
+
+class QueryBudgetTest(QueryBudgetTestCase):
+    """ Query budgets of the contract routes"""
+
+    router = router
+    requests = {
+        'contracts-list:get': ("Sales", {}, None),
+        'contracts-list:post': ("Sales", {}, contract_body),
+        'contracts-export:get': ("Sales", {}, None),
+        'contracts-detail:get': ("Sales", {'pk': pk('open_contract')}, None),
+        'contracts-detail:put': ("Sales", {'pk': pk('open_contract')}, contract_body),
+        'contracts-detail:patch': ("Sales", {'pk': pk('open_contract')}, {'amount': 800}),
+        'contracts-detail:delete': ("Sales", {'pk': pk('signed_contract')}, None),
+        'client-contracts-list:get': ("Sales", CLIENT, None),
+        'client-contracts-list:post': ("Sales", CLIENT, contract_body),
+        'client-contracts-bulk-create:post': ("Sales", CLIENT, lambda case: [contract_body(case) for _ in range(5)]),
+        'client-contracts-detail:get': ("Sales", CLIENT_CONTRACT, None),
+        'client-contracts-detail:put': ("Sales", CLIENT_CONTRACT, contract_body),
+        'client-contracts-detail:patch': ("Sales", CLIENT_CONTRACT, {'amount': 800}),
+        'client-contracts-detail:delete': ("Sales", dict(CLIENT, pk=pk('signed_contract')), None),
+        'client-contracts-sign-contract:patch': ("Sales", CLIENT_CONTRACT, {'contract_status': "Signed"}),
+    }
+
+
+class NotFoundTest(TestCase):
+    """ Missing clients and contracts are a 404 on every nested contract route"""
+
+    def setUp(self):
+        self.user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                                    role=Roles.objects.create(role_name="Sales"))
+        self.client_obj = Client.objects.create(first_name="a", last_name="b", email="client@example.com",
+                                                company_name="Company", sales_contact=self.user,
+                                                client_status="Active")
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.user)
+
+    def test_missing_contract(self):
+        url = f"/api/clients/{self.client_obj.pk}/contracts/999/"
+        for method, data in (('get', None), ('put', {'amount': 1}), ('patch', {'amount': 1}), ('delete', None)):
+            response = getattr(self.api_client, method)(url, data, format="json")
+            self.assertEqual(response.status_code, 404, method)
+            self.assertIn("detail", response.data)
+        response = self.api_client.patch(f"{url}sign/", {'contract_status': "Signed"}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_client(self):
+        body = {'amount': 750, 'payment_due': timezone.now().isoformat()}
+        self.assertEqual(self.api_client.post("/api/clients/999/contracts/", body, format="json").status_code, 404)
+        self.assertEqual(self.api_client.get("/api/clients/999/").status_code, 404)
+        self.assertEqual(self.api_client.delete("/api/clients/999/").status_code, 404)
+
+
+class DateRangeFilterTest(TestCase):
+    """ ?payment_due=, ?payment_due_from= and ?payment_due_to= of the contract search"""
+
+    url = "/api/contracts/?page_size=50&"
+
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                               role=Roles.objects.create(role_name="Sales"))
+        client_obj = Client.objects.create(first_name="a", last_name="b", email="client@example.com",
+                                           company_name="Company", sales_contact=user)
+        cls.user = user
+        cls.contracts = {
+            name: Contract.objects.create(client=client_obj, sales_contact=user, amount=100,
+                                          payment_due=datetime(*moment, tzinfo=dt_timezone.utc))
+            for name, moment in (('day_before', (2025, 3, 13, 23, 59, 59)), ('day_start', (2025, 3, 14)),
+                                 ('day_end', (2025, 3, 14, 23, 59, 59, 999999)), ('day_after', (2025, 3, 15)),
+                                 ('next_month', (2025, 4, 1)), ('next_year', (2026, 1, 1)))
+        }
+
+    def setUp(self):
+        # cached searches outlive the test transactions
+        get_cache().clear()
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.user)
+
+    def assertSelects(self, query, *names):
+        response = self.api_client.get(self.url + query)
+        self.assertEqual(response.status_code, 200, query)
+        self.assertEqual({row['id'] for row in response.data['results']},
+                         {self.contracts[name].pk for name in names}, query)
+
+    def test_periods(self):
+        self.assertSelects("payment_due=2025-03-14", 'day_start', 'day_end')
+        self.assertSelects("payment_due=2025-03", 'day_before', 'day_start', 'day_end', 'day_after')
+        self.assertSelects("payment_due=2025", 'day_before', 'day_start', 'day_end', 'day_after', 'next_month')
+
+    def test_inclusive_bounds(self):
+        # a bare date as upper bound includes its whole day
+        self.assertSelects("payment_due_from=2025-03-14&payment_due_to=2025-03-14", 'day_start', 'day_end')
+        self.assertSelects("payment_due_from=2025-03-14T00:00:00Z&payment_due_to=2025-03-15T00:00:00Z",
+                           'day_start', 'day_end')
+        # combined with a period, the narrower bounds win
+        self.assertSelects("payment_due=2025-03&payment_due_from=2025-03-14&payment_due_to=2025-04-30",
+                           'day_start', 'day_end', 'day_after')
+
+    def test_open_ended(self):
+        self.assertSelects("payment_due_from=2025-03-15", 'day_after', 'next_month', 'next_year')
+        self.assertSelects("payment_due_to=2025-03-13", 'day_before')
+        self.assertSelects("payment_due_from=2027-01-01")
+        self.assertSelects("payment_due_to=", *self.contracts)
+
+    def test_malformed(self):
+        for query in ("payment_due=2025-13", "payment_due=2025-02-30", "payment_due=14/03/2025",
+                      "payment_due_from=tomorrow", "payment_due_to=2025-03-14T25:00", "contract_date_from=2025-3-x"):
+            response = self.api_client.get(self.url + query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(query.split('=')[0].removesuffix('_from').removesuffix('_to'), response.data)
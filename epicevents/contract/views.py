@@ -1,81 +1,110 @@
 """ Module contains ViewSets classes for contract CRUD and search operations"""
 
 import logging
+from django.db import IntegrityError, transaction
 from django.http import Http404
+from django.utils import timezone
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework import status
-from client.models import Client
+from client import counters
+from dashboard import rollups
 from event.models import Event
 from event.serializers import EventSerializer
 from usermodel.permissions import RoleBasedPermission
 from usermodel.models import CustomUsers
+from epicevents.bulk import BulkCreateMixin, referenced_user, user_ids, users_with_role
+from epicevents.conditional import ConditionalGetMixin
+from epicevents.export import ExportMixin
+from epicevents.fieldsets import SparseFieldsetMixin
+from epicevents.filters import filter_date_range, filter_owned
+from epicevents.hierarchy import resolve_hierarchy
+from epicevents.response_cache import CachedListMixin, invalidate
+from epicevents.search import get_search_backend
 from .models import Contract
-from .serializers import ContractSerializer
+from .serializers import ContractBulkSerializer, ContractSerializer
 
 logger = logging.getLogger("contract")
 
 
+class ContractAlreadySigned(Exception):
+    """ Raised to roll back a signing which lost the race"""
+
+
 # Create your views here.
-class SearchContractViewSet(ModelViewSet):
+class SearchContractViewSet(ExportMixin, CachedListMixin, ConditionalGetMixin, SparseFieldsetMixin, ModelViewSet):
     """ ViewSet for performing search operations """
 
     serializer_class = ContractSerializer
     permission_classes = [IsAuthenticated, RoleBasedPermission]
+    cache_models = ('contract.Contract', 'client.Client', 'usermodel.CustomUsers')
 
     def get_queryset(self):
-        queryset = Contract.objects.all()
+        # contracts of clients being purged are hidden with them
+        queryset = Contract.objects.filter(client__is_deleted=False)
+        if self.request.method not in SAFE_METHODS:
+            # RoleBasedPermission checks contract.client.sales_contact_id
+            queryset = queryset.select_related('client')
 
         company_name = self.request.query_params.get('company_name', None)
         client_email = self.request.query_params.get('client_email', None)
-        contract_date = self.request.query_params.get('contract_date', None)
+        email_contains = self.request.query_params.get('client_email_contains', None)
         contract_amount = self.request.query_params.get('amount', None)
 
-        if company_name:
-            queryset = queryset.filter(client__company_name__icontains=company_name)
         if client_email:
             queryset = queryset.filter(client__email__iexact=client_email)
-        if contract_date:
-            queryset = queryset.filter(date_created__icontains=contract_date)
+        queryset = filter_date_range(queryset, self.request.query_params, 'contract_date', 'date_created')
+        queryset = filter_date_range(queryset, self.request.query_params, 'payment_due', 'payment_due')
         if contract_amount:
             queryset = queryset.filter(amount=contract_amount)
+        queryset = filter_owned(queryset, self.request)
+
+        search_terms = {}
+        if company_name:
+            search_terms['client__company_name'] = company_name
+        if email_contains:
+            search_terms['client__email'] = email_contains
+        if search_terms:
+            queryset = get_search_backend().search(queryset, **search_terms)
         return queryset
 
 
-class ContractViewSet(ModelViewSet):
+class ContractViewSet(BulkCreateMixin, ConditionalGetMixin, SparseFieldsetMixin, ModelViewSet):
     """ View set for performing Contract CRUD operations"""
 
     serializer_class = ContractSerializer
+    bulk_serializer_class = ContractBulkSerializer
     permission_classes = [IsAuthenticated, RoleBasedPermission]
 
     def get_object(self):
         try:
-            return super().get_object()
+            contract_obj = resolve_hierarchy(self.request, self.kwargs['client_id'],
+                                             self.kwargs[self.lookup_field]).contract
         except Http404:
             message = "Contract with given id does not exist"
             logger.error(message)
-            return Response({"error": message},
-                            status=status.HTTP_404_NOT_FOUND)
+            raise
+        self.check_object_permissions(self.request, contract_obj)
+        return contract_obj
 
     def get_queryset(self):
         client_id = self.kwargs['client_id']
-        return Contract.objects.filter(client__id=client_id)
+        return filter_owned(Contract.objects.filter(client_id=client_id, client__is_deleted=False), self.request)
 
     def get_client_obj(self, client_id):
         try:
-            client_obj = Client.objects.get(id=client_id)
-        except Client.DoesNotExist:
+            client_obj = resolve_hierarchy(self.request, client_id).client
+        except Http404:
             message = "Client with given id does not exist"
             logger.error(message)
-            return Response({"error": message},
-                            status=status.HTTP_404_NOT_FOUND)
+            raise
         return client_obj
-    
+
     def create(self, request, *args, **kwargs):
         client_obj = self.get_client_obj(kwargs.get('client_id'))
-        
+
         data = request.data.copy()
         if client_obj.client_status == "Active":
             if request.user.role.role_name == "Management":
@@ -96,7 +125,7 @@ class ContractViewSet(ModelViewSet):
                     return Response({"error": message},
                                     status=status.HTTP_400_BAD_REQUEST)
             elif request.user.role.role_name == "Sales":
-                if client_obj.sales_contact != request.user:
+                if client_obj.sales_contact_id != request.user.id:
                     message = "You are not assigned to this client."
                     logger.error(message)
                     return Response({"error": message},
@@ -116,68 +145,113 @@ class ContractViewSet(ModelViewSet):
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         else:
-            activate_url = f"http://127.0.0.1:8000/api/clients/{client_id}/activate-client/"
+            activate_url = f"http://127.0.0.1:8000/api/clients/{client_obj.id}/activate-client/"
             return Response({"message": "Client Status is still 'Lead'. Please change it to 'Active'",
                              "activate_client_url": activate_url,
                              "method": "PATCH"},
                             status=status.HTTP_400_BAD_REQUEST)
 
+    def get_bulk_context(self, request, items):
+        client_obj = self.get_client_obj(self.kwargs.get('client_id'))
+
+        if client_obj.client_status != "Active":
+            message = "Client Status is still 'Lead'. Please change it to 'Active'"
+            logger.error(message)
+            return Response({"error": message},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        role_name = request.user.role.role_name
+        if role_name == "Management":
+            sales_ids = users_with_role(user_ids(items, 'sales_contact'), "Sales")
+        elif role_name == "Sales":
+            if client_obj.sales_contact_id != request.user.id:
+                message = "You are not assigned to this client."
+                logger.error(message)
+                return Response({"error": message},
+                                status=status.HTTP_403_FORBIDDEN)
+            sales_ids = set()
+        else:
+            message = "You do not have permission to create contract."
+            logger.error(message)
+            return Response({"error": message},
+                            status=status.HTTP_403_FORBIDDEN)
+        return {'client': client_obj, 'role_name': role_name, 'sales_ids': sales_ids}
+
+    def build_bulk_instance(self, validated_data, item, context):
+        errors = {}
+        if context['role_name'] == "Management":
+            sales_contact_id = referenced_user(item, 'sales_contact', context['sales_ids'])
+            if sales_contact_id is None:
+                errors['sales_contact'] = ["Invalid Sales contact ID." if item.get('sales_contact')
+                                           else "Sales contact is required for Management Users."]
+        else:
+            sales_contact_id = self.request.user.id
+        return Contract(client=context['client'], sales_contact_id=sales_contact_id, **validated_data), errors
+
     @action(detail=True, methods=['patch'], url_path='sign')
     def sign_contract(self, request, client_id=None, pk=None):
         """ Function for separte endpoint to sign contract"""
-        client_obj = self.get_client_obj(client_id)
-
-        # Send custom response if client does not exist
-        if isinstance(client_obj, Response):
-            return client_obj
-        
         contract_obj = self.get_object()
-
-        # Send custom response if contract does not exist
-        if isinstance(contract_obj, Response):
-            return contract_obj
+        client_obj = contract_obj.client
 
         partial = True
         serializer = self.get_serializer(contract_obj, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
 
         # check client status if it is 'Active'
-        if client_obj.client_status == "Active":
-            # if contract status is changed to 'Signed' an event object corresponding to contract is created
-            if serializer.validated_data.get("contract_status") == "Signed" and contract_obj.contract_status != "Signed":
-                # set contract status 'Signed'
-                contract_obj.contract_status = "Signed"
-                contract_obj.save()
+        if client_obj.client_status != "Active":
+            message = "Client Status is still 'Lead' Please change it to 'Active'"
+            logger.error(message)
+            return Response({"error": message},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if serializer.validated_data.get("contract_status") != "Signed":
+            message = "contract_status must be 'Signed' to sign the contract."
+            logger.error(message)
+            return Response({"error": message},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # if contract status is changed to 'Signed' an event object corresponding to contract is created.
+        # Only the request whose UPDATE moves the row out of 'Open' creates it, concurrent
+        # requests wait on the row lock then match no row.
+        try:
+            with transaction.atomic():
+                signed = Contract.objects.filter(pk=contract_obj.pk, contract_status="Open").update(
+                    contract_status="Signed", date_updated=timezone.now())
+                if not signed:
+                    raise ContractAlreadySigned
+                contract_obj.refresh_from_db()
+
+                # queryset updates send no signal
+                rollups.status_changed(contract_obj, previous_status="Open")
+                counters.status_changed(contract_obj, previous_status="Open")
+                transaction.on_commit(lambda: invalidate(Contract))
 
                 # create an event object
                 event_obj = Event.objects.create(
-                    contract=contract_obj
+                    contract=contract_obj,
+                    signing_event=True
                 )
-                event_data = EventSerializer(event_obj).data
-                contract_data = serializer.data
-
-                logger.info("Contract signed successfully !")
-                return Response({
-                    "message": "Contract updated and signed successfully",
-                    "contract": contract_data,
-                    "event": event_data
-                }, status=status.HTTP_200_OK)
-        else:
-            message = "Client Status is still 'Lead' Please change it to 'Active'"
+        except (ContractAlreadySigned, IntegrityError):
+            message = "Contract is already signed."
             logger.error(message)
             return Response({"error": message},
-                            status=status.HTTP_400_BAD_REQUEST)
+                            status=status.HTTP_409_CONFLICT)
 
-    def destroy(self, request, *args, **kwargs):
-        client_obj = self.get_client_obj(kwargs.get('client_id'))
-        if isinstance(client_obj, Response):
-            return client_obj
+        event_data = EventSerializer(event_obj).data
+        contract_data = serializer.data
 
+        logger.info("Contract signed successfully !")
+        return Response({
+            "message": "Contract updated and signed successfully",
+            "contract": contract_data,
+            "event": event_data
+        }, status=status.HTTP_200_OK)
+
+    def destroy(self, request, *args, **kwargs):
         contract_obj = self.get_object()
-        if isinstance(contract_obj, Response):
-            return contract_obj
 
-        if request.user != contract_obj.sales_contact and request.user.role.role_name != 'Management':
+        if contract_obj.sales_contact_id != request.user.id and request.user.role.role_name != 'Management':
             message = "You do not have permission to delete this contract, you are not its owner!"
             logger.error(message)
             return Response({"error": message},
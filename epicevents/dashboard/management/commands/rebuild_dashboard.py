@@ -0,0 +1,12 @@
+""" Module contains the rebuild_dashboard command"""
+
+from django.core.management.base import BaseCommand
+from dashboard.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the sales rollups of /api/dashboard/ from the contracts table"
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Dashboard rebuilt, {rows} rollup rows."))
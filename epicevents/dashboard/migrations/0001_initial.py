@@ -0,0 +1,50 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def build_rollups(apps, schema_editor):
+    """ Fill the rollups from the existing contracts"""
+    Contract = apps.get_model('contract', 'Contract')
+    SalesRollup = apps.get_model('dashboard', 'SalesRollup')
+    totals = (Contract.objects.annotate(due=TruncDate('payment_due'))
+              .values('sales_contact_id', 'contract_status', 'due')
+              .annotate(contract_count=Count('id'), amount=Sum('amount'))
+              .order_by())
+    SalesRollup.objects.bulk_create([
+        SalesRollup(sales_contact_id=row['sales_contact_id'], contract_status=row['contract_status'],
+                    payment_due=row['due'], contract_count=row['contract_count'], amount=row['amount'])
+        for row in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contract', '0004_contract_date_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contract_status', models.CharField(max_length=15)),
+                ('payment_due', models.DateField()),
+                ('contract_count', models.IntegerField(default=0)),
+                ('amount', models.FloatField(default=0)),
+                ('sales_contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sales_contact', 'contract_status', 'payment_due'), name='sales_rollup_unique_key')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:02
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import BooleanField, Case, Count, Sum, Value, When
+
+
+def clear_rollups(apps, schema_editor):
+    """ The rows per payment due day do not fit the new key"""
+    apps.get_model('dashboard', 'SalesRollup').objects.all().delete()
+
+
+def build_rollups(apps, schema_editor):
+    """ Fill the rollups from the existing contracts"""
+    Contract = apps.get_model('contract', 'Contract')
+    SalesRollup = apps.get_model('dashboard', 'SalesRollup')
+    today = django.utils.timezone.localdate()
+    totals = (Contract.objects.annotate(overdue=Case(When(payment_due__date__lt=today, then=Value(True)),
+                                                     default=Value(False), output_field=BooleanField()))
+              .values('sales_contact_id', 'contract_status', 'overdue')
+              .annotate(contract_count=Count('id'), amount=Sum('amount'))
+              .order_by())
+    SalesRollup.objects.bulk_create([
+        SalesRollup(sales_contact_id=row['sales_contact_id'], contract_status=row['contract_status'],
+                    overdue=row['overdue'], as_of=today, contract_count=row['contract_count'],
+                    amount=row['amount'])
+        for row in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_rollups, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='salesrollup',
+            name='sales_rollup_unique_key',
+        ),
+        migrations.RemoveField(
+            model_name='salesrollup',
+            name='payment_due',
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='overdue',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='as_of',
+            field=models.DateField(default=django.utils.timezone.localdate),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('sales_contact', 'contract_status', 'overdue'),
+                                               name='sales_rollup_unique_key'),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
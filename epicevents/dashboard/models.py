@@ -0,0 +1,28 @@
+""" Module contains SalesRollup Schema"""
+
+from django.db import models
+from usermodel.models import CustomUsers
+
+
+# Create your models here.
+class SalesRollup(models.Model):
+    """
+        Contract count and amount per sales contact, status and overdue flag:
+        at most four rows per sales contact. overdue is the payment_due day
+        before as_of, the day the row was built. Kept up to date by the
+        contract signals, see dashboard.rollups.
+    """
+
+    sales_contact = models.ForeignKey(CustomUsers, on_delete=models.CASCADE,
+                                      related_name='sales_rollups')
+    contract_status = models.CharField(max_length=15)
+    overdue = models.BooleanField(default=False)
+    as_of = models.DateField()
+    contract_count = models.IntegerField(default=0)
+    amount = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sales_contact', 'contract_status', 'overdue'],
+                                    name='sales_rollup_unique_key'),
+        ]
@@ -0,0 +1,105 @@
+""" Module contains the incremental maintenance of the sales rollups"""
+
+from collections import defaultdict
+from types import SimpleNamespace
+from django.db import connection, IntegrityError, transaction
+from django.db.models import BooleanField, Case, Count, F, Sum, Value, When
+from django.utils import timezone
+from contract.models import Contract
+from .models import SalesRollup
+
+
+def rollup_key(sales_contact_id, contract_status, payment_due, today):
+    """ Return the rollup row key of a contract: overdue when its payment_due day is before today"""
+    if timezone.is_aware(payment_due):
+        payment_due = timezone.localtime(payment_due)
+    return (sales_contact_id, contract_status, payment_due.date() < today)
+
+
+def contract_key(contract, today):
+    return rollup_key(contract.sales_contact_id, contract.contract_status, contract.payment_due, today)
+
+
+def collect(deltas, contracts, sign, today):
+    """ Add sign * (1, amount) of every contract to deltas"""
+    for contract in contracts:
+        key = contract_key(contract, today)
+        count, amount = deltas[key]
+        deltas[key] = (count + sign, amount + sign * contract.amount)
+    return deltas
+
+
+def apply_deltas(deltas, today):
+    """
+        Apply {key: (count, amount)} to the rollup rows, one UPDATE per key.
+        Rows are created for new keys, as of today, and dropped once empty.
+        Keys are handled in a fixed order so concurrent writers never deadlock.
+    """
+    for key in sorted(deltas):
+        count, amount = deltas[key]
+        if not count and not amount:
+            continue
+        sales_contact_id, contract_status, overdue = key
+        rows = SalesRollup.objects.filter(sales_contact_id=sales_contact_id, contract_status=contract_status,
+                                          overdue=overdue)
+        updated = rows.update(contract_count=F('contract_count') + count, amount=F('amount') + amount)
+        if count < 0:
+            rows.filter(contract_count__lte=0).delete()
+        elif not updated and count > 0:
+            try:
+                with transaction.atomic():
+                    rows.create(sales_contact_id=sales_contact_id, contract_status=contract_status,
+                                overdue=overdue, as_of=today, contract_count=count, amount=amount)
+            except IntegrityError:
+                # created by a concurrent writer in the meantime
+                rows.update(contract_count=F('contract_count') + count, amount=F('amount') + amount)
+
+
+def contracts_changed(previous, current):
+    """
+        Move contracts from their previous state to current, both lists of
+        contracts (or rows). Run in the writer's transaction, see AtomicSaveMixin.
+    """
+    today = timezone.localdate()
+    deltas = defaultdict(lambda: (0, 0.0))
+    collect(deltas, previous, -1, today)
+    collect(deltas, current, 1, today)
+    apply_deltas(deltas, today)
+
+
+def status_changed(contract, previous_status):
+    """ Move contract out of its previous_status rollup, for updates which bypass the signals"""
+    previous = SimpleNamespace(sales_contact_id=contract.sales_contact_id, contract_status=previous_status,
+                               payment_due=contract.payment_due, amount=contract.amount)
+    contracts_changed([previous], [contract])
+
+
+def overdue_annotation(today):
+    """ Annotation splitting the contracts like rollup_key, on the payment_due day of the current timezone"""
+    return Case(When(payment_due__date__lt=today, then=Value(True)), default=Value(False),
+                output_field=BooleanField())
+
+
+def rebuild():
+    """
+        Recompute every rollup row from the contracts table, as of today,
+        return the row count. The overdue split moves with the days without
+        any write, so the dashboard rebuilds rows left from a previous day.
+    """
+    today = timezone.localdate()
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # contract writers wait for the rebuild, their deltas apply on top of it
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {SalesRollup._meta.db_table} IN EXCLUSIVE MODE')
+        SalesRollup.objects.all().delete()
+        totals = (Contract.objects.annotate(overdue=overdue_annotation(today))
+                  .values('sales_contact_id', 'contract_status', 'overdue')
+                  .annotate(contract_count=Count('id'), amount=Sum('amount'))
+                  .order_by())
+        rollups = [SalesRollup(sales_contact_id=row['sales_contact_id'], contract_status=row['contract_status'],
+                               overdue=row['overdue'], as_of=today, contract_count=row['contract_count'],
+                               amount=row['amount'])
+                   for row in totals]
+        SalesRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
@@ -0,0 +1,28 @@
+""" Module contains signal receivers keeping the sales rollups up to date"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from contract.models import Contract
+from epicevents.signals import post_bulk_create, track_previous
+from .rollups import contracts_changed
+
+ROLLUP_FIELDS = ('sales_contact_id', 'contract_status', 'payment_due', 'amount')
+
+
+track_previous(Contract, ROLLUP_FIELDS)
+
+
+@receiver(post_save, sender=Contract)
+def update_rollup_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    contracts_changed([previous] if previous is not None else [], [instance])
+
+
+@receiver(post_delete, sender=Contract)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    contracts_changed([instance], [])
+
+
+@receiver(post_bulk_create, sender=Contract)
+def update_rollup_on_bulk_create(sender, instances, **kwargs):
+    contracts_changed([], instances)
@@ -0,0 +1,171 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from client.models import Client
+from contract.models import Contract
+from epicevents.testing import QueryBudgetTestCase
+from usermodel.models import CustomUsers, Roles
+from usermodel.tokens import RoleRefreshToken
+from .models import SalesRollup
+from .rollups import rebuild
+
+
+def rollups():
+    """ Return {(sales contact id, status, overdue): (count, amount)} of the rollup table"""
+    return {(row.sales_contact_id, row.contract_status, row.overdue): (row.contract_count, row.amount)
+            for row in SalesRollup.objects.all()}
+
+
+# Create your tests here.
+class QueryBudgetTest(QueryBudgetTestCase):
+    """ Query budget of the dashboard"""
+
+    routes = [('dashboard', 'get')]
+    requests = {
+        'dashboard:get': ("Management", {}, None),
+    }
+
+
+class RollupTest(TestCase):
+    """ Incremental maintenance of the sales rollups, checked against rebuild_dashboard"""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Roles.objects.create(role_name="Sales")
+        cls.sales = CustomUsers.objects.create_user(username="sales", password="pw12345!", role=role)
+        cls.other = CustomUsers.objects.create_user(username="other", password="pw12345!", role=role)
+        cls.client_obj = Client.objects.create(first_name="a", last_name="b", email="client@example.com",
+                                               company_name="Company", sales_contact=cls.sales,
+                                               client_status="Active")
+        cls.due = timezone.now() + timedelta(days=10)
+
+    def create_contract(self, amount, **fields):
+        fields.setdefault('sales_contact', self.sales)
+        fields.setdefault('payment_due', self.due)
+        return Contract.objects.create(client=self.client_obj, amount=amount, **fields)
+
+    def assertRebuilt(self):
+        """ The incremental rows equal the ones rebuilt from the contracts table"""
+        incremental = rollups()
+        rebuild()
+        self.assertEqual(rollups(), incremental)
+
+    def test_create(self):
+        self.create_contract(100)
+        self.create_contract(50)
+        self.create_contract(30, sales_contact=self.other, contract_status="Signed")
+        self.assertEqual(rollups(), {
+            (self.sales.pk, "Open", False): (2, 150),
+            (self.other.pk, "Signed", False): (1, 30),
+        })
+        self.assertRebuilt()
+
+    def test_amount_and_due_change(self):
+        contract = self.create_contract(100)
+        self.create_contract(50)
+        contract.amount = 120
+        contract.save()
+        self.assertEqual(rollups(), {(self.sales.pk, "Open", False): (2, 170)})
+
+        # another day before today stays in the same row
+        contract.payment_due = self.due + timedelta(days=1)
+        contract.save()
+        self.assertEqual(rollups(), {(self.sales.pk, "Open", False): (2, 170)})
+
+        contract.payment_due = timezone.now() - timedelta(days=2)
+        contract.save()
+        self.assertEqual(rollups(), {
+            (self.sales.pk, "Open", False): (1, 50),
+            (self.sales.pk, "Open", True): (1, 120),
+        })
+        self.assertRebuilt()
+
+    def test_sign(self):
+        contract = self.create_contract(100)
+        self.create_contract(50)
+        api_client = APIClient()
+        token = RoleRefreshToken.for_user(self.sales).access_token
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = api_client.patch(f"/api/clients/{self.client_obj.pk}/contracts/{contract.pk}/sign/",
+                                    {"contract_status": "Signed"}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(rollups(), {
+            (self.sales.pk, "Open", False): (1, 50),
+            (self.sales.pk, "Signed", False): (1, 100),
+        })
+        self.assertRebuilt()
+
+    def test_delete(self):
+        contract = self.create_contract(100)
+        self.create_contract(30, sales_contact=self.other)
+        contract.delete()
+        # emptied rows are dropped
+        self.assertEqual(rollups(), {(self.other.pk, "Open", False): (1, 30)})
+
+        # cascaded from the client
+        self.client_obj.delete()
+        self.assertEqual(rollups(), {})
+        self.assertRebuilt()
+
+    def test_rebuild_dashboard(self):
+        self.create_contract(100)
+        self.create_contract(30, contract_status="Signed")
+        expected = rollups()
+        SalesRollup.objects.update(contract_count=99, amount=0)
+        SalesRollup.objects.create(sales_contact=self.other, contract_status="Open", as_of=timezone.localdate(),
+                                   contract_count=1, amount=1)
+
+        out = StringIO()
+        call_command('rebuild_dashboard', stdout=out)
+        self.assertIn("2 rollup rows", out.getvalue())
+        self.assertEqual(rollups(), expected)
+
+
+class DashboardViewTest(TestCase):
+    """ GET dashboard/ totals, for Management users only"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sales = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                                    role=Roles.objects.create(role_name="Sales"))
+        cls.manager = CustomUsers.objects.create_user(username="manager", password="pw12345!",
+                                                      role=Roles.objects.create(role_name="Management"))
+        client_obj = Client.objects.create(first_name="a", last_name="b", email="client@example.com",
+                                           company_name="Company", sales_contact=cls.sales)
+        now = timezone.now()
+        for amount, status, due in ((100, "Open", now), (40, "Signed", now + timedelta(days=5)),
+                                    (60, "Signed", now - timedelta(days=5))):
+            Contract.objects.create(client=client_obj, sales_contact=cls.sales, amount=amount,
+                                    contract_status=status, payment_due=due)
+
+    def get(self, user):
+        api_client = APIClient()
+        token = RoleRefreshToken.for_user(user).access_token
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return api_client.get("/api/dashboard/")
+
+    def test_totals(self):
+        response = self.get(self.manager)
+        self.assertEqual(response.status_code, 200)
+        expected = {'open_count': 1, 'open_amount': 100, 'signed_count': 2, 'signed_amount': 100,
+                    'overdue_count': 1, 'overdue_amount': 60}
+        self.assertEqual(response.data['totals'], expected)
+        [row] = response.data['sales_contacts']
+        self.assertEqual(row['sales_contact']['id'], self.sales.pk)
+
+    def test_rebuilt_next_day(self):
+        """ A signed contract becomes overdue once its day is past, without any write"""
+        later = timezone.localdate() + timedelta(days=6)
+        self.assertEqual(self.get(self.manager).data['totals']['overdue_count'], 1)
+        with mock.patch('django.utils.timezone.localdate', return_value=later):
+            response = self.get(self.manager)
+        self.assertEqual((response.data['totals']['overdue_count'], response.data['totals']['overdue_amount']),
+                         (2, 100))
+        self.assertEqual(set(SalesRollup.objects.values_list('as_of', flat=True)), {later})
+
+    def test_refused(self):
+        self.assertEqual(self.get(self.sales).status_code, 403)
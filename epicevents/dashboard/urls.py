@@ -0,0 +1,8 @@
+""" Module contains url endpoints for Dashboard"""
+
+from django.urls import path
+from .views import DashboardView
+
+urlpatterns = [
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+]
@@ -0,0 +1,67 @@
+""" Module contains the sales pipeline dashboard view"""
+
+from django.db.models import Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from usermodel.permissions import ManagementPermission
+from .models import SalesRollup
+from .rollups import rebuild
+
+TOTALS = ('open_count', 'open_amount', 'signed_count', 'signed_amount', 'overdue_count', 'overdue_amount')
+
+
+def rollup_sum(field, condition):
+    return Coalesce(Sum(field, filter=condition), 0, output_field=SalesRollup._meta.get_field(field))
+
+
+# Create your views here.
+class DashboardView(APIView):
+    """
+        Revenue per sales contact, read from the rollup table in one query.
+        - open / signed: count and amount of the contracts of each status.
+        - overdue: signed contracts whose payment_due day is past.
+        The first request of a day rebuilds the rollups, whose overdue
+        split is from a previous day (or run rebuild_dashboard daily).
+    """
+
+    permission_classes = [IsAuthenticated, ManagementPermission]
+
+    def rows(self):
+        open_ = Q(contract_status='Open')
+        signed = Q(contract_status='Signed')
+        overdue = signed & Q(overdue=True)
+        return list(SalesRollup.objects
+                    .values('sales_contact_id', 'sales_contact__username',
+                            'sales_contact__first_name', 'sales_contact__last_name')
+                    .annotate(open_count=rollup_sum('contract_count', open_),
+                              open_amount=rollup_sum('amount', open_),
+                              signed_count=rollup_sum('contract_count', signed),
+                              signed_amount=rollup_sum('amount', signed),
+                              overdue_count=rollup_sum('contract_count', overdue),
+                              overdue_amount=rollup_sum('amount', overdue),
+                              as_of=Min('as_of'))
+                    .order_by('sales_contact_id'))
+
+    def get(self, request):
+        rows = self.rows()
+        if any(row['as_of'] < timezone.localdate() for row in rows):
+            rebuild()
+            rows = self.rows()
+
+        sales_contacts = []
+        totals = dict.fromkeys(TOTALS, 0)
+        for row in rows:
+            sales_contacts.append({
+                'sales_contact': {'id': row['sales_contact_id'],
+                                  'username': row['sales_contact__username'],
+                                  'first_name': row['sales_contact__first_name'],
+                                  'last_name': row['sales_contact__last_name']},
+                **{name: row[name] for name in TOTALS},
+            })
+            for name in TOTALS:
+                totals[name] += row[name]
+
+        return Response({'sales_contacts': sales_contacts, 'totals': totals})
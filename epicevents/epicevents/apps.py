@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class EpiceventsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'epicevents'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import checks  # noqa: F401
+        from .metrics import install_query_recorder
+        from .response_cache import CACHED_MODELS, connect_receivers
+        connect_receivers(CACHED_MODELS)
+        connection_created.connect(install_query_recorder)
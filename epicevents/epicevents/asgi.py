@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'epicevents.settings')
+# read by the settings, persistent connections are off by default under ASGI
+os.environ.setdefault('SERVE_ASGI', 'true')
 
 application = get_asgi_application()
@@ -0,0 +1,89 @@
+""" Module contains the async (ASGI) read path of the client, contract and event endpoints"""
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.urls import path
+from django.views import View
+from rest_framework.exceptions import APIException
+from .pagination import (DateUpdatedCursorPagination, decode_cursor, encode_cursor, keyset_filter,
+                         ordering_values)
+
+
+class AsyncReadView(View):
+    """
+        Async list / retrieve endpoint reusing a sync viewset for everything
+        but the database reads.
+        - Authentication, permissions and the filtered queryset come from
+          viewset_class, built in a worker thread (sync_to_async).
+        - Rows are fetched with aiterator() / aget(), so the event loop is
+          never blocked and a waiting request holds no thread.
+        - Lists are paginated with a compound keyset cursor on the ordering
+          of DateUpdatedCursorPagination, e.g. (date_updated, id).
+        Writes stay on the sync DRF viewsets.
+    """
+
+    viewset_class = None
+    http_method_names = ['get', 'head', 'options']
+
+    def prepare(self, request, action, kwargs):
+        """ Return (viewset, queryset) once the request is authenticated and allowed"""
+        viewset = self.viewset_class(action_map={'get': action}, args=(), kwargs=kwargs, format_kwarg=None)
+        viewset.request = viewset.initialize_request(request, **kwargs)
+        viewset.headers = {}
+        viewset.perform_authentication(viewset.request)
+        viewset.check_permissions(viewset.request)
+        return viewset, viewset.filter_queryset(viewset.get_queryset())
+
+    async def get(self, request, pk=None, **kwargs):
+        action = 'list' if pk is None else 'retrieve'
+        try:
+            viewset, queryset = await sync_to_async(self.prepare)(request, action, kwargs)
+        except APIException as exc:
+            return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+
+        if pk is not None:
+            return await self.retrieve(viewset, queryset, pk)
+        return await self.list(viewset, queryset)
+
+    async def retrieve(self, viewset, queryset, pk):
+        model = queryset.model
+        try:
+            instance = await queryset.aget(pk=pk)
+        except (model.DoesNotExist, ValueError):
+            return JsonResponse({"error": f"{model.__name__} with given id does not exist"}, status=404)
+        return JsonResponse(viewset.get_serializer(instance).data)
+
+    async def list(self, viewset, queryset):
+        request = viewset.request
+        paginator = DateUpdatedCursorPagination()
+        page_size = paginator.get_page_size(request)
+        ordering = paginator.get_ordering(request, queryset, viewset)
+        queryset = queryset.order_by(*ordering)
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            position = ordering_values(queryset.model, ordering, decode_cursor(cursor))
+            if position is None:
+                return JsonResponse({"detail": paginator.invalid_cursor_message}, status=404)
+            queryset = queryset.filter(keyset_filter(ordering, position))
+
+        objects = [obj async for obj in queryset[:page_size + 1].aiterator()]
+        next_link = None
+        if len(objects) > page_size:
+            objects = objects[:page_size]
+            last = objects[-1]
+            params = request.query_params.copy()
+            params['cursor'] = encode_cursor([getattr(last, field.lstrip('-')) for field in ordering])
+            next_link = request.build_absolute_uri(request.path) + '?' + params.urlencode()
+
+        results = viewset.get_serializer(objects, many=True).data
+        return JsonResponse({"next": next_link, "previous": None, "results": results})
+
+
+def async_routes(prefix, viewset_class):
+    """ Return the list and detail url patterns of an async read endpoint"""
+    view = AsyncReadView.as_view(viewset_class=viewset_class)
+    return [
+        path(f'{prefix}/', view, name=f'async-{prefix}-list'),
+        path(f'{prefix}/<pk>/', view, name=f'async-{prefix}-detail'),
+    ]
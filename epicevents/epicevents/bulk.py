@@ -0,0 +1,114 @@
+""" Module contains the bulk create mixin of the client, contract and event viewsets"""
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from usermodel.models import CustomUsers
+from .signals import post_bulk_create
+
+
+def user_ids(items, field):
+    """ Return the set of integer user ids referenced by field in items"""
+    ids = set()
+    for item in items:
+        try:
+            ids.add(int(item.get(field)))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+def users_with_role(ids, role_name):
+    """ Return the subset of ids belonging to users of role_name, in one query"""
+    if not ids:
+        return set()
+    return set(CustomUsers.objects.filter(id__in=ids, role__role_name=role_name)
+               .values_list('id', flat=True))
+
+
+def referenced_user(item, field, valid_ids):
+    """ Return the id given in item[field] when it is one of valid_ids, else None"""
+    try:
+        user_id = int(item.get(field))
+    except (TypeError, ValueError):
+        return None
+    return user_id if user_id in valid_ids else None
+
+
+class BulkCreateMixin:
+    """
+        Adds POST <list route>/bulk/ accepting an array of objects.
+        - get_bulk_context() runs the checks shared by all items and the
+          lookups of every referenced row at once, it may return a Response
+          to reject the whole request.
+        - Each item is validated with bulk_serializer_class, whose related
+          fields are read-only so validation runs no query, then turned into
+          an unsaved instance by build_bulk_instance().
+        Nothing is inserted when an item is invalid, the response then holds
+        one error dict per item (empty for valid ones). Otherwise all rows are
+        inserted with bulk_create in one transaction. When a concurrent request
+        inserted a conflicting row after the checks, nothing is inserted and
+        the response is a 409 with the errors of get_bulk_conflicts().
+    """
+
+    bulk_serializer_class = None
+
+    def get_bulk_context(self, request, items):
+        return {}
+
+    def build_bulk_instance(self, validated_data, item, context):
+        """ Return (instance, errors) for one validated item"""
+        raise NotImplementedError
+
+    def get_bulk_conflicts(self, instances):
+        """ Return one error dict per instance (empty for valid ones) once bulk_create failed on a constraint"""
+        return [{} for _ in instances]
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request, *args, **kwargs):
+        """ Function to create many objects in one request"""
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Expected a non-empty list of objects."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BULK_CREATE_MAX_ITEMS:
+            return Response({"error": f"At most {settings.BULK_CREATE_MAX_ITEMS} objects can be created at once."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(item, dict) for item in items):
+            return Response({"error": "Expected a non-empty list of objects."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        context = self.get_bulk_context(request, items)
+        if isinstance(context, Response):
+            return context
+
+        instances = []
+        errors = []
+        for item in items:
+            serializer = self.bulk_serializer_class(data=item)
+            if not serializer.is_valid():
+                errors.append(serializer.errors)
+                continue
+            instance, item_errors = self.build_bulk_instance(serializer.validated_data, item, context)
+            errors.append(item_errors)
+            instances.append(instance)
+
+        if any(errors):
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.bulk_serializer_class.Meta.model
+        try:
+            with transaction.atomic():
+                created = model.objects.bulk_create(instances, batch_size=settings.BULK_CREATE_BATCH_SIZE)
+                post_bulk_create.send(sender=model, instances=created)
+        except IntegrityError:
+            errors = self.get_bulk_conflicts(instances)
+            if not any(errors):
+                errors = [{"non_field_errors": ["Conflicts with a row created by another request."]}
+                          for _ in instances]
+            return Response({"errors": errors}, status=status.HTTP_409_CONFLICT)
+
+        serializer = self.get_serializer(created, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,67 @@
+""" Module contains the system checks of the deployment settings"""
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# cache backends keeping their entries in the memory of each process
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def process_local(alias):
+    return settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_CACHES
+
+
+@register()
+def check_shared_caches(app_configs, **kwargs):
+    """ With several worker processes, the caches holding invalidation state must be shared"""
+    if settings.WEB_WORKERS <= 1:
+        return []
+    errors = []
+    if process_local(settings.SEARCH_CACHE_ALIAS):
+        errors.append(Error(
+            f"The '{settings.SEARCH_CACHE_ALIAS}' cache is local to each of the {settings.WEB_WORKERS} workers, "
+            "a write served by one worker would not invalidate the search responses cached by the others.",
+            hint="Set SEARCH_CACHE_BACKEND to a shared backend, e.g. "
+                 "django.core.cache.backends.redis.RedisCache or FileBasedCache.",
+            id='epicevents.E001',
+        ))
+    if settings.JWT_STATELESS_READS and process_local('default'):
+        errors.append(Error(
+            f"The 'default' cache is local to each of the {settings.WEB_WORKERS} workers, a role change "
+            "served by one worker would not revoke the tokens read statelessly by the others.",
+            hint="Set DEFAULT_CACHE_BACKEND (and DEFAULT_CACHE_LOCATION) to a shared backend, e.g. "
+                 "django.core.cache.backends.redis.RedisCache, or JWT_STATELESS_READS = False.",
+            id='epicevents.E002',
+        ))
+    return errors
+
+
+@register()
+def check_log_rotation(app_configs, **kwargs):
+    """ Log files shared by several worker processes must not be rotated by each of them"""
+    if settings.WEB_WORKERS <= 1 or settings.LOG_ROTATION == 'external':
+        return []
+    return [Error(
+        f"The log files are rotated by each of the {settings.WEB_WORKERS} workers (LOG_ROTATION="
+        f"{settings.LOG_ROTATION}), they would rename and gzip the files under each other and lose records.",
+        hint="Set LOG_ROTATION=external and rotate the files with logrotate, WatchedFileHandler "
+             "reopens them once moved away.",
+        id='epicevents.E003',
+    )]
+
+
+@register()
+def check_asgi_connections(app_configs, **kwargs):
+    """ Under ASGI, connections kept by the short-lived sync threads are leaked"""
+    if not settings.SERVE_ASGI:
+        return []
+    return [
+        Warning(
+            f"The '{alias}' database keeps its connections (CONN_MAX_AGE={database['CONN_MAX_AGE']}) while served "
+            "under ASGI, each thread running sync code keeps its own and they are never closed.",
+            hint="Set DB_CONN_MAX_AGE=0, or DB_POOL=true to reuse connections through a pool.",
+            id='epicevents.W001',
+        )
+        for alias, database in settings.DATABASES.items()
+        if database.get('CONN_MAX_AGE', 0) != 0
+    ]
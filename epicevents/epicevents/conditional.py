@@ -0,0 +1,94 @@
+""" Module contains ETag / Last-Modified support of the list and detail endpoints"""
+
+import hashlib
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+from .fieldsets import requested_expansions, requested_fields
+
+
+class ConditionalGetMixin:
+    """
+        ViewSet mixin answering conditional GETs from date_updated.
+        - retrieve: ETag and Last-Modified come from the object date_updated.
+        - list: the ETag comes from the page rows date_updated, count and
+          ids, plus the pagination links. Lists send no Last-Modified, a row
+          deleted from the page leaves max(date_updated) unchanged, so
+          If-Modified-Since alone would get a false 304.
+        Both include the query string and the caller, so ?fields=, ?expand=
+        and ?owned= give distinct weak ETags. A matching If-None-Match (or
+        If-Modified-Since on details) gets a 304 before anything is serialized.
+    """
+
+    def get_validators(self, objects, *extra):
+        """ Return (weak etag, last modified timestamp) of objects"""
+        digest = hashlib.sha1()
+        digest.update(self.request.get_full_path().encode())
+        digest.update(str(self.request.user.pk).encode())
+        for value in extra:
+            digest.update(str(value).encode())
+
+        # inlined objects which track their own updates
+        expandable_fields = getattr(self.get_serializer_class().Meta, 'expandable_fields', {})
+        expansions = requested_expansions(self.request, expandable_fields)
+        fields = requested_fields(self.request)
+        if fields:
+            expansions &= fields
+        model = self.get_serializer_class().Meta.model
+        expansions = sorted(name for name in expansions
+                            if any(field.name == 'date_updated'
+                                   for field in model._meta.get_field(name).related_model._meta.fields))
+        last_modified = None
+        for obj in objects:
+            digest.update(f"{obj.pk}:{obj.date_updated.isoformat()}".encode())
+            if last_modified is None or obj.date_updated > last_modified:
+                last_modified = obj.date_updated
+            for name in expansions:
+                related = getattr(obj, name)
+                if related is not None:
+                    digest.update(f"{name}:{related.pk}:{related.date_updated.isoformat()}".encode())
+                    last_modified = max(last_modified, related.date_updated)
+
+        digest.update(f"count:{len(objects)}".encode())
+        etag = 'W/' + quote_etag(digest.hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        return etag, timestamp
+
+    def conditional_response(self, response, etag, last_modified):
+        """ Set the validators on a response, 304 when the client copy is fresh"""
+        not_modified = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            response = not_modified
+        elif callable(response):
+            response = response()
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            etag, _ = self.get_validators(page, self.paginator.get_next_link(),
+                                          self.paginator.get_previous_link())
+
+            def render():
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+        else:
+            objects = list(queryset)
+            etag, _ = self.get_validators(objects)
+
+            def render():
+                serializer = self.get_serializer(objects, many=True)
+                return Response(serializer.data)
+
+        return self.conditional_response(render, etag, None)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_validators([instance])
+        return self.conditional_response(lambda: Response(self.get_serializer(instance).data),
+                                         etag, last_modified)
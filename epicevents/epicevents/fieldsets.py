@@ -0,0 +1,80 @@
+""" Module contains sparse fieldsets (?fields=) and expansions (?expand=) of the API"""
+
+from rest_framework.permissions import SAFE_METHODS
+from django.utils.module_loading import import_string
+
+
+def _param_set(request, name):
+    value = request.query_params.get(name, '')
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+def requested_fields(request):
+    """ Return the set of field names asked with ?fields=, empty for all"""
+    return _param_set(request, 'fields')
+
+
+def requested_expansions(request, expandable_fields):
+    """ Return the names asked with ?expand= which can be expanded"""
+    return _param_set(request, 'expand') & set(expandable_fields)
+
+
+class DynamicFieldsMixin:
+    """
+        Serializer mixin applying ?fields= and ?expand= on GET requests.
+        Meta.expandable_fields maps a related field to the dotted path of the
+        serializer used to inline it, e.g.
+        {'client': 'client.serializers.ClientSerializer'}.
+        Only the root serializer reads the query string, inlined objects are
+        serialized with all their fields.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        fields = requested_fields(request)
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+        expandable_fields = getattr(self.Meta, 'expandable_fields', {})
+        for name in requested_expansions(request, expandable_fields):
+            if name in self.fields:
+                self.fields[name] = import_string(expandable_fields[name])(read_only=True)
+
+
+class SparseFieldsetMixin:
+    """
+        ViewSet mixin loading only what DynamicFieldsMixin serializes.
+        On list and retrieve, ?fields= becomes a matching .only() and every
+        expanded relation is fetched with select_related, so the query count
+        of a page does not depend on its size.
+    """
+
+    # columns always loaded, the cursor pagination reads them
+    sparse_required_fields = ('id', 'date_updated')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+
+        meta = self.get_serializer_class().Meta
+        fields = requested_fields(self.request)
+        expansions = requested_expansions(self.request, getattr(meta, 'expandable_fields', {}))
+        if fields:
+            expansions &= fields
+        if expansions:
+            queryset = queryset.select_related(*expansions)
+
+        if fields:
+            concrete_fields = {field.name for field in queryset.model._meta.concrete_fields}
+            selected = queryset.query.select_related
+            if isinstance(selected, dict):
+                fields |= set(selected)
+            only = (fields & concrete_fields) | set(self.sparse_required_fields)
+            queryset = queryset.only(*only)
+        return queryset
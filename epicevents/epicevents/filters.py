@@ -0,0 +1,95 @@
+""" Module contains query parameter filters shared by the search endpoints"""
+
+import datetime
+import re
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+YEAR_RE = re.compile(r'^(\d{4})$')
+MONTH_RE = re.compile(r'^(\d{4})-(\d{1,2})$')
+DATE_RE = re.compile(r'^\d{4}-\d{1,2}-\d{1,2}$')
+
+
+def _aware(value):
+    if timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def _day_start(day):
+    return _aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _period(value):
+    """ Return [start, end) of a 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD' shorthand"""
+    match = YEAR_RE.match(value)
+    if match:
+        year = int(match.group(1))
+        return _day_start(datetime.date(year, 1, 1)), _day_start(datetime.date(year + 1, 1, 1))
+
+    match = MONTH_RE.match(value)
+    if match:
+        year, month = int(match.group(1)), int(match.group(2))
+        first = datetime.date(year, month, 1)
+        following = datetime.date(year + month // 12, month % 12 + 1, 1)
+        return _day_start(first), _day_start(following)
+
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return _day_start(day), _day_start(day + datetime.timedelta(days=1))
+
+
+def _bound(value, upper):
+    """ Parse a from/to bound, a bare date as 'to' includes the whole day"""
+    day = parse_date(value) if DATE_RE.match(value) else None
+    if day is not None:
+        if upper:
+            day += datetime.timedelta(days=1)
+        return _day_start(day)
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    return _aware(moment)
+
+
+def filter_date_range(queryset, query_params, param, field):
+    """
+        Filter queryset on a datetime field with half-open range predicates.
+        - ?<param>=2025, 2025-03 or 2025-03-14 selects a year, month or day
+        - ?<param>_from= and ?<param>_to= take dates or ISO datetimes
+        Only field__gte / field__lt are emitted so a B-tree index on field
+        is used, instead of casting every timestamp to text.
+    """
+    lower = upper = None
+    try:
+        value = query_params.get(param)
+        if value:
+            lower, upper = _period(value.strip())
+
+        value = query_params.get(f"{param}_from")
+        if value:
+            start = _bound(value.strip(), upper=False)
+            lower = start if lower is None else max(lower, start)
+
+        value = query_params.get(f"{param}_to")
+        if value:
+            end = _bound(value.strip(), upper=True)
+            upper = end if upper is None else min(upper, end)
+    except ValueError as error:
+        raise ValidationError({param: f"Invalid date '{error}', use YYYY, YYYY-MM, YYYY-MM-DD "
+                                      "or an ISO 8601 datetime."})
+
+    if lower is not None:
+        queryset = queryset.filter(**{f"{field}__gte": lower})
+    if upper is not None:
+        queryset = queryset.filter(**{f"{field}__lt": upper})
+    return queryset
+
+
+def filter_owned(queryset, request):
+    """ Apply ?owned=true, keeping the rows request.user may edit"""
+    if request.query_params.get('owned', '').lower() in ('1', 'true', 'yes'):
+        return queryset.filter_for_user(request.user)
+    return queryset
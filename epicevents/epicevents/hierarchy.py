@@ -0,0 +1,57 @@
+""" Module contains the resolver of nested client/contract/event routes"""
+
+from collections import namedtuple
+from django.http import Http404
+from client.models import Client
+from contract.models import Contract
+from event.models import Event
+
+Hierarchy = namedtuple('Hierarchy', ['client', 'contract', 'event'])
+
+
+def _fetch(client_id, contract_id, event_id):
+    if event_id is not None:
+        event_obj = Event.objects.select_related('contract__client').get(
+            pk=event_id, contract_id=contract_id, contract__client_id=client_id,
+            contract__client__is_deleted=False)
+        return Hierarchy(event_obj.contract.client, event_obj.contract, event_obj)
+
+    if contract_id is not None:
+        contract_obj = Contract.objects.select_related('client').get(
+            pk=contract_id, client_id=client_id, client__is_deleted=False)
+        return Hierarchy(contract_obj.client, contract_obj, None)
+
+    return Hierarchy(Client.objects.get(pk=client_id), None, None)
+
+
+def resolve_hierarchy(request, client_id, contract_id=None, event_id=None):
+    """
+        Return the Hierarchy(client, contract, event) of a nested route.
+        - The deepest object is fetched with its parents in one joined query
+          filtered on the ids of the URL, so a contract of another client
+          (or an event of another contract) is not found.
+        - Results are cached on the request, the permission check and the
+          view share the same instances.
+        Raise Http404 when any level is missing or does not match.
+    """
+    cache = request.__dict__.setdefault('_hierarchy_cache', {})
+    key = (str(client_id), contract_id and str(contract_id), event_id and str(event_id))
+    if key not in cache:
+        try:
+            cache[key] = _fetch(client_id, contract_id, event_id)
+        except (Client.DoesNotExist, Contract.DoesNotExist, Event.DoesNotExist,
+                ValueError, TypeError):
+            if event_id is not None:
+                message = "Event with given id does not exist for this client and contract"
+            elif contract_id is not None:
+                message = "Contract with given id does not exist for this client"
+            else:
+                message = "Client with given id does not exist"
+            raise Http404(message)
+
+        hierarchy = cache[key]
+        # parents are now known too, later lookups of them are free
+        cache.setdefault((key[0], None, None), Hierarchy(hierarchy.client, None, None))
+        if key[1] is not None:
+            cache.setdefault((key[0], key[1], None), Hierarchy(hierarchy.client, hierarchy.contract, None))
+    return cache[key]
@@ -0,0 +1,170 @@
+""" Module contains the queued, rotating and JSON logging pieces used by settings.LOGGING"""
+
+import atexit
+import copy
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.module_loading import import_string
+
+# (request id, request, start time) of the request being served, set by RequestContextMiddleware
+request_context = ContextVar('request_context', default=None)
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as source_file, gzip.open(dest, 'wb') as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+class CompressedRotatingFileHandler(RotatingFileHandler):
+    """ RotatingFileHandler (maxBytes) gzipping the rotated files"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.namer = _gzip_namer
+        self.rotator = _gzip_rotator
+
+
+class CompressedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """ TimedRotatingFileHandler (when / interval) gzipping the rotated files"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.namer = _gzip_namer
+        self.rotator = _gzip_rotator
+
+
+class _Listener(QueueListener):
+    """ Listener thread of every queued handler, queue items are (target handler, record)"""
+
+    def handle(self, item):
+        handler, record = item
+        handler.handle(record)
+
+
+_queue = queue.SimpleQueue()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = _Listener(_queue)
+            _listener.start()
+            atexit.register(stop_listener)
+
+
+def stop_listener():
+    """ Write out the queued records and stop the listener thread"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+class QueuedHandler(QueueHandler):
+    """
+        Hands records to the shared listener thread, which runs target.
+        The request thread only merges the message arguments, formatting and
+        disk writes (rotation and compression included) happen in the
+        listener. Level and formatter set by dictConfig go to the target,
+        filters stay here so they see the request context.
+    """
+
+    def __init__(self, target):
+        super().__init__(_queue)
+        self.target = target
+        _start_listener()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def setLevel(self, level):
+        super().setLevel(level)
+        self.target.setLevel(level)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self.queue.put_nowait((self.target, record))
+
+    def close(self):
+        self.target.close()
+        super().close()
+
+
+def queued(handler, enabled=True):
+    """
+        dictConfig factory ('()') of a handler run by the listener thread.
+        handler is a handler config such as {'class': 'logging.StreamHandler'}.
+        With enabled=False the handler is returned as is, records are then
+        written by the logging thread.
+    """
+    handler = dict(handler)
+    target = import_string(handler.pop('class'))(**handler)
+    return QueuedHandler(target) if enabled else target
+
+
+class RequestContextFilter(logging.Filter):
+    """ Adds request_id, user_id and latency_ms (time since the request started) to records"""
+
+    def filter(self, record):
+        context = request_context.get()
+        record.request_id = record.user_id = record.latency_ms = None
+        if context is not None:
+            request_id, request, start = context
+            record.request_id = request_id
+            record.user_id = request_user_id(request)
+            record.latency_ms = round((time.perf_counter() - start) * 1000, 2)
+        return True
+
+
+def request_user_id(request):
+    """ Return the id of the authenticated user, without loading a lazy session user"""
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject):
+        # session user not evaluated yet, DRF replaces it once authenticated
+        user = user._wrapped
+    if user is None or user is empty:
+        return None
+    return getattr(user, 'pk', None)
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per line, with the request context of RequestContextFilter"""
+
+    def format(self, record):
+        data = {
+            'timestamp': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'user_id': getattr(record, 'user_id', None),
+            'latency_ms': getattr(record, 'latency_ms', None),
+        }
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
@@ -0,0 +1,240 @@
+""" Module contains the seed_epicevents command generating synthetic data"""
+
+import csv
+import io
+import random
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from client.counters import reconcile
+from client.models import Client
+from contract.models import Contract
+from dashboard.rollups import rebuild
+from epicevents.checks import process_local
+from epicevents.response_cache import invalidate
+from epicevents.search import TrigramSearchBackend, get_search_backend, invalidate_indexes
+from event.models import Event
+from usermodel.models import CustomUsers, Roles
+
+FIRST_NAMES = ("Alice", "Bruno", "Chloe", "David", "Emma", "Farid", "Grace", "Hugo", "Ines", "Jules",
+               "Karim", "Lea", "Marc", "Nina", "Omar", "Paula", "Quentin", "Rosa", "Sami", "Tina")
+LAST_NAMES = ("Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy",
+              "Moreau", "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux")
+COMPANY_WORDS = ("Atlas", "Boreal", "Cobalt", "Delta", "Ember", "Falcon", "Granite", "Horizon", "Iris",
+                 "Juniper", "Kepler", "Lumen", "Meridian", "Nova", "Orion", "Pioneer", "Quartz", "Summit")
+COMPANY_SUFFIXES = ("Events", "Group", "Partners", "Labs", "Industries", "Studio", "Consulting")
+EVENT_NOTES = ("Wedding reception", "Product launch", "Annual general meeting", "Team building day",
+               "Charity gala", "Trade show booth", "Birthday party", "Conference with workshops")
+
+
+class Command(BaseCommand):
+    help = ("Generate synthetic users, clients, contracts and events, deterministically from --seed. "
+            "Rows are inserted in chunks with bulk_create, or COPY on PostgreSQL.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=10000)
+        parser.add_argument('--sales', type=int, default=20, help="sales users")
+        parser.add_argument('--support', type=int, default=30, help="support users")
+        parser.add_argument('--management', type=int, default=5, help="management users")
+        parser.add_argument('--lead-ratio', type=float, default=0.3, help="share of Lead clients")
+        parser.add_argument('--inactive-ratio', type=float, default=0.05, help="share of Inactive clients")
+        parser.add_argument('--contracts-per-client', type=float, default=3.0,
+                            help="mean contracts of a non-Lead client")
+        parser.add_argument('--signed-share', type=float, default=0.6, help="share of Signed contracts")
+        parser.add_argument('--events-per-contract', type=float, default=1.5,
+                            help="mean events of a signed contract, at least the signing one")
+        parser.add_argument('--seed', type=int, default=12)
+        parser.add_argument('--prefix', default='seed', help="prefix of usernames and emails, unique per run")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="clients generated per chunk")
+        parser.add_argument('--no-copy', action='store_true', help="use bulk_create on PostgreSQL too")
+        parser.add_argument('--password', default='seed-password', help="password of the generated users")
+
+    def handle(self, *args, **options):
+        if options['lead_ratio'] + options['inactive_ratio'] > 1:
+            raise CommandError("--lead-ratio and --inactive-ratio add up to more than 1.")
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.now = timezone.now()
+        self.use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        self.inserted = 0
+        self.start = time.perf_counter()
+
+        users = self.create_users()
+        self.sales_ids = users["Sales"]
+        self.support_ids = users["Support"]
+
+        # ids are assigned here, rows of a chunk reference each other without reading them back
+        self.next_ids = {model: (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+                         for model in (Client, Contract, Event)}
+
+        total = options['clients']
+        for offset in range(0, total, options['chunk_size']):
+            size = min(options['chunk_size'], total - offset)
+            with transaction.atomic():
+                self.seed_chunk(offset, size)
+            self.progress(offset + size, total)
+
+        self.reset_sequences()
+        self.stdout.write("Rebuilding the dashboard rollups and the client counters...")
+        rebuild()
+        reconcile(chunk_size=self.options['chunk_size'])
+        invalidate(Client, Contract, Event)
+        invalidate_indexes(Client, Contract, Event)
+
+        elapsed = time.perf_counter() - self.start
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {self.inserted} rows in {elapsed:.1f}s ({self.inserted / elapsed:.0f} rows/s) "
+            f"using {'COPY' if self.use_copy else 'bulk_create'}."))
+        if not isinstance(get_search_backend(), TrigramSearchBackend) and process_local(settings.SEARCH_CACHE_ALIAS):
+            self.stdout.write("The search cache is local to each process, restart the running servers "
+                              "to search the new rows.")
+
+    def create_users(self):
+        """ Return {role name: [user ids]}, users share one password hash"""
+        password = make_password(self.options['password'])
+        users = {}
+        for role_name, option in (("Management", 'management'), ("Sales", 'sales'), ("Support", 'support')):
+            role = Roles.objects.filter(role_name=role_name).first() or Roles.objects.create(role_name=role_name)
+            created = CustomUsers.objects.bulk_create([
+                CustomUsers(username=f"{self.options['prefix']}_{role_name.lower()}_{i}", password=password,
+                            role=role, is_staff=role_name == "Management",
+                            first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES))
+                for i in range(self.options[option])
+            ])
+            # in creation order, the first one of each role is <prefix>_<role>_0
+            users[role_name] = list(CustomUsers.objects.filter(username__in=[user.username for user in created])
+                                    .order_by('id').values_list('id', flat=True))
+            self.inserted += len(created)
+        if not users["Sales"]:
+            raise CommandError("At least one sales user is needed.")
+        return users
+
+    def stamps(self, after=None):
+        """
+            Return (date_created, date_updated) spread over the year before now,
+            after the date_created of the parent row. Kept by COPY, bulk_create
+            stamps the rows with the insert time.
+        """
+        start = after or self.now - timedelta(days=365)
+        created = start + timedelta(seconds=self.rng.uniform(0, (self.now - start).total_seconds()))
+        updated = created + timedelta(seconds=self.rng.uniform(0, (self.now - created).total_seconds()))
+        return created, updated
+
+    def take_id(self, model):
+        value = self.next_ids[model]
+        self.next_ids[model] += 1
+        return value
+
+    def seed_chunk(self, offset, size):
+        rng = self.rng
+        options = self.options
+        clients, contracts, events = [], [], []
+        for number in range(offset, offset + size):
+            draw = rng.random()
+            if draw < options['lead_ratio']:
+                client_status = 'Lead'
+            elif draw < options['lead_ratio'] + options['inactive_ratio']:
+                client_status = 'Inactive'
+            else:
+                client_status = 'Active'
+            client_obj = Client(
+                id=self.take_id(Client), first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                email=f"{options['prefix']}.client{number}@example.com",
+                phone=f"+33 1 {rng.randint(10000000, 99999999)}",
+                company_name=f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}",
+                client_status=client_status, sales_contact_id=rng.choice(self.sales_ids))
+            client_obj.date_created, client_obj.date_updated = self.stamps()
+            clients.append(client_obj)
+            if client_status == 'Lead':
+                continue
+
+            mean = options['contracts_per_client']
+            for _ in range(rng.randint(0, max(0, round(2 * mean)))):
+                signed = rng.random() < options['signed_share']
+                contract_obj = Contract(
+                    id=self.take_id(Contract), client_id=client_obj.id, sales_contact_id=client_obj.sales_contact_id,
+                    contract_status='Signed' if signed else 'Open', amount=round(rng.uniform(500, 50000), 2),
+                    payment_due=self.now + timedelta(days=rng.randint(-180, 365)))
+                contract_obj.date_created, contract_obj.date_updated = self.stamps(after=client_obj.date_created)
+                contracts.append(contract_obj)
+                if signed:
+                    events += self.events_for(contract_obj)
+
+        self.insert(Client, clients)
+        self.insert(Contract, contracts)
+        self.insert(Event, events)
+
+    def events_for(self, contract_obj):
+        rng = self.rng
+        extra = self.options['events_per_contract'] - 1
+        count = 1 + int(extra) + (1 if rng.random() < extra - int(extra) else 0)
+        events = []
+        for index in range(count):
+            event_date = self.now + timedelta(days=rng.randint(-365, 365), hours=rng.randint(8, 20))
+            support_contact_id = rng.choice(self.support_ids) if self.support_ids and rng.random() < 0.8 else None
+            event_obj = Event(
+                id=self.take_id(Event), contract_id=contract_obj.id, support_contact_id=support_contact_id,
+                event_date=event_date, event_completed=event_date < self.now,
+                attendees=rng.randint(10, 500), notes=rng.choice(EVENT_NOTES), signing_event=index == 0)
+            event_obj.date_created, event_obj.date_updated = self.stamps(after=contract_obj.date_created)
+            events.append(event_obj)
+        return events
+
+    def insert(self, model, objects):
+        if not objects:
+            return
+        if self.use_copy:
+            self.copy(model, objects)
+        else:
+            model.objects.bulk_create(objects, batch_size=1000)
+        self.inserted += len(objects)
+
+    def copy(self, model, objects):
+        """ Insert objects with COPY ... FROM STDIN, auto_now values are the ones set on objects"""
+        fields = model._meta.concrete_fields
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objects:
+            row = []
+            for field in fields:
+                value = getattr(obj, field.attname)
+                if value is None:
+                    row.append('\\N')
+                elif isinstance(value, bool):
+                    row.append('t' if value else 'f')
+                else:
+                    row.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+            writer.writerow(row)
+        buffer.seek(0)
+
+        columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+        sql = (f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+               f"FROM STDIN WITH (FORMAT csv, NULL '\\N')")
+        with connection.cursor() as cursor:
+            raw_cursor = cursor.cursor
+            if hasattr(raw_cursor, 'copy_expert'):
+                # psycopg2
+                raw_cursor.copy_expert(sql, buffer)
+            else:
+                # psycopg 3
+                with raw_cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+    def reset_sequences(self):
+        """ Move the id sequences past the ids assigned by the command (PostgreSQL)"""
+        statements = connection.ops.sequence_reset_sql(no_style(), [Client, Contract, Event])
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+    def progress(self, done, total):
+        elapsed = time.perf_counter() - self.start
+        self.stdout.write(f"clients {done}/{total} ({done / total:.0%}), {self.inserted} rows, "
+                          f"{self.inserted / elapsed:.0f} rows/s")
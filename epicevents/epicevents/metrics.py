@@ -0,0 +1,351 @@
+""" Module contains the per-route request metrics and their Prometheus text rendering"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from . import response_cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+ROUTE_LABELS = ('route', 'method')
+# name: (description, buckets, label names)
+HISTOGRAMS = {
+    'epicevents_request_duration_seconds': ("Request latency", LATENCY_BUCKETS, ROUTE_LABELS),
+    'epicevents_request_queries': ("SQL queries per request", QUERY_BUCKETS, ROUTE_LABELS),
+    'epicevents_response_size_bytes': ("Response body size", SIZE_BUCKETS, ROUTE_LABELS),
+    'epicevents_job_wait_seconds': ("Time jobs waited in the queue past their run_at", JOB_BUCKETS, ('job',)),
+    'epicevents_job_duration_seconds': ("Job run time", JOB_BUCKETS, ('job',)),
+}
+# name: (description, label names)
+COUNTERS = {
+    'epicevents_requests_total': ("Requests by status code", ROUTE_LABELS + ('status',)),
+    'epicevents_request_sql_seconds_total': ("Time spent in SQL queries", ROUTE_LABELS),
+    'epicevents_jobs_total': ("Job runs by outcome (done, retry, failed)", ('job', 'outcome')),
+}
+# psycopg_pool get_stats() keys reported per database alias: (metric, type, description)
+POOL_STATS = {
+    'pool_size': ('epicevents_db_pool_connections', 'gauge', "Connections managed by the pool"),
+    'pool_available': ('epicevents_db_pool_available', 'gauge', "Idle connections in the pool"),
+    'requests_waiting': ('epicevents_db_pool_requests_waiting', 'gauge', "Requests waiting for a connection"),
+    'requests_num': ('epicevents_db_pool_requests_total', 'counter', "Connections requested from the pool"),
+    'requests_queued': ('epicevents_db_pool_requests_queued_total', 'counter',
+                        "Requests that had to wait for a connection"),
+    'requests_wait_ms': ('epicevents_db_pool_requests_wait_ms_total', 'counter',
+                         "Time spent waiting for a connection"),
+    'requests_errors': ('epicevents_db_pool_requests_errors_total', 'counter',
+                        "Requests that got no connection (timeout or error)"),
+    'connections_num': ('epicevents_db_pool_connects_total', 'counter', "Connections opened by the pool"),
+    'connections_errors': ('epicevents_db_pool_connect_errors_total', 'counter', "Failed connection attempts"),
+    'connections_lost': ('epicevents_db_pool_connections_lost_total', 'counter',
+                         "Connections found broken by the health check"),
+    'usage_ms': ('epicevents_db_pool_usage_ms_total', 'counter', "Time connections were out of the pool"),
+}
+
+# snapshot the counters of exited processes are folded into, see fold_exited
+EXITED_FILE = 'exited.json'
+
+# [query count, query seconds] of the request being served, see record_query
+sql_stats = ContextVar('sql_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """ Connection execute wrapper adding each query to the current request stats"""
+    stats = sql_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """ connection_created receiver, queries of every thread and async task are counted"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def pool_stats():
+    """ Return {alias: statistics} of the connection pools opened by this process (DB_POOL)"""
+    stats = {}
+    for alias in connections:
+        # read the class level registry, connection.pool would create the pool
+        pool = getattr(connections[alias], '_connection_pools', {}).get(alias)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+class Registry:
+    """
+        In-process counters and histograms keyed by label values.
+        Histograms keep one count per bucket plus sum and count, snapshots
+        are plain JSON so the worker processes can merge them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # the snapshot file is written by the request or job threads and the flushes
+        self.write_lock = threading.Lock()
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.counters = {name: {} for name in COUNTERS}
+        self.last_write = 0.0
+        self.pending = False
+        self.pid = None
+        self.started = None
+
+    def observe_histogram(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        series = self.histograms[name].setdefault(labels, [[0] * len(buckets), 0.0, 0])
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                series[0][index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def increment(self, name, labels, value=1):
+        self.counters[name][labels] = self.counters[name].get(labels, 0) + value
+
+    def observe(self, route, method, status, duration, queries, sql_seconds, size):
+        with self.lock:
+            self.increment('epicevents_requests_total', (route, method, str(status)))
+            self.increment('epicevents_request_sql_seconds_total', (route, method), sql_seconds)
+            self.observe_histogram('epicevents_request_duration_seconds', (route, method), duration)
+            self.observe_histogram('epicevents_request_queries', (route, method), queries)
+            if size is not None:
+                self.observe_histogram('epicevents_response_size_bytes', (route, method), size)
+        self.maybe_write()
+
+    def observe_job(self, job, outcome, wait, duration):
+        with self.lock:
+            self.increment('epicevents_jobs_total', (job, outcome))
+            self.observe_histogram('epicevents_job_wait_seconds', (job,), wait)
+            self.observe_histogram('epicevents_job_duration_seconds', (job,), duration)
+        self.maybe_write()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': {name: [[list(labels), series[0], series[1], series[2]]
+                                      for labels, series in values.items()]
+                               for name, values in self.histograms.items()},
+                'counters': {name: [[list(labels), value] for labels, value in values.items()]
+                             for name, values in self.counters.items()},
+                'search_cache': response_cache.stats(),
+                'db_pools': pool_stats(),
+            }
+
+    def maybe_write(self):
+        """ Write the snapshot of this process to METRICS_MULTIPROC_DIR, at most every interval"""
+        directory = settings.METRICS_MULTIPROC_DIR
+        now = time.monotonic()
+        if not directory:
+            return
+        if now - self.last_write < settings.METRICS_WRITE_INTERVAL:
+            self.pending = True
+            return
+        self.last_write = now
+        self.write(directory)
+
+    def flush(self):
+        """ Write the observations maybe_write held back, e.g. before a job worker goes idle"""
+        if self.pending and settings.METRICS_MULTIPROC_DIR:
+            self.last_write = time.monotonic()
+            self.write(settings.METRICS_MULTIPROC_DIR)
+
+    def file_name(self):
+        """ Return the snapshot file name of this process, '<pid>-<start time>.json'"""
+        pid = os.getpid()
+        if self.pid != pid:
+            # a forked worker or a reused pid never writes over the file of another process
+            self.pid, self.started = pid, time.time_ns()
+        return f"{pid}-{self.started}.json"
+
+    def write(self, directory):
+        with self.write_lock:
+            self.pending = False
+            write_snapshot(os.path.join(directory, self.file_name()), self.snapshot())
+
+
+registry = Registry()
+
+
+def write_on_exit():
+    if settings.METRICS_MULTIPROC_DIR:
+        registry.write(settings.METRICS_MULTIPROC_DIR)
+
+
+atexit.register(write_on_exit)
+
+
+def write_snapshot(path, snapshot):
+    with open(path + ".tmp", 'w') as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    os.replace(path + ".tmp", path)
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as snapshot_file:
+            return json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running under another user
+        return True
+    return True
+
+
+def as_snapshot(metrics):
+    """ Return merged metrics in the snapshot format, the reverse of merge"""
+    return {
+        'histograms': {name: [[list(labels), *series] for labels, series in values.items()]
+                       for name, values in metrics['histograms'].items()},
+        'counters': {name: [[list(labels), value] for labels, value in values.items()]
+                     for name, values in metrics['counters'].items()},
+        'search_cache': metrics['search_cache'],
+        'db_pools': metrics['db_pools'],
+    }
+
+
+def fold_exited(directory):
+    """
+        Fold the snapshots of processes that exited into EXITED_FILE and remove them.
+        Their counters and histograms keep adding to the totals, so these never go
+        down, while their pool gauges are dropped. The folding is serialized
+        across processes with a lock file. Liveness is checked with signal 0,
+        on POSIX only.
+    """
+    if os.name != 'posix':
+        return
+    import fcntl
+
+    with open(os.path.join(directory, 'exited.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        exited, snapshots = [], []
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            pid = os.path.basename(path).split('-')[0].split('.')[0]
+            if not pid.isdigit() or is_alive(int(pid)):
+                continue
+            snapshot = read_snapshot(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+            exited.append(path)
+        if not exited:
+            return
+        exited_path = os.path.join(directory, EXITED_FILE)
+        folded = read_snapshot(exited_path)
+        merged = merge(snapshots + ([folded] if folded else []))
+        for stats in merged['db_pools'].values():
+            for key, (_, metric_type, _) in POOL_STATS.items():
+                if metric_type == 'gauge':
+                    stats[key] = 0
+        write_snapshot(exited_path, as_snapshot(merged))
+        for path in exited:
+            os.remove(path)
+
+
+def collect():
+    """ Return the snapshots of every worker, the live one for this process"""
+    snapshots = [registry.snapshot()]
+    directory = settings.METRICS_MULTIPROC_DIR
+    if directory:
+        own = os.path.join(directory, registry.file_name())
+        fold_exited(directory)
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            if path == own:
+                continue
+            snapshot = read_snapshot(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+    return snapshots
+
+
+def merge(snapshots):
+    """ Sum snapshots into {'histograms': {name: {labels: series}}, 'counters': ..., 'search_cache': ...}"""
+    histograms = {name: {} for name in HISTOGRAMS}
+    counters = {name: {} for name in COUNTERS}
+    search_cache = {}
+    db_pools = {}
+    for snapshot in snapshots:
+        for name, entries in snapshot['histograms'].items():
+            if name not in histograms:
+                # written by a worker running another version
+                continue
+            for labels, counts, total, count in entries:
+                series = histograms[name].setdefault(tuple(labels), [[0] * len(counts), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        for name, entries in snapshot['counters'].items():
+            if name not in counters:
+                continue
+            for labels, value in entries:
+                counters[name][tuple(labels)] = counters[name].get(tuple(labels), 0) + value
+        for endpoint, stats in snapshot.get('search_cache', {}).items():
+            totals = search_cache.setdefault(endpoint, {'hits': 0, 'misses': 0})
+            totals['hits'] += stats['hits']
+            totals['misses'] += stats['misses']
+        for alias, stats in snapshot.get('db_pools', {}).items():
+            totals = db_pools.setdefault(alias, {})
+            for key in POOL_STATS:
+                totals[key] = totals.get(key, 0) + stats.get(key, 0)
+    return {'histograms': histograms, 'counters': counters, 'search_cache': search_cache, 'db_pools': db_pools}
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    return ",".join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in pairs)
+
+
+def render(metrics):
+    """ Return metrics in the Prometheus text exposition format"""
+    lines = []
+    for name, (description, buckets, label_names) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+        for labels, (counts, total, count) in sorted(metrics['histograms'][name].items()):
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{{{_labels(label_names, labels, le=bound)}}} {cumulative}")
+            lines.append(f"{name}_bucket{{{_labels(label_names, labels, le='+Inf')}}} {count}")
+            lines.append(f"{name}_sum{{{_labels(label_names, labels)}}} {total}")
+            lines.append(f"{name}_count{{{_labels(label_names, labels)}}} {count}")
+
+    for name, (description, label_names) in COUNTERS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+        for labels, value in sorted(metrics['counters'][name].items()):
+            lines.append(f"{name}{{{_labels(label_names, labels)}}} {value}")
+
+    name = 'epicevents_search_cache_requests_total'
+    lines += [f"# HELP {name} Search response cache lookups", f"# TYPE {name} counter"]
+    for endpoint, stats in sorted(metrics['search_cache'].items()):
+        lines.append(f"{name}{{{_labels(('endpoint',), (endpoint,), result='hit')}}} {stats['hits']}")
+        lines.append(f"{name}{{{_labels(('endpoint',), (endpoint,), result='miss')}}} {stats['misses']}")
+
+    if metrics['db_pools']:
+        for key, (name, metric_type, description) in POOL_STATS.items():
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+            for alias, stats in sorted(metrics['db_pools'].items()):
+                lines.append(f"{name}{{{_labels(('alias',), (alias,))}}} {stats[key]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,198 @@
+""" Module contains the project middlewares"""
+
+import logging
+import re
+import time
+import uuid
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from . import metrics
+from .log_handlers import request_context
+
+logger = logging.getLogger("epicevents.requests")
+
+REQUEST_ID_RE = re.compile(r'^[\w.-]{1,64}$')
+
+
+class RequestContextMiddleware:
+    """
+        Gives every request an id (the X-Request-ID header when valid, else a
+        new one), echoed in the response. Log records emitted while the
+        request is served carry it, with the user id and the elapsed time,
+        see log_handlers.RequestContextFilter. One access record per request
+        is logged on 'epicevents.requests'.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        return request_id, request_context.set((request_id, request, time.perf_counter()))
+
+    def finish(self, request, response, request_id):
+        response['X-Request-ID'] = request_id
+        logger.info("%s %s %s", request.method, request.get_full_path(), response.status_code)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_id, token = self.start(request)
+        try:
+            return self.finish(request, self.get_response(request), request_id)
+        finally:
+            request_context.reset(token)
+
+    async def __acall__(self, request):
+        request_id, token = self.start(request)
+        try:
+            return self.finish(request, await self.get_response(request), request_id)
+        finally:
+            request_context.reset(token)
+
+
+class MetricsMiddleware:
+    """
+        Records latency, SQL query count and time, response size and status
+        of every request, labelled with its route name (e.g.
+        client-contracts-sign), see metrics.py and /api/metrics.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def finish(self, request, response, start, stats):
+        match = request.resolver_match
+        route = (match.url_name or match.route) if match is not None else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        metrics.registry.observe(route, request.method, response.status_code, time.perf_counter() - start,
+                                 stats[0], stats[1], size)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = [0, 0.0]
+        token = metrics.sql_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            return self.finish(request, self.get_response(request), start, stats)
+        finally:
+            metrics.sql_stats.reset(token)
+
+    async def __acall__(self, request):
+        stats = [0, 0.0]
+        token = metrics.sql_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            return self.finish(request, await self.get_response(request), start, stats)
+        finally:
+            metrics.sql_stats.reset(token)
+
+
+class QueryBudgetExceeded(Exception):
+    """ Raised by QueryBudgetMiddleware when QUERY_BUDGET_MODE is 'raise'"""
+
+
+def query_budget(route, method):
+    """ Return the query budget of route for method, None when it has none"""
+    budgets = settings.QUERY_BUDGETS
+    return budgets.get(f"{route}:{method.lower()}", budgets.get(route))
+
+
+class QueryBudgetMiddleware:
+    """
+        Compares the SQL queries run by each request with the budget of its
+        route in settings.QUERY_BUDGETS. Over budget requests are logged
+        (QUERY_BUDGET_MODE 'warn') or fail (QUERY_BUDGET_MODE 'raise', used
+        by the tests), the middleware does nothing when the mode is 'off'.
+        Queries are counted like MetricsMiddleware does, those run while a
+        streaming body is produced included.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def start(self):
+        """ Return (stats, queries counted so far, token), MetricsMiddleware stats are shared when set"""
+        stats = metrics.sql_stats.get()
+        if stats is not None:
+            return stats, stats[0], None
+        stats = [0, 0.0]
+        return stats, 0, metrics.sql_stats.set(stats)
+
+    def finish(self, request, response, queries):
+        match = request.resolver_match
+        budget = query_budget(match.url_name, request.method) if match is not None else None
+        if budget is None:
+            return response
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.counted(request, response.streaming_content, queries, budget)
+        else:
+            self.check(request, queries, budget)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if settings.QUERY_BUDGET_MODE == 'off':
+            return self.get_response(request)
+        stats, before, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                metrics.sql_stats.reset(token)
+        return self.finish(request, response, stats[0] - before)
+
+    async def __acall__(self, request):
+        if settings.QUERY_BUDGET_MODE == 'off':
+            return await self.get_response(request)
+        stats, before, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                metrics.sql_stats.reset(token)
+        return self.finish(request, response, stats[0] - before)
+
+    def counted(self, request, content, queries, budget):
+        stats = [queries, 0.0]
+        iterator = iter(content)
+        while True:
+            token = metrics.sql_stats.set(stats)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                metrics.sql_stats.reset(token)
+            yield chunk
+        self.check(request, stats[0], budget)
+
+    def check(self, request, queries, budget):
+        if queries <= budget:
+            return
+        message = (f"{request.method} {request.get_full_path()} ({request.resolver_match.url_name}) "
+                   f"ran {queries} queries, its budget is {budget}")
+        if settings.QUERY_BUDGET_MODE == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
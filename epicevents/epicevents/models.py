@@ -0,0 +1,17 @@
+""" Module contains model mixins shared by the apps"""
+
+from django.db import router, transaction
+
+
+class AtomicSaveMixin:
+    """
+        Run save() and its pre_save / post_save receivers in one transaction,
+        so the counters and rollups they maintain commit or roll back with the
+        row. Nested in a caller's transaction no savepoint is made, a failed
+        save fails the whole transaction as multi-table inheritance saves do.
+    """
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
@@ -0,0 +1,171 @@
+""" Module contains pagination classes shared by the API list endpoints"""
+
+import base64
+import datetime
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+from .search import SEARCH_RANK
+
+
+def _cursor_value(value):
+    # full precision, DjangoJSONEncoder would drop the microseconds
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} cannot be stored in a cursor")
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=_cursor_value).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """ Return the ordering values carried by cursor, None when it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def ordering_values(model, ordering, values):
+    """
+        Return the values of a decoded cursor converted by the model fields
+        of ordering (timestamps parsed, ids checked against the integer
+        range), None when they do not fit, e.g. a tampered cursor.
+    """
+    if not isinstance(values, list) or len(values) != len(ordering):
+        return None
+    position = []
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        if value is None or isinstance(value, (bool, list, dict)):
+            return None
+        try:
+            if name == SEARCH_RANK:
+                value = float(value)
+            else:
+                model_field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+                value = model_field.clean(value, None)
+        except (ValidationError, ValueError, TypeError):
+            return None
+        position.append(value)
+    return position
+
+
+def keyset_filter(ordering, values):
+    """
+        Return the Q selecting rows after values in ordering, e.g. for
+        ('-date_updated', '-id'): date_updated < d OR (date_updated = d AND id < i).
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+class DateUpdatedCursorPagination(CursorPagination):
+    """
+        Keyset pagination on (date_updated, id), newest first.
+        - The cursor is opaque and carries the values of every ordering
+          field of the last (or first, for previous) row of the page, so
+          pages are index range scans whatever their depth, and rows sharing
+          a date_updated (bulk writes) are neither repeated nor skipped.
+        - Page size can be asked with ?page_size= up to API_MAX_PAGE_SIZE.
+        - Search results are paginated by relevance (search_rank, id) instead.
+        - Other orderings (?ordering= of OrderingFilter) get id as tie breaker.
+    """
+
+    ordering = ('-date_updated', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        if SEARCH_RANK in queryset.query.annotations:
+            return ('-' + SEARCH_RANK, '-id')
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        reverse, position = self.decode_cursor(request, queryset.model)
+        queryset = self.load_ordering_fields(queryset)
+
+        ordering = reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_following
+        else:
+            self.has_next, self.has_previous = has_following, position is not None
+        # an empty page has no row to start the other direction from
+        self.has_next = self.has_next and bool(self.page)
+        self.has_previous = self.has_previous and bool(self.page)
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def load_ordering_fields(self, queryset):
+        """ Add the ordering columns to a .only() of ?fields=, the cursor reads them"""
+        names, deferred = queryset.query.deferred_loading
+        if deferred or not names:
+            return queryset
+        concrete = {field.name for field in queryset.model._meta.concrete_fields}
+        ordering = {field.lstrip('-') for field in self.ordering} & concrete
+        return queryset.only(*(set(names) | ordering))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor((False, self.position_of(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor((True, self.position_of(self.page[0])))
+
+    def position_of(self, instance):
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def decode_cursor(self, request, model):
+        """ Return (reverse, ordering values) of ?cursor=, (False, None) without one"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+        values = decode_cursor(encoded)
+        if values is None or len(values) != 2 or not isinstance(values[0], bool):
+            raise NotFound(self.invalid_cursor_message)
+        position = ordering_values(model, self.ordering, values[1])
+        if position is None:
+            raise NotFound(self.invalid_cursor_message)
+        return values[0], position
+
+    def encode_cursor(self, cursor):
+        return replace_query_param(self.base_url, self.cursor_query_param, encode_cursor(list(cursor)))
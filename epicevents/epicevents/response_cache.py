@@ -0,0 +1,137 @@
+""" Module contains the response cache of the search endpoints"""
+
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+from .signals import post_bulk_create
+
+VERSION_KEY = "search-cache-version:{}"
+
+# Models whose changes invalidate cached responses
+CACHED_MODELS = ('client.Client', 'contract.Contract', 'event.Event', 'usermodel.CustomUsers')
+
+# Query parameters compared case-insensitively by the search filters
+CASE_INSENSITIVE_PARAMS = {'name', 'email', 'email_contains', 'company_name',
+                           'client_email', 'client_email_contains', 'notes'}
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.SEARCH_CACHE_ALIAS]
+
+
+def model_versions(labels):
+    """ Return the current generation of each model label, in one cache round trip"""
+    cache = get_cache()
+    keys = [VERSION_KEY.format(label) for label in labels]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # start from the clock, an evicted counter never comes back to a used value
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*models):
+    """ Start a new generation for models, cached responses built on them are dropped"""
+    cache = get_cache()
+    for model in models:
+        key = VERSION_KEY.format(model._meta.label)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate_on_commit(sender, **kwargs):
+    """ Signal receiver: invalidate sender once the transaction commits"""
+    transaction.on_commit(lambda: invalidate(sender))
+
+
+def connect_receivers(labels):
+    """ Invalidate the models of labels on post_save, post_delete and post_bulk_create"""
+    for label in labels:
+        model = apps.get_model(label)
+        for signal in (post_save, post_delete, post_bulk_create):
+            signal.connect(invalidate_on_commit, sender=model)
+
+
+def record(name, hit):
+    with _stats_lock:
+        _stats[name]['hits' if hit else 'misses'] += 1
+
+
+def stats():
+    """ Return {viewset basename: {'hits', 'misses', 'hit_ratio'}} of this process"""
+    with _stats_lock:
+        result = {}
+        for name, counters in _stats.items():
+            total = counters['hits'] + counters['misses']
+            result[name] = dict(counters, hit_ratio=round(counters['hits'] / total, 4) if total else 0.0)
+        return result
+
+
+class CachedListMixin:
+    """
+        ViewSet mixin caching list responses per role.
+        The key holds the role (and the user for ?owned=), the normalized
+        query string and the generation of every model in cache_models.
+        Saves and deletes of these models start a new generation through
+        post_save / post_delete / post_bulk_create, so stale entries are
+        never served. The generations are per model, not per owner or
+        query: any write drops every cached search built on that model.
+        Scoping them would need the owners of both the old and new state of
+        each row (and of the counter updates on clients), the coarse
+        generation trades hit ratio for never serving a stale search.
+        The generations live in the SEARCH_CACHE_ALIAS cache, which must
+        be shared when several workers serve the API (see WEB_WORKERS).
+        Each response carries X-Cache: HIT or MISS.
+    """
+
+    # labels of the models the responses are built from
+    cache_models = ()
+
+    def get_cache_key(self, request):
+        params = []
+        for name in sorted(request.query_params):
+            values = sorted(value.strip() for value in request.query_params.getlist(name) if value.strip())
+            if name in CASE_INSENSITIVE_PARAMS:
+                values = [value.casefold() for value in values]
+            if values:
+                params.append(f"{name}={','.join(values)}")
+
+        role_id = getattr(request.user, 'role_id', None)
+        owner = request.user.pk if 'owned' in request.query_params else ''
+        versions = model_versions(self.cache_models)
+        # hashed, query values may hold characters memcached keys cannot
+        digest = hashlib.sha1("&".join(params).encode()).hexdigest()
+        return ":".join(["search-cache", self.basename, str(role_id), str(owner),
+                         ".".join(map(str, versions)), digest])
+
+    def list(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            record(self.basename, hit=True)
+            data, etag = cached
+            response = self.conditional_response(lambda: Response(data), etag, None)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record(self.basename, hit=False)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, (response.data, response['ETag']), timeout=settings.SEARCH_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,260 @@
+""" Module contains pluggable substring search backends used by the search endpoints"""
+
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.utils.module_loading import import_string
+from .signals import post_bulk_create
+
+# Name of the annotation holding the similarity of each row to the search terms
+SEARCH_RANK = 'search_rank'
+
+INDEX_VERSION_KEY = "ngram-index-version:{}"
+
+# Matched primary keys per query of the n-gram backend, below the SQLite parameter limit
+SEARCH_CHUNK_SIZE = 500
+
+
+def index_version(model):
+    """ Return the generation of the n-gram indexes of model, see invalidate_indexes"""
+    return caches[settings.SEARCH_CACHE_ALIAS].get(INDEX_VERSION_KEY.format(model._meta.label))
+
+
+def invalidate_indexes(*models):
+    """
+        Have every process rebuild its n-gram indexes of models on its next
+        search, after writes which send no signal (COPY, another process).
+        Reaches the other processes when the search cache is shared.
+    """
+    cache = caches[settings.SEARCH_CACHE_ALIAS]
+    for model in models:
+        cache.set(INDEX_VERSION_KEY.format(model._meta.label), time.time_ns(), timeout=None)
+
+
+def trigrams(text):
+    """ Return the set of 3-character substrings of a case folded text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class BaseSearchBackend:
+    """
+        Base class of search backends.
+        search(queryset, **terms) keeps the rows whose fields contain every
+        term (case-insensitive substring match, same as icontains) and
+        annotates them with SEARCH_RANK, higher meaning more similar.
+        Terms are keyed by lookup path, e.g. contract__client__company_name.
+        At most settings.SEARCH_MAX_RESULTS best ranked rows are kept, ties
+        broken by id as the list endpoints order them.
+        Search last, once the other filters of the request are applied.
+    """
+
+    def search(self, queryset, **terms):
+        raise NotImplementedError
+
+
+class TrigramSearchBackend(BaseSearchBackend):
+    """
+        PostgreSQL backend.
+        icontains is served by the pg_trgm GIN indexes created in the client
+        and event migrations, rows are ranked with trigram similarity().
+    """
+
+    def search(self, queryset, **terms):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        rank = None
+        for lookup, term in terms.items():
+            queryset = queryset.filter(**{f"{lookup}__icontains": term})
+            similarity = TrigramSimilarity(lookup, term)
+            rank = similarity if rank is None else rank + similarity
+        queryset = queryset.annotate(**{SEARCH_RANK: rank})
+        best = queryset.order_by(f'-{SEARCH_RANK}', '-pk').values('pk')[:settings.SEARCH_MAX_RESULTS]
+        return queryset.filter(pk__in=best)
+
+
+class NgramIndex:
+    """ In-process inverted trigram index of one model field"""
+
+    def __init__(self, model, field_name):
+        self.model = model
+        self.field_name = field_name
+        self.postings = defaultdict(set)
+        self.texts = {}
+        self.built = False
+        self.version = None
+        self.lock = threading.RLock()
+
+    def build(self, version=None):
+        """ Build the index from the table, again when version differs from the one it was built at"""
+        with self.lock:
+            if self.built and self.version == version:
+                return
+            self.postings = defaultdict(set)
+            self.texts = {}
+            rows = self.model._base_manager.values_list('pk', self.field_name)
+            for pk, text in rows.iterator(chunk_size=2000):
+                self._add(pk, text)
+            self.version = version
+            self.built = True
+
+    def _add(self, pk, text):
+        if not text:
+            return
+        text = text.casefold()
+        self.texts[pk] = text
+        for gram in trigrams(text):
+            self.postings[gram].add(pk)
+
+    def _remove(self, pk):
+        text = self.texts.pop(pk, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(pk)
+                if not posting:
+                    del self.postings[gram]
+
+    def update(self, pk, text):
+        with self.lock:
+            if self.built:
+                self._remove(pk)
+                self._add(pk, text)
+
+    def remove(self, pk):
+        with self.lock:
+            if self.built:
+                self._remove(pk)
+
+    def search(self, term, version=None):
+        """ Return {pk: similarity} of the rows containing term"""
+        self.build(version)
+        term = term.casefold()
+        term_grams = trigrams(term)
+        with self.lock:
+            if term_grams:
+                postings = sorted((self.postings.get(gram, set()) for gram in term_grams), key=len)
+                candidates = set.intersection(*postings)
+            else:
+                # Terms shorter than a trigram can only be matched by a scan
+                candidates = self.texts.keys()
+
+            matches = {}
+            for pk in candidates:
+                text = self.texts[pk]
+                if term not in text:
+                    continue
+                text_grams = trigrams(text)
+                union = term_grams | text_grams
+                matches[pk] = len(term_grams & text_grams) / len(union) if union else 1.0
+        return matches
+
+
+class NgramSearchBackend(BaseSearchBackend):
+    """
+        Fallback backend for databases without trigram indexes (SQLite).
+        Every searched field gets an in-process inverted trigram index, built
+        on first use and kept up to date through post_save/post_delete
+        and post_bulk_create, rebuilt after invalidate_indexes.
+        The rows of the queryset, which must already carry the owner and
+        role filters of the request, are read for the primary keys matching
+        the most selective term only, SEARCH_CHUNK_SIZE keys per query.
+    """
+
+    def __init__(self):
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def get_index(self, model, field_name):
+        key = (model._meta.label, field_name)
+        with self.lock:
+            if key not in self.indexes:
+                self.indexes[key] = NgramIndex(model, field_name)
+                self._connect(model)
+            return self.indexes[key]
+
+    def _connect(self, model):
+        dispatch_uid = f"ngram-search-{model._meta.label}"
+        post_save.connect(self._on_save, sender=model, weak=False, dispatch_uid=dispatch_uid)
+        post_delete.connect(self._on_delete, sender=model, weak=False, dispatch_uid=dispatch_uid)
+        post_bulk_create.connect(self._on_bulk_create, sender=model, weak=False, dispatch_uid=dispatch_uid)
+
+    def _indexes_of(self, model):
+        with self.lock:
+            return [index for (label, _), index in self.indexes.items()
+                    if label == model._meta.label]
+
+    def _on_save(self, sender, instance, **kwargs):
+        for index in self._indexes_of(sender):
+            index.update(instance.pk, getattr(instance, index.field_name))
+
+    def _on_bulk_create(self, sender, instances, **kwargs):
+        for index in self._indexes_of(sender):
+            for instance in instances:
+                index.update(instance.pk, getattr(instance, index.field_name))
+
+    def _on_delete(self, sender, instance, **kwargs):
+        for index in self._indexes_of(sender):
+            index.remove(instance.pk)
+
+    def search(self, queryset, **terms):
+        lookups = []
+        matches = []
+        for lookup, term in terms.items():
+            *path, field_name = lookup.split('__')
+            model = queryset.model
+            for part in path:
+                model = model._meta.get_field(part).related_model
+            lookups.append('__'.join(path + ['pk']))
+            matches.append(self.get_index(model, field_name).search(term, index_version(model)))
+
+        # the rows of queryset (its owner and role filters applied) matching every term
+        first = min(range(len(matches)), key=lambda index: len(matches[index]))
+        candidates = sorted(matches[first])
+        rows = queryset.order_by().values_list('pk', *lookups)
+        ranks = {}
+        for start in range(0, len(candidates), SEARCH_CHUNK_SIZE):
+            chunk = candidates[start:start + SEARCH_CHUNK_SIZE]
+            for pk, *related in rows.filter(**{f'{lookups[first]}__in': chunk}):
+                scores = [term_matches.get(related_pk) for term_matches, related_pk in zip(matches, related)]
+                if None not in scores:
+                    ranks[pk] = sum(scores)
+        best = sorted(ranks.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        best = best[:settings.SEARCH_MAX_RESULTS]
+
+        # one branch per distinct rank, similarities are ratios of small trigram counts
+        by_rank = defaultdict(list)
+        for pk, rank in best:
+            by_rank[rank].append(pk)
+        rank = Case(*[When(pk__in=pks, then=Value(rank)) for rank, pks in by_rank.items()],
+                    default=Value(0.0), output_field=FloatField())
+        return queryset.filter(pk__in=[pk for pk, _ in best]).annotate(**{SEARCH_RANK: rank})
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """
+        Return the configured search backend instance.
+        settings.SEARCH_BACKEND is a dotted path, when empty the backend is
+        picked from the database vendor.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            backend_path = settings.SEARCH_BACKEND
+            if not backend_path:
+                if connection.vendor == 'postgresql':
+                    backend_path = 'epicevents.search.TrigramSearchBackend'
+                else:
+                    backend_path = 'epicevents.search.NgramSearchBackend'
+            _backend = import_string(backend_path)()
+        return _backend
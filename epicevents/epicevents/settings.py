@@ -44,6 +44,10 @@ INSTALLED_APPS = [
     'client',
     'contract',
     'event',
+    'dashboard',
+    'jobs',
+    'changefeed',
+    'epicevents',
 ]
 
 AUTH_USER_MODEL = 'usermodel.CustomUsers'
@@ -53,8 +57,141 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'usermodel.authentication.RoleClaimsJWTAuthentication',
         ),
+    'DEFAULT_PAGINATION_CLASS': 'epicevents.pagination.DateUpdatedCursorPagination',
+    'PAGE_SIZE': 25,
+}
+
+# Upper bound for the ?page_size= query parameter of list endpoints
+API_MAX_PAGE_SIZE = 100
+
+# Substring search backend, picked from the database vendor when empty:
+# 'epicevents.search.TrigramSearchBackend' (PostgreSQL, pg_trgm GIN indexes) or
+# 'epicevents.search.NgramSearchBackend' (in-process trigram index, e.g. SQLite)
+SEARCH_BACKEND = None
+# Searches keep their best ranked rows only, with either backend
+SEARCH_MAX_RESULTS = 1000
+
+# Bulk create endpoints: largest accepted array and rows per INSERT
+BULK_CREATE_MAX_ITEMS = 5000
+BULK_CREATE_BATCH_SIZE = 500
+
+# Events then contracts of a deleted client are purged by transactions of this many rows
+CLIENT_PURGE_CHUNK_SIZE = 500
+
+# The change feed (api/changes/<model>/) holds back the changes of the last
+# seconds, and on PostgreSQL those since the oldest open writing transaction:
+# rows stamped before a cursor but committed after it would otherwise be missed
+CHANGE_FEED_LAG = 5
+
+# Support member event streams (api/events/stream/): seconds between heartbeats
+# of an idle stream, messages kept for a slow client before it must resync
+EVENT_STREAM_HEARTBEAT = 15
+EVENT_STREAM_QUEUE_SIZE = 100
+
+# Background jobs (manage.py run_workers): threads per worker process, seconds
+# between polls of an empty queue, retry delays (base * 2 ** (attempt - 1), at
+# most max) and lease of a running job, renewed every third of it by its worker:
+# a job whose lease ran out is taken back from its dead worker
+JOBS_WORKER_THREADS = int(os.environ.get('JOBS_WORKER_THREADS', 4))
+JOBS_POLL_INTERVAL = 1.0
+JOBS_BACKOFF_BASE = 5
+JOBS_BACKOFF_MAX = 600
+JOBS_LEASE_SECONDS = 600
+
+# Rows fetched per database round trip by the streaming export endpoints
+EXPORT_CHUNK_SIZE = 2000
+
+# Worker processes serving the API (gunicorn reads WEB_CONCURRENCY too). With
+# more than one, the caches below must be shared by them, see epicevents.checks
+WEB_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Response cache of the search endpoints. The backend is pluggable, e.g.
+# SEARCH_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# with SEARCH_CACHE_LOCATION=/var/tmp/epicevents-search to share it between workers,
+# the generation counters invalidating its entries are stored in it.
+# The default cache holds the JWT claims versions of the users (role changes,
+# see usermodel.authentication), evicted ones are read again from the database.
+# With several workers point DEFAULT_CACHE_BACKEND and DEFAULT_CACHE_LOCATION
+# to a shared backend too, e.g. Redis.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DEFAULT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DEFAULT_CACHE_LOCATION', ''),
+    },
+    'search': {
+        'BACKEND': os.environ.get('SEARCH_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SEARCH_CACHE_LOCATION', 'epicevents-search'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+SEARCH_CACHE_ALIAS = 'search'
+SEARCH_CACHE_TIMEOUT = 300
+
+# /api/metrics: clients allowed to scrape it, and with several worker processes
+# (gunicorn) a directory shared by them where each one writes its snapshot.
+# Behind a reverse proxy set METRICS_TOKEN, scrapers then send it as a Bearer
+# token; without it the allowed IPs are checked and proxied requests refused.
+# Snapshots of exited processes are folded into one file on each scrape.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_WRITE_INTERVAL = 1.0
+
+# Most SQL queries a request may run, by route name, or "<route name>:<method>"
+# for one method only. Checked by QueryBudgetMiddleware when QUERY_BUDGET_MODE
+# is 'warn' (logged) or 'raise' (request fails, the tests use it), see the
+# QueryBudgetTest of the client, contract, event, changefeed and dashboard apps.
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'off')
+QUERY_BUDGETS = {
+    # reads
+    'clients-list': 1,
+    'clients-detail': 1,
+    'clients-export': 1,
+    'contracts-list': 1,
+    'contracts-detail': 1,
+    'contracts-export': 1,
+    'client-contracts-list': 1,
+    'client-contracts-detail': 1,
+    'events-list': 1,
+    'events-detail': 1,
+    'events-export': 1,
+    'contracts-events-list': 1,
+    'contracts-events-detail': 1,
+    'events-stream': 0,
+    # oldest open transaction (PostgreSQL), updated rows, tombstones
+    'changes': 3,
+    'dashboard': 1,
+    # writes: user, then the rows touched with their rollups, counters and tombstones
+    'clients-list:post': 4,
+    'clients-bulk-create:post': 5,
+    'clients-detail:put': 5,
+    'clients-detail:patch': 3,
+    # contracts and events are purged by a background job
+    'clients-detail:delete': 7,
+    'clients-activate-client:patch': 3,
+    'contracts-list:post': 6,
+    'contracts-detail:put': 8,
+    'contracts-detail:patch': 6,
+    'contracts-detail:delete': 13,
+    'client-contracts-list:post': 7,
+    'client-contracts-bulk-create:post': 7,
+    'client-contracts-detail:put': 8,
+    'client-contracts-detail:patch': 6,
+    'client-contracts-detail:delete': 13,
+    'client-contracts-sign-contract:patch': 12,
+    'events-list:post': 5,
+    'events-detail:put': 7,
+    'events-detail:patch': 4,
+    'events-detail:delete': 6,
+    'contracts-events-list:post': 6,
+    'contracts-events-bulk-create:post': 7,
+    'contracts-events-detail:put': 7,
+    'contracts-events-detail:patch': 4,
+    'contracts-events-detail:delete': 5,
+    'contracts-events-assign-support-member:patch': 8,
 }
 
 JWT_AUTH = {
@@ -67,7 +204,14 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=1),
 }
 
+# Serve GET/HEAD/OPTIONS from the JWT role claims without loading the user,
+# needs a default cache shared by the workers, see epicevents.checks
+JWT_STATELESS_READS = True
+
 MIDDLEWARE = [
+    'epicevents.middleware.RequestContextMiddleware',
+    'epicevents.middleware.MetricsMiddleware',
+    'epicevents.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -104,13 +248,42 @@ WSGI_APPLICATION = 'epicevents.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'epicDB',
-        'USER': 'postgres',
-        'PASSWORD': '1234',
-        'HOST': 'localhost'
+        'NAME': os.environ.get('DB_NAME', 'epicDB'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', '1234'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', ''),
     }
 }
 
+# Connections are reused between requests. With DB_POOL=true each process
+# keeps a psycopg 3 pool (DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE connections,
+# a request waits at most DB_POOL_TIMEOUT seconds for one), checked before
+# being handed out. Otherwise each thread keeps its connection for
+# DB_CONN_MAX_AGE seconds, checked when reused. Pool statistics are part
+# of /api/metrics. Under ASGI (SERVE_ASGI, set by epicevents.asgi) sync code
+# runs in threads that come and go, persistent connections would leak there,
+# so DB_CONN_MAX_AGE defaults to 0; use DB_POOL to reuse connections instead.
+SERVE_ASGI = os.environ.get('SERVE_ASGI', 'false').lower() in ('1', 'true', 'yes')
+DB_POOL = os.environ.get('DB_POOL', 'false').lower() in ('1', 'true', 'yes')
+if DB_POOL:
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+            'check': ConnectionPool.check_connection,
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 0 if SERVE_ASGI else 60))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -152,6 +325,38 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Logging: records are written by a listener thread (LOG_QUEUED), log files
+# rotate by size (LOG_MAX_BYTES) or time (LOG_ROTATION=time, LOG_ROTATE_WHEN)
+# and rotated files are gzipped. With several worker processes each one would
+# rotate the shared files under the others, so LOG_ROTATION=external (the
+# default then) appends through WatchedFileHandler, which reopens a file moved
+# away by logrotate (with its compress option), see epicevents.checks.
+# LOG_FORMAT=json writes one JSON object per line with the request id, user id
+# and latency. LOG_REQUESTS=true adds an access record per request to requests.log.
+LOG_QUEUED = os.environ.get('LOG_QUEUED', 'true').lower() in ('1', 'true', 'yes')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+LOG_REQUESTS = os.environ.get('LOG_REQUESTS', 'false').lower() in ('1', 'true', 'yes')
+LOG_FILE_FORMATTER = 'json' if LOG_FORMAT == 'json' else 'verbose'
+LOG_CONSOLE_FORMATTER = 'json' if LOG_FORMAT == 'json' else 'simple'
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 10))
+LOG_ROTATION = os.environ.get('LOG_ROTATION', 'size' if WEB_WORKERS <= 1 else 'external')
+if LOG_ROTATION == 'external':
+    LOG_FILE_HANDLER = {
+        'class': 'logging.handlers.WatchedFileHandler',
+    }
+elif LOG_ROTATION == 'time':
+    LOG_FILE_HANDLER = {
+        'class': 'epicevents.log_handlers.CompressedTimedRotatingFileHandler',
+        'when': os.environ.get('LOG_ROTATE_WHEN', 'midnight'),
+        'backupCount': LOG_BACKUP_COUNT,
+    }
+else:
+    LOG_FILE_HANDLER = {
+        'class': 'epicevents.log_handlers.CompressedRotatingFileHandler',
+        'maxBytes': int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        'backupCount': LOG_BACKUP_COUNT,
+    }
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -164,42 +369,71 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{'
         },
+        'json': {
+            '()': 'epicevents.log_handlers.JsonFormatter',
+        },
+    },
+    'filters': {
+        'request_context': {
+            '()': 'epicevents.log_handlers.RequestContextFilter',
+        },
     },
     'handlers': {
         'file': {  # app level error will be in epicevents_errors.log
             'level': 'ERROR',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'epicevents_errors.log'),
-            'formatter': 'verbose',
+            '()': 'epicevents.log_handlers.queued',
+            'handler': dict(LOG_FILE_HANDLER, filename=os.path.join(BASE_DIR, 'logs', 'epicevents_errors.log')),
+            'enabled': LOG_QUEUED,
+            'formatter': LOG_FILE_FORMATTER,
+            'filters': ['request_context'],
         },
         'usermodel_file': {  # client app logs will be in usermodel.log
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'usermodel.log'),
-            'formatter': 'verbose',
+            '()': 'epicevents.log_handlers.queued',
+            'handler': dict(LOG_FILE_HANDLER, filename=os.path.join(BASE_DIR, 'logs', 'usermodel.log')),
+            'enabled': LOG_QUEUED,
+            'formatter': LOG_FILE_FORMATTER,
+            'filters': ['request_context'],
         },
         'client_file': {  # client app logs will be in client.log
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'client.log'),
-            'formatter': 'verbose',
+            '()': 'epicevents.log_handlers.queued',
+            'handler': dict(LOG_FILE_HANDLER, filename=os.path.join(BASE_DIR, 'logs', 'client.log')),
+            'enabled': LOG_QUEUED,
+            'formatter': LOG_FILE_FORMATTER,
+            'filters': ['request_context'],
         },
         'contract_file': {  # client app logs will be in contract.log
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'contract.log'),
-            'formatter': 'verbose',
+            '()': 'epicevents.log_handlers.queued',
+            'handler': dict(LOG_FILE_HANDLER, filename=os.path.join(BASE_DIR, 'logs', 'contract.log')),
+            'enabled': LOG_QUEUED,
+            'formatter': LOG_FILE_FORMATTER,
+            'filters': ['request_context'],
         },
         'event_file': {  # client app logs will be in event.log
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'event.log'),
-            'formatter': 'verbose',
+            '()': 'epicevents.log_handlers.queued',
+            'handler': dict(LOG_FILE_HANDLER, filename=os.path.join(BASE_DIR, 'logs', 'event.log')),
+            'enabled': LOG_QUEUED,
+            'formatter': LOG_FILE_FORMATTER,
+            'filters': ['request_context'],
+        },
+        'requests_file': {  # access records will be in requests.log
+            'level': 'INFO',
+            '()': 'epicevents.log_handlers.queued',
+            'handler': dict(LOG_FILE_HANDLER, filename=os.path.join(BASE_DIR, 'logs', 'requests.log'), delay=True),
+            'enabled': LOG_QUEUED,
+            'formatter': LOG_FILE_FORMATTER,
+            'filters': ['request_context'],
         },
         'console': {  # console logging
             'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            '()': 'epicevents.log_handlers.queued',
+            'handler': {'class': 'logging.StreamHandler'},
+            'enabled': LOG_QUEUED,
+            'formatter': LOG_CONSOLE_FORMATTER,
+            'filters': ['request_context'],
         },
     },
     'loggers': {
@@ -228,5 +462,15 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'jobs': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'epicevents.requests': {
+            'handlers': ['requests_file'],
+            'level': 'INFO' if LOG_REQUESTS else 'WARNING',
+            'propagate': False,
+        },
     },
 }
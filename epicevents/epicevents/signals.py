@@ -0,0 +1,33 @@
+""" Module contains project wide custom signals"""
+
+from collections import defaultdict
+from types import SimpleNamespace
+from django.db.models.signals import pre_save
+from django.dispatch import Signal
+
+# Sent after QuerySet.bulk_create, which sends no post_save.
+# Arguments: sender (the model class), instances (the created objects)
+post_bulk_create = Signal()
+
+# Columns which post_save receivers compare with their stored value, by model
+previous_fields = defaultdict(set)
+
+
+def track_previous(model, fields):
+    """ Have instance._previous hold fields of model as stored before each save, None for new rows"""
+    previous_fields[model].update(fields)
+    pre_save.connect(remember_previous, sender=model, dispatch_uid=f'remember-previous-{model._meta.label}')
+
+
+def remember_previous(sender, instance, **kwargs):
+    """
+        Read the tracked columns of the saved row once for every receiver.
+        The row stays locked until the save commits (see AtomicSaveMixin),
+        so concurrent writers compute their deltas one after the other.
+    """
+    instance._previous = None
+    if instance.pk:
+        row = (sender._base_manager.select_for_update().filter(pk=instance.pk)
+               .values(*sorted(previous_fields[sender])).first())
+        if row is not None:
+            instance._previous = SimpleNamespace(**row)
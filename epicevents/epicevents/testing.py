@@ -0,0 +1,162 @@
+""" Module contains the query budget test case shared by the client, contract and event tests"""
+
+import datetime
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from client.models import Client
+from contract.models import Contract
+from event.models import Event
+from usermodel.models import CustomUsers, Roles
+from usermodel.tokens import RoleRefreshToken
+from .middleware import query_budget
+
+# page sizes list routes are requested with, their query count must not change
+LIST_PAGE_SIZES = (1, 10)
+
+
+def router_routes(router):
+    """ Return the (route name, method) of every viewset action registered on router"""
+    routes = []
+    for pattern in router.urls:
+        for method in getattr(pattern.callback, 'actions', {}):
+            if (pattern.name, method) not in routes:
+                routes.append((pattern.name, method))
+    return routes
+
+
+def pk(name):
+    """ URL kwarg of a request spec: the pk of the test case attribute name"""
+    return lambda case: getattr(case, name).pk
+
+
+def _budget_test(route, method):
+    def test(self):
+        self.assert_within_budget(route, method)
+    test.__name__ = f"test_{route.replace('-', '_')}_{method}"
+    test.__doc__ = f"{method.upper()} {route} stays within its query budget"
+    return test
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class QueryBudgetTestCase(TestCase):
+    """
+        Base of the QueryBudgetTest of each app. Subclasses set router and
+        requests, one test is generated per viewset action of router and
+        per (route name, method) of routes, for the views outside routers:
+        - requests maps "<route name>:<method>" to (role name, url kwargs,
+          body) of a valid request. Url kwarg values and the body may be
+          functions of the test case, e.g. pk('client_obj'); a function of
+          the test case may also return the whole tuple.
+        - the request must succeed within settings.QUERY_BUDGETS (enforced
+          by QueryBudgetMiddleware), list routes are sent with every
+          LIST_PAGE_SIZES and must run the same number of queries. Async
+          views are sent through AsyncClient, streams are read up to their
+          first message.
+        New routes fail until they are given a request and a budget.
+    """
+
+    router = None
+    routes = ()
+    requests = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        routes = router_routes(cls.router) if cls.router is not None else []
+        for route, method in routes + list(cls.routes):
+            test = _budget_test(route, method)
+            setattr(cls, test.__name__, test)
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+            Twelve Active clients of one sales user, the first one with
+            three Signed contracts of three events each and one Open contract.
+        """
+        roles = {name: Roles.objects.create(role_name=name) for name in ("Management", "Sales", "Support")}
+        cls.users = {
+            name: CustomUsers.objects.create_user(username=name.lower(), password="pw12345!", role=role,
+                                                  is_staff=name == "Management")
+            for name, role in roles.items()
+        }
+        sales, support = cls.users["Sales"], cls.users["Support"]
+        cls.clients = [Client.objects.create(first_name="First", last_name=f"Last{i}", company_name=f"Company {i}",
+                                             email=f"client{i}@example.com", client_status="Active",
+                                             sales_contact=sales)
+                       for i in range(12)]
+        cls.client_obj = cls.clients[0]
+
+        payment_due = timezone.now() + datetime.timedelta(days=30)
+        cls.signed_contracts = [Contract.objects.create(client=cls.client_obj, sales_contact=sales, amount=1000,
+                                                        payment_due=payment_due, contract_status="Signed")
+                                for _ in range(3)]
+        cls.open_contract = Contract.objects.create(client=cls.client_obj, sales_contact=sales, amount=500,
+                                                    payment_due=payment_due)
+        cls.signed_contract = cls.signed_contracts[0]
+        cls.events = [Event.objects.create(contract=contract, support_contact=support, attendees=10,
+                                           event_date=payment_due, signing_event=i == 0)
+                      for contract in cls.signed_contracts for i in range(3)]
+        cls.event = cls.events[0]
+
+    def setUp(self):
+        # a cached list would answer without any query
+        caches[settings.SEARCH_CACHE_ALIAS].clear()
+
+    def api_client(self, role_name):
+        api_client = APIClient()
+        token = RoleRefreshToken.for_user(self.users[role_name]).access_token
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return api_client
+
+    def get_request(self, key):
+        """ Return (role name, url kwargs, body) of the request of key"""
+        spec = self.requests[key]
+        if callable(spec):
+            return spec(self)
+        role_name, kwargs, data = spec
+        kwargs = {name: value(self) if callable(value) else value for name, value in kwargs.items()}
+        return role_name, kwargs, data(self) if callable(data) else data
+
+    async def send_async(self, role_name, path):
+        """ GET an async view, read the first message of a stream, return the status code"""
+        token = RoleRefreshToken.for_user(self.users[role_name]).access_token
+        response = await AsyncClient().get(path, headers={'Authorization': f"Bearer {token}"})
+        if response.streaming:
+            content = aiter(response.streaming_content)
+            await anext(content)
+            await content.aclose()
+        return response.status_code
+
+    def count_queries(self, role_name, method, path, data):
+        """ Send the request, return its query count, the body of streaming responses included"""
+        api_client = self.api_client(role_name)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(api_client, method)(path, data, format='json')
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {path}: {getattr(response, 'data', '')}")
+        return len(queries)
+
+    def assert_within_budget(self, route, method):
+        key = f"{route}:{method}"
+        self.assertIsNotNone(query_budget(route, method), f"{key} has no budget in settings.QUERY_BUDGETS")
+        self.assertIn(key, self.requests, f"{key} has no request in {type(self).__name__}.requests")
+        role_name, kwargs, data = self.get_request(key)
+        path = reverse(route, kwargs=kwargs)
+
+        if iscoroutinefunction(resolve(path).func):
+            # queries run in the sync_to_async calls, the middleware fails the request over budget
+            self.assertLess(async_to_sync(self.send_async)(role_name, path), 400, f"{method.upper()} {path}")
+        elif method == 'get' and route.endswith('-list'):
+            counts = [self.count_queries(role_name, method, f"{path}?page_size={page_size}", data)
+                      for page_size in LIST_PAGE_SIZES]
+            self.assertEqual(len(set(counts)), 1,
+                             f"{key} query count grows with the page size {LIST_PAGE_SIZES}: {counts}")
+        else:
+            self.count_queries(role_name, method, path, data)
@@ -0,0 +1,297 @@
+import gzip
+import importlib.util
+import logging
+import os
+import runpy
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
+from logging.handlers import WatchedFileHandler
+from django.conf import settings
+from django.core.checks import run_checks
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from client.models import Client
+from contract.models import Contract
+from usermodel.models import CustomUsers, Roles
+from . import log_handlers, metrics, response_cache
+from . import settings as project_settings
+from .checks import check_asgi_connections
+from .log_handlers import CompressedRotatingFileHandler, QueuedHandler, RequestContextFilter, queued
+
+
+class ListHandler(logging.Handler):
+    """ Keeps the formatted records, with the thread which handled them"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+        self.threads.append(threading.current_thread())
+
+
+# Create your tests here.
+class QueuedLoggingTest(SimpleTestCase):
+    """ QueuedHandler and the listener thread writing its records"""
+
+    def setUp(self):
+        self.logger = logging.getLogger(f"epicevents.tests.{self._testMethodName}")
+        self.logger.propagate = False
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def attach(self, handler):
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return handler
+
+    def drain(self):
+        """ Wait for the listener to write out the queued records, then start it again"""
+        log_handlers.stop_listener()
+        log_handlers._start_listener()
+
+    def test_factory(self):
+        handler = queued({'class': 'logging.StreamHandler'})
+        self.addCleanup(handler.close)
+        self.assertIsInstance(handler, QueuedHandler)
+        self.assertIsInstance(handler.target, logging.StreamHandler)
+        self.assertIsInstance(queued({'class': 'logging.NullHandler'}, enabled=False), logging.NullHandler)
+
+    def test_listener_writes(self):
+        target = ListHandler()
+        handler = self.attach(QueuedHandler(target))
+        handler.setLevel(logging.WARNING)
+        handler.setFormatter(logging.Formatter('{levelname} {message}', style='{'))
+        handler.addFilter(RequestContextFilter())
+
+        self.logger.warning("signed %s for %d", "contract", 100)
+        self.logger.info("below the level")
+        self.drain()
+
+        self.assertEqual(target.lines, ["WARNING signed contract for 100"])
+        # formatted and written by the listener, not the logging thread
+        self.assertEqual(len(target.threads), 1)
+        self.assertIsNot(target.threads[0], threading.current_thread())
+        self.assertEqual(target.level, logging.WARNING)
+        self.assertEqual(handler.filters[0].__class__, RequestContextFilter)
+
+    def test_compressed_rotation(self):
+        filename = os.path.join(self.directory.name, "client.log")
+        handler = self.attach(QueuedHandler(CompressedRotatingFileHandler(filename, maxBytes=100, backupCount=2)))
+        for number in range(10):
+            self.logger.error("record %d %s", number, "x" * 20)
+        self.drain()
+
+        self.assertTrue(os.path.exists(filename))
+        with gzip.open(f"{filename}.1.gz", 'rt') as rotated:
+            self.assertIn("record", rotated.read())
+        self.assertFalse(os.path.exists(f"{filename}.3.gz"))
+        self.assertIsInstance(handler.target, CompressedRotatingFileHandler)
+
+    def test_external_rotation(self):
+        filename = os.path.join(self.directory.name, "event.log")
+        target = WatchedFileHandler(filename)
+        self.attach(QueuedHandler(target))
+        self.logger.error("before")
+        self.drain()
+        # moved away by logrotate, the handler reopens the file
+        os.rename(filename, f"{filename}.1")
+        self.logger.error("after")
+        self.drain()
+
+        with open(filename) as current, open(f"{filename}.1") as rotated:
+            self.assertEqual((current.read(), rotated.read()), ("after\n", "before\n"))
+
+    @override_settings(WEB_WORKERS=4, LOG_ROTATION='size')
+    def test_rotation_check(self):
+        self.assertIn('epicevents.E003', [message.id for message in run_checks()])
+        with self.settings(LOG_ROTATION='external'):
+            self.assertNotIn('epicevents.E003', [message.id for message in run_checks()])
+
+
+class ResponseCacheTest(TestCase):
+    """ Cached search responses, their ETags and their invalidation"""
+
+    url = "/api/contracts/"
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Roles.objects.create(role_name="Sales")
+        cls.users = [CustomUsers.objects.create_user(username=f"sales{i}", password="pw12345!", role=role)
+                     for i in range(2)]
+        cls.client_row = Client.objects.create(first_name="First", last_name="Last", email="client@example.com",
+                                               company_name="Acme", sales_contact=cls.users[0])
+        cls.contract = cls.create_contract(cls.users[0])
+
+    @classmethod
+    def create_contract(cls, sales_contact):
+        return Contract.objects.create(client=cls.client_row, sales_contact=sales_contact, amount=100,
+                                       payment_due=timezone.now() + timedelta(days=30))
+
+    def setUp(self):
+        # entries and generations outlive the test transactions
+        response_cache.get_cache().clear()
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.users[0])
+
+    def test_hit(self):
+        first = self.api_client.get(self.url)
+        self.assertEqual(first['X-Cache'], "MISS")
+        with self.assertNumQueries(0):
+            second = self.api_client.get(self.url)
+        self.assertEqual((second['X-Cache'], second['ETag']), ("HIT", first['ETag']))
+        self.assertEqual(second.data, first.data)
+        # same query written differently
+        self.assertEqual(self.api_client.get(f"{self.url}?client_email=CLIENT@example.com")['X-Cache'], "MISS")
+        self.assertEqual(self.api_client.get(f"{self.url}?client_email=%20client@example.com")['X-Cache'], "HIT")
+
+    def test_not_modified(self):
+        etag = self.api_client.get(self.url)['ETag']
+        response = self.api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['X-Cache'], response['ETag']), (304, "HIT", etag))
+        self.assertEqual(self.api_client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_owned(self):
+        self.assertEqual(len(self.api_client.get(f"{self.url}?owned=true").data['results']), 1)
+        self.api_client.force_authenticate(self.users[1])
+        response = self.api_client.get(f"{self.url}?owned=true")
+        self.assertEqual((response['X-Cache'], response.data['results']), ("MISS", []))
+
+    def test_invalidated(self):
+        etag = self.api_client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            contract = self.create_contract(self.users[1])
+        response = self.api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['X-Cache']), (200, "MISS"))
+        self.assertEqual({row['id'] for row in response.data['results']}, {self.contract.pk, contract.pk})
+
+        # a write to a model the responses are built from
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[1].save()
+        self.assertEqual(self.api_client.get(self.url)['X-Cache'], "MISS")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            contract.delete()
+        response = self.api_client.get(self.url)
+        self.assertEqual((response['X-Cache'], len(response.data['results'])), ("MISS", 1))
+        self.assertEqual(self.api_client.get(self.url)['X-Cache'], "HIT")
+
+
+@override_settings(METRICS_MULTIPROC_DIR=None, METRICS_TOKEN='')
+class MetricsTest(TestCase):
+    """ Request metrics recorded by MetricsMiddleware, as /api/metrics exposes them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUsers.objects.create_user(username="sales", password="pw12345!",
+                                                   role=Roles.objects.create(role_name="Sales"))
+        Client.objects.create(first_name="First", last_name="Last", email="client@example.com",
+                              company_name="Acme", sales_contact=cls.user)
+
+    def setUp(self):
+        # a registry of this test only, the other tests observe requests too
+        patcher = mock.patch.object(metrics, 'registry', metrics.Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.user)
+
+    def scrape(self):
+        response = self.client.get("/api/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith("text/plain; version=0.0.4"))
+        return response.content.decode().splitlines()
+
+    def test_request(self):
+        response = self.api_client.get("/api/clients/")
+        size = len(response.content)
+        lines = self.scrape()
+
+        labels = 'route="clients-list",method="GET"'
+        self.assertIn(f'epicevents_requests_total{{{labels},status="200"}} 1', lines)
+        # the page query, the user is authenticated without one
+        self.assertIn(f'epicevents_request_queries_bucket{{{labels},le="0"}} 0', lines)
+        self.assertIn(f'epicevents_request_queries_bucket{{{labels},le="1"}} 1', lines)
+        self.assertIn(f'epicevents_request_queries_bucket{{{labels},le="+Inf"}} 1', lines)
+        self.assertIn(f'epicevents_request_queries_sum{{{labels}}} 1.0', lines)
+        self.assertIn(f'epicevents_request_duration_seconds_count{{{labels}}} 1', lines)
+        self.assertIn(f'epicevents_response_size_bytes_sum{{{labels}}} {float(size)}', lines)
+        bucket = next(bound for bound in metrics.SIZE_BUCKETS if size <= bound)
+        self.assertIn(f'epicevents_response_size_bytes_bucket{{{labels},le="{bucket}"}} 1', lines)
+
+        self.api_client.get("/api/clients/")
+        self.api_client.post("/api/clients/", {})
+        lines = self.scrape()
+        self.assertIn(f'epicevents_requests_total{{{labels},status="200"}} 2', lines)
+        self.assertIn('epicevents_requests_total{route="clients-list",method="POST",status="400"} 1', lines)
+        self.assertIn(f'epicevents_request_duration_seconds_count{{{labels}}} 2', lines)
+
+    def test_unmatched(self):
+        self.assertEqual(self.api_client.get("/api/nothing/here/").status_code, 404)
+        lines = self.scrape()
+        self.assertIn('epicevents_requests_total{route="unmatched",method="GET",status="404"} 1', lines)
+        self.assertIn('epicevents_request_queries_count{route="unmatched",method="GET"} 1', lines)
+        # the scrape itself is counted once rendered
+        self.assertIn('epicevents_requests_total{route="metrics",method="GET",status="200"} 1', self.scrape())
+
+    def test_allowed(self):
+        self.assertEqual(self.client.get("/api/metrics", HTTP_X_FORWARDED_FOR="10.0.0.1").status_code, 403)
+        self.assertEqual(self.client.get("/api/metrics", REMOTE_ADDR="10.0.0.1").status_code, 403)
+        with self.settings(METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get("/api/metrics").status_code, 403)
+            self.assertEqual(self.client.get("/api/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+
+class ConnectionSettingsTest(SimpleTestCase):
+    """ Connection reuse settings read from the environment, and the ASGI check"""
+
+    ENVIRONMENT = ('SERVE_ASGI', 'DB_POOL', 'DB_CONN_MAX_AGE', 'DB_POOL_MIN_SIZE', 'DB_POOL_MAX_SIZE')
+
+    def load(self, **environ):
+        """ Return the default database of the project settings read with environ"""
+        with mock.patch.dict(os.environ):
+            for name in self.ENVIRONMENT:
+                os.environ.pop(name, None)
+            os.environ.update(environ)
+            return runpy.run_path(project_settings.__file__)['DATABASES']['default']
+
+    def test_wsgi(self):
+        database = self.load()
+        self.assertEqual((database['CONN_MAX_AGE'], database['CONN_HEALTH_CHECKS']), (60, True))
+        self.assertEqual(self.load(DB_CONN_MAX_AGE='300')['CONN_MAX_AGE'], 300)
+
+    def test_asgi(self):
+        # sync threads come and go under ASGI, their connections would leak
+        self.assertEqual(self.load(SERVE_ASGI='true')['CONN_MAX_AGE'], 0)
+        self.assertEqual(self.load(SERVE_ASGI='true', DB_CONN_MAX_AGE='30')['CONN_MAX_AGE'], 30)
+        with mock.patch.dict(os.environ):
+            os.environ.pop('SERVE_ASGI', None)
+            runpy.run_module('epicevents.asgi')
+            self.assertEqual(os.environ['SERVE_ASGI'], 'true')
+
+    @skipUnless(importlib.util.find_spec('psycopg_pool'), "psycopg_pool is not installed")
+    def test_pool(self):
+        from psycopg_pool import ConnectionPool
+
+        database = self.load(DB_POOL='true', DB_POOL_MIN_SIZE='1', DB_POOL_MAX_SIZE='4')
+        pool = database['OPTIONS']['pool']
+        self.assertEqual((database['CONN_MAX_AGE'], pool['min_size'], pool['max_size']), (0, 1, 4))
+        self.assertIs(pool['check'], ConnectionPool.check_connection)
+        self.assertNotIn('CONN_HEALTH_CHECKS', database)
+
+    def test_asgi_check(self):
+        with mock.patch.dict(settings.DATABASES['default'], CONN_MAX_AGE=60):
+            with self.settings(SERVE_ASGI=True):
+                [warning] = check_asgi_connections(None)
+                self.assertEqual(warning.id, 'epicevents.W001')
+                self.assertIn("'default'", warning.msg)
+            with self.settings(SERVE_ASGI=False):
+                self.assertEqual(check_asgi_connections(None), [])
+        with mock.patch.dict(settings.DATABASES['default'], CONN_MAX_AGE=0), self.settings(SERVE_ASGI=True):
+            self.assertEqual(check_asgi_connections(None), [])
@@ -3,11 +3,26 @@ URL configuration for epicevents project.
 """
 from django.contrib import admin
 from django.urls import path, include
+from client.views import ClientViewSet
+from contract.views import SearchContractViewSet
+from event.views import SerachEventViewSet
+from .async_views import async_routes
+from .views import SearchCacheStatsView, metrics_view
+
+# async read path, served without a thread per request under ASGI
+async_urlpatterns = (async_routes('clients', ClientViewSet)
+                     + async_routes('contracts', SearchContractViewSet)
+                     + async_routes('events', SerachEventViewSet))
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('usermodel.urls')),
     path('api/', include('client.urls')),
     path('api/', include('contract.urls')),
-    path('api/', include('event.urls'))
+    path('api/', include('event.urls')),
+    path('api/', include('dashboard.urls')),
+    path('api/', include('changefeed.urls')),
+    path('api/async/', include(async_urlpatterns)),
+    path('api/search-cache/stats/', SearchCacheStatsView.as_view(), name='search-cache-stats'),
+    path('api/metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,41 @@
+""" Module contains the project level API views"""
+
+import hmac
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from usermodel.permissions import ManagementPermission
+from . import metrics, response_cache
+
+
+class SearchCacheStatsView(APIView):
+    """ Hit / miss counters of the search response cache, for Management users"""
+
+    permission_classes = [IsAuthenticated, ManagementPermission]
+
+    def get(self, request):
+        return Response(response_cache.stats())
+
+
+def metrics_allowed(request):
+    """
+        With METRICS_TOKEN, the scraper must send it as a Bearer token.
+        Without it, only METRICS_ALLOWED_IPS may scrape, and never through a
+        proxy: behind one REMOTE_ADDR is the proxy address, not the client's.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        return hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', '').encode(), expected.encode())
+    if 'HTTP_X_FORWARDED_FOR' in request.META or 'HTTP_FORWARDED' in request.META:
+        return False
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """ Metrics of every worker in the Prometheus text format, see metrics_allowed"""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    body = metrics.render(metrics.merge(metrics.collect()))
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
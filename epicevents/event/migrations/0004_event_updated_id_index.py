@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contract', '0003_contract_updated_id_index'),
+        ('event', '0003_alter_event_event_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date_updated', 'id'], name='event_updated_id_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:34
+
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    # GIN trigram index serves UPPER(notes) LIKE '%term%' (icontains), PostgreSQL only
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS event_notes_trgm_idx "
+        "ON event_event USING gin (UPPER(notes) gin_trgm_ops)")
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS event_notes_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0005_client_search_indexes'),
+        ('event', '0004_event_updated_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0005_event_notes_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='event_date',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
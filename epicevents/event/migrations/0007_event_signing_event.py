@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contract', '0004_contract_date_indexes'),
+        ('event', '0006_event_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='signing_event',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(condition=models.Q(('signing_event', True)), fields=('contract',), name='event_one_signing_event_per_contract'),
+        ),
+    ]
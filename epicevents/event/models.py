@@ -1,10 +1,24 @@
 from django.db import models
 from usermodel.models import CustomUsers
 from contract.models import Contract
+from epicevents.models import AtomicSaveMixin
+
+
+class EventQuerySet(models.QuerySet):
+    """ Event queryset class"""
+
+    def filter_for_user(self, user):
+        """ Keep the events user may edit, same rules as RoleBasedPermission"""
+        if user.is_staff:
+            return self
+        role = getattr(user, 'role', None)
+        if role is not None and role.role_name == "Support":
+            return self.filter(support_contact_id=user.id)
+        return self.none()
 
 
 # Create your models here.
-class Event(models.Model):
+class Event(AtomicSaveMixin, models.Model):
 
     contract = models.ForeignKey(Contract, on_delete=models.CASCADE, related_name='contract_id')
 
@@ -14,5 +28,19 @@ class Event(models.Model):
     date_updated = models.DateTimeField(auto_now=True)
     event_completed = models.BooleanField(default=False)
     attendees = models.IntegerField(blank=True, null=True)
-    event_date = models.DateTimeField(blank=True, null=True)
+    event_date = models.DateTimeField(blank=True, null=True, db_index=True)
     notes = models.TextField(blank=True, null=True)
+    # set on the event created by signing the contract, at most one per contract
+    signing_event = models.BooleanField(default=False)
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination order of list endpoints
+            models.Index(fields=['date_updated', 'id'], name='event_updated_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['contract'], condition=models.Q(signing_event=True),
+                                    name='event_one_signing_event_per_contract'),
+        ]
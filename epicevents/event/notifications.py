@@ -0,0 +1,117 @@
+""" Module contains the in-process bus pushing event changes to the support contact streams"""
+
+import asyncio
+import itertools
+import threading
+from django.conf import settings
+
+# sent instead of the next message when a subscriber fell behind, its stream then closes
+RESYNC = {'type': 'resync'}
+
+
+class Subscription:
+    """ Messages for one user, read by one stream on the event loop it was opened on"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENT_STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, message):
+        # runs on self.loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout):
+        """ Return the next message, None when nothing came within timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """
+        Publish / subscribe by user id. publish() may be called from any
+        thread, the message is handed to the event loop of each subscriber.
+        In-process only: a stream hears the writes of its own process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+        self.ids = itertools.count(1)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self.lock:
+            self.subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.user_id, None)
+
+    def has_subscribers(self):
+        return bool(self.subscriptions)
+
+    def publish(self, user_id, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(user_id, ()))
+        if not subscriptions:
+            return
+        message = dict(message, id=next(self.ids))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # the loop of a stream is closed, e.g. the server is stopping
+                self.unsubscribe(subscription)
+
+
+bus = EventBus()
+
+
+def event_message(kind, event):
+    return {'type': kind, 'event': event.pk, 'contract': event.contract_id,
+            'event_date': event.event_date.isoformat() if event.event_date else None,
+            'event_completed': event.event_completed}
+
+
+def event_changes(previous, event):
+    """
+        Return the (user id, message) pairs of the changes from previous (a
+        row with support_contact_id, event_date and event_completed, None for
+        a new event) to event.
+    """
+    previous_contact = previous.support_contact_id if previous is not None else None
+    if previous_contact != event.support_contact_id:
+        changes = []
+        if previous_contact is not None:
+            changes.append((previous_contact, event_message('unassigned', event)))
+        if event.support_contact_id is not None:
+            changes.append((event.support_contact_id, event_message('assigned', event)))
+        return changes
+
+    changes = []
+    if event.support_contact_id is not None:
+        if previous.event_date != event.event_date:
+            changes.append((event.support_contact_id, event_message('rescheduled', event)))
+        if not previous.event_completed and event.event_completed:
+            changes.append((event.support_contact_id, event_message('completed', event)))
+    return changes
+
+
+def publish_changes(changes):
+    for user_id, message in changes:
+        bus.publish(user_id, message)
@@ -1,11 +1,23 @@
 """ Module contains class to serialize Evnet data"""
 
 from rest_framework import serializers
+from epicevents.fieldsets import DynamicFieldsMixin
 from .models import Event
 
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """ Event serializer class """
     class Meta:
         model = Event
         fields = "__all__"
+        read_only_fields = ['signing_event']
+        expandable_fields = {
+            'contract': 'contract.serializers.ContractSerializer',
+            'support_contact': 'usermodel.serializers.UserSummarySerializer',
+        }
+
+
+class EventBulkSerializer(EventSerializer):
+    """ Event serializer used by bulk creation, related users are resolved by the viewset"""
+    class Meta(EventSerializer.Meta):
+        read_only_fields = ['contract', 'support_contact', 'signing_event']
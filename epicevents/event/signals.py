@@ -0,0 +1,37 @@
+""" Module contains signal receivers publishing the event changes of support contacts"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from epicevents.signals import post_bulk_create, track_previous
+from .models import Event
+from .notifications import bus, event_changes, event_message, publish_changes
+
+STREAM_FIELDS = ('support_contact_id', 'event_date', 'event_completed')
+
+
+track_previous(Event, STREAM_FIELDS)
+
+
+@receiver(post_save, sender=Event)
+def publish_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if (created or previous is not None) and bus.has_subscribers():
+        changes = event_changes(previous, instance)
+        if changes:
+            transaction.on_commit(lambda: publish_changes(changes))
+
+
+@receiver(post_delete, sender=Event)
+def publish_on_delete(sender, instance, **kwargs):
+    if instance.support_contact_id is not None and bus.has_subscribers():
+        changes = [(instance.support_contact_id, event_message('unassigned', instance))]
+        transaction.on_commit(lambda: publish_changes(changes))
+
+
+@receiver(post_bulk_create, sender=Event)
+def publish_on_bulk_create(sender, instances, **kwargs):
+    if bus.has_subscribers():
+        changes = [change for instance in instances for change in event_changes(None, instance)]
+        if changes:
+            transaction.on_commit(lambda: publish_changes(changes))
@@ -1,3 +1,191 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import threading
+from types import SimpleNamespace
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from client.models import Client
+from contract.models import Contract
+from epicevents.testing import QueryBudgetTestCase, pk
+from usermodel.models import CustomUsers, Roles
+from usermodel.tokens import RoleRefreshToken
+from .models import Event
+from .notifications import RESYNC, bus, event_changes
+from .urls import router
+from .views import SupportStreamView
+
+
+def event_body(case):
+    return {'contract': case.signed_contract.id, 'support_contact': case.users["Support"].id,
+            'attendees': 50, 'event_date': timezone.now().isoformat(), 'notes': "Budget test"}
+
+
+CLIENT_CONTRACT = {'client_id': pk('client_obj'), 'contract_id': pk('signed_contract')}
+CONTRACT_EVENT = dict(CLIENT_CONTRACT, pk=pk('event'))
+
 
 # Create your tests here.
+class QueryBudgetTest(QueryBudgetTestCase):
+    """ Query budgets of the event routes"""
+
+    router = router
+    routes = [('events-stream', 'get')]
+    requests = {
+        'events-list:get': ("Support", {}, None),
+        'events-list:post': ("Management", {}, event_body),
+        'events-export:get': ("Support", {}, None),
+        'events-detail:get': ("Support", {'pk': pk('event')}, None),
+        'events-detail:put': ("Support", {'pk': pk('event')}, event_body),
+        'events-detail:patch': ("Support", {'pk': pk('event')}, {'attendees': 60}),
+        'events-detail:delete': ("Management", {'pk': pk('event')}, None),
+        'contracts-events-list:get': ("Support", CLIENT_CONTRACT, None),
+        'contracts-events-list:post': ("Sales", CLIENT_CONTRACT, event_body),
+        'contracts-events-bulk-create:post': ("Management", CLIENT_CONTRACT,
+                                              lambda case: [event_body(case) for _ in range(5)]),
+        'contracts-events-detail:get': ("Support", CONTRACT_EVENT, None),
+        'contracts-events-detail:put': ("Support", CONTRACT_EVENT, event_body),
+        'contracts-events-detail:patch': ("Support", CONTRACT_EVENT, {'attendees': 60}),
+        'contracts-events-detail:delete': ("Management", CONTRACT_EVENT, None),
+        'contracts-events-assign-support-member:patch': ("Management", CONTRACT_EVENT,
+                                                         lambda case: {'support_contact': case.users["Support"].id}),
+        'events-stream:get': ("Support", {}, None),
+    }
+
+    def setUp(self):
+        super().setUp()
+        # the stream subscription outlives the request in the test client
+        self.addCleanup(bus.subscriptions.clear)
+
+
+class EventChangesTest(SimpleTestCase):
+    """ Messages published for a change of the streamed columns"""
+
+    date = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def row(self, **values):
+        fields = dict(pk=1, contract_id=2, support_contact_id=3, event_date=self.date, event_completed=False)
+        return SimpleNamespace(**dict(fields, **values))
+
+    def kinds(self, previous, event):
+        return [(user_id, message['type']) for user_id, message in event_changes(previous, event)]
+
+    def test_created(self):
+        self.assertEqual(self.kinds(None, self.row()), [(3, 'assigned')])
+        self.assertEqual(self.kinds(None, self.row(support_contact_id=None)), [])
+
+    def test_reassigned(self):
+        self.assertEqual(self.kinds(self.row(), self.row(support_contact_id=4)), [(3, 'unassigned'), (4, 'assigned')])
+
+    def test_rescheduled_and_completed(self):
+        event = self.row(event_date=self.date + datetime.timedelta(days=1), event_completed=True)
+        self.assertEqual(self.kinds(self.row(), event), [(3, 'rescheduled'), (3, 'completed')])
+
+    def test_other_changes(self):
+        self.assertEqual(self.kinds(self.row(), self.row()), [])
+        unassigned = self.row(support_contact_id=None)
+        self.assertEqual(self.kinds(unassigned, self.row(support_contact_id=None, event_completed=True)), [])
+
+    def test_message(self):
+        [(_, message)] = event_changes(None, self.row())
+        self.assertEqual(message, {'type': 'assigned', 'event': 1, 'contract': 2,
+                                   'event_date': self.date.isoformat(), 'event_completed': False})
+
+
+class EventBusTest(SimpleTestCase):
+    """ Messages published from another thread reach the subscriptions of their user only"""
+
+    async def test_publish_from_thread(self):
+        subscription, other = bus.subscribe(1), bus.subscribe(2)
+        try:
+            thread = threading.Thread(target=bus.publish, args=(1, {'type': 'assigned'}))
+            thread.start()
+            thread.join()
+            message = await subscription.get(1)
+            self.assertEqual(message['type'], 'assigned')
+            self.assertIn('id', message)
+            self.assertIsNone(await other.get(0.01))
+        finally:
+            bus.unsubscribe(subscription)
+            bus.unsubscribe(other)
+        self.assertFalse(bus.has_subscribers())
+
+    @override_settings(EVENT_STREAM_QUEUE_SIZE=2)
+    async def test_overflow(self):
+        subscription = bus.subscribe(1)
+        try:
+            for _ in range(4):
+                bus.publish(1, {'type': 'rescheduled'})
+            await asyncio.sleep(0)
+            messages = [await subscription.get(0.01) for _ in range(3)]
+        finally:
+            bus.unsubscribe(subscription)
+        self.assertEqual(messages[0]['type'], 'rescheduled')
+        self.assertIs(messages[1], RESYNC)
+        self.assertIsNone(messages[2])
+
+
+@override_settings(EVENT_STREAM_HEARTBEAT=0.05, QUERY_BUDGET_MODE='raise')
+class SupportStreamTest(TestCase):
+    """ GET events/stream/ of a support member, opened within its query budget"""
+
+    url = "/api/events/stream/"
+
+    @classmethod
+    def setUpTestData(cls):
+        roles = {name: Roles.objects.create(role_name=name) for name in ("Sales", "Support")}
+        cls.users = {name: CustomUsers.objects.create_user(username=name.lower(), password="pw12345!", role=role)
+                     for name, role in roles.items()}
+        client_obj = Client.objects.create(first_name="First", last_name="Last", email="client@example.com",
+                                           company_name="Company", sales_contact=cls.users["Sales"])
+        contract = Contract.objects.create(client=client_obj, sales_contact=cls.users["Sales"], amount=100,
+                                           payment_due=timezone.now(), contract_status="Signed")
+        cls.event = Event.objects.create(contract=contract, attendees=10, event_date=timezone.now())
+
+    def setUp(self):
+        # the test client does not close the stream of test_stream
+        self.addCleanup(bus.subscriptions.clear)
+
+    def headers(self, role_name):
+        return {'Authorization': f"Bearer {RoleRefreshToken.for_user(self.users[role_name]).access_token}"}
+
+    def assign(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.support_contact = self.users["Support"]
+            self.event.save()
+
+    def test_wsgi(self):
+        response = self.client.get(self.url, headers=self.headers("Support"))
+        self.assertEqual(response.status_code, 501)
+
+    async def test_refused(self):
+        async_client = AsyncClient()
+        self.assertEqual((await async_client.get(self.url)).status_code, 401)
+        self.assertEqual((await async_client.get(self.url, headers=self.headers("Sales"))).status_code, 403)
+
+    async def test_stream(self):
+        response = await AsyncClient().get(self.url, headers=self.headers("Support"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+        self.assertEqual(await anext(content), b"event: ready\ndata: {}\n\n")
+        self.assertEqual(await anext(content), b": heartbeat\n\n")
+
+        await sync_to_async(self.assign)()
+        message = await anext(content)
+        while message == b": heartbeat\n\n":
+            message = await anext(content)
+        self.assertIn(b"event: assigned\n", message)
+        self.assertIn(f'"event": {self.event.pk}'.encode(), message)
+        await content.aclose()
+
+    async def test_unsubscribe(self):
+        subscription = bus.subscribe(self.users["Support"].id)
+        stream = SupportStreamView().stream(subscription)
+        await anext(stream)
+        reading = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        reading.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reading
+        self.assertFalse(bus.has_subscribers())
@@ -2,7 +2,7 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import EventViewSet, SerachEventViewSet
+from .views import EventViewSet, SerachEventViewSet, SupportStreamView
 
 router = DefaultRouter()
 router.register('events', SerachEventViewSet, basename='events')
@@ -11,5 +11,7 @@ router.register(r'clients/(?P<client_id>[^/.]+)/contracts/(?P<contract_id>[^/.]+
                 basename='contracts-events')
 
 urlpatterns = [
+    # before the router, events/<pk>/ would match it
+    path('events/stream/', SupportStreamView.as_view(), name='events-stream'),
     path('', include(router.urls))
 ]
@@ -1,94 +1,107 @@
 """ Module contains ViewSets classes for event CRUD and search operations"""
 
+import json
 import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from client.models import Client
 from usermodel.permissions import RoleBasedPermission
 from usermodel.models import CustomUsers
-from contract.models import Contract
+from epicevents.bulk import BulkCreateMixin, referenced_user, user_ids, users_with_role
+from epicevents.conditional import ConditionalGetMixin
+from epicevents.export import ExportMixin
+from epicevents.fieldsets import SparseFieldsetMixin
+from epicevents.filters import filter_date_range, filter_owned
+from epicevents.hierarchy import resolve_hierarchy
+from epicevents.response_cache import CachedListMixin
+from epicevents.search import get_search_backend
 from .models import Event
-from .serializers import EventSerializer
+from .notifications import RESYNC, bus
+from .serializers import EventBulkSerializer, EventSerializer
 
 logger = logging.getLogger("event")
 
 
 # Create your views here.
-class SerachEventViewSet(ModelViewSet):
+class SerachEventViewSet(ExportMixin, CachedListMixin, ConditionalGetMixin, SparseFieldsetMixin, ModelViewSet):
     """ ViewSet for performing search operations """
 
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticated, RoleBasedPermission]
+    cache_models = ('event.Event', 'contract.Contract', 'client.Client', 'usermodel.CustomUsers')
 
     def get_queryset(self):
-        queryset = Event.objects.all()
+        # events of clients being purged are hidden with them
+        queryset = Event.objects.filter(contract__client__is_deleted=False)
 
         company_name = self.request.query_params.get('company_name', None)
         client_email = self.request.query_params.get('client_email', None)
-        event_date = self.request.query_params.get('event_date', None)
+        email_contains = self.request.query_params.get('client_email_contains', None)
+        notes = self.request.query_params.get('notes', None)
 
-        if company_name:
-            queryset = queryset.filter(contract__client__company_name__icontains=company_name)
         if client_email:
             queryset = queryset.filter(contract__client__email__iexact=client_email)
-        if event_date:
-            queryset = queryset.filter(event_date__icontains=event_date)
+        queryset = filter_date_range(queryset, self.request.query_params, 'event_date', 'event_date')
+        queryset = filter_owned(queryset, self.request)
+
+        search_terms = {}
+        if company_name:
+            search_terms['contract__client__company_name'] = company_name
+        if email_contains:
+            search_terms['contract__client__email'] = email_contains
+        if notes:
+            search_terms['notes'] = notes
+        if search_terms:
+            queryset = get_search_backend().search(queryset, **search_terms)
         return queryset
 
 
-class EventViewSet(ModelViewSet):
+class EventViewSet(BulkCreateMixin, ConditionalGetMixin, SparseFieldsetMixin, ModelViewSet):
     """ View set for performing Event CRUD operations"""
     serializer_class = EventSerializer
+    bulk_serializer_class = EventBulkSerializer
     permission_classes = [IsAuthenticated, RoleBasedPermission]
 
     def get_object(self):
         try:
-            return super().get_object()
-        except Event.DoesNotExist:
+            event_obj = resolve_hierarchy(self.request, self.kwargs['client_id'],
+                                          self.kwargs['contract_id'],
+                                          self.kwargs[self.lookup_field]).event
+        except Http404:
             message = "Event with given id does not exist"
             logger.error(message)
-            return Response({"error": message},
-                            status=status.HTTP_404_NOT_FOUND)
+            raise
+        self.check_object_permissions(self.request, event_obj)
+        return event_obj
 
     def get_queryset(self):
         contract_id = self.kwargs['contract_id']
-        queryset = Event.objects.filter(contract__id=contract_id)
-        return queryset
+        queryset = Event.objects.filter(contract_id=contract_id,
+                                        contract__client_id=self.kwargs['client_id'],
+                                        contract__client__is_deleted=False)
+        return filter_owned(queryset, self.request)
 
-    def get_client_obj(self, client_id):
+    def get_contract_obj(self, client_id, contract_id):
         try:
-            client_obj = Client.objects.get(id=client_id)
-        except Client.DoesNotExist:
-            message = "Client with given id does not exist"
+            contract_obj = resolve_hierarchy(self.request, client_id, contract_id).contract
+        except Http404:
+            message = "Contract with given id does not exist for this client"
             logger.error(message)
-            return Response({"error": message},
-                            status=status.HTTP_404_NOT_FOUND)
-        return client_obj
-    
-    def get_contract_obj(self, contract_id):
-        try:
-            contract_obj = Contract.objects.get(id=contract_id)
-        except Contract.DoesNotExist:
-            message = "Contract with given id does not exist"
-            logger.error(message)
-            return Response({"error": message},
-                            status=status.HTTP_404_NOT_FOUND)
+            raise
         return contract_obj
-    
 
     def create(self, request, *args, **kwargs):
-        client_obj = self.get_client_obj(kwargs.get('client_id'))
-
-        if isinstance(client_obj, Response):
-            return client_obj
-
-        contract_obj = self.get_contract_obj(kwargs.get('contract_id'))
-
-        if isinstance(contract_obj, Response):
-            return contract_obj
+        contract_obj = self.get_contract_obj(kwargs.get('client_id'), kwargs.get('contract_id'))
+        client_obj = contract_obj.client
 
         data = request.data.copy()
         if contract_obj.contract_status == "Signed":
@@ -110,7 +123,7 @@ class EventViewSet(ModelViewSet):
                     return Response({"error": message},
                                     status=status.HTTP_400_BAD_REQUEST)
             elif request.user.role.role_name == "Sales":
-                if client_obj.sales_contact != request.user:
+                if client_obj.sales_contact_id != request.user.id:
                     message = "You are not assigned to this client."
                     logger.error(message)
                     return Response({"error": message},
@@ -135,19 +148,43 @@ class EventViewSet(ModelViewSet):
                              "method": "PATCH"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=True, methods=['patch'], url_path="assign-support")
-    def assign_support_member(self, request, client_id=None, contract_id=None, pk=None):
-        """ Function assign support member to an event by management team"""
-        client_obj = self.get_client_obj(client_id)
+    def get_bulk_context(self, request, items):
+        contract_obj = self.get_contract_obj(self.kwargs.get('client_id'), self.kwargs.get('contract_id'))
 
-        if isinstance(client_obj, Response):
-            return client_obj
+        if contract_obj.contract_status != "Signed":
+            message = "Contract is not yet Signed. Please Sign it first"
+            logger.error(message)
+            return Response({"error": message},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        role_name = request.user.role.role_name
+        if role_name == "Sales" and contract_obj.client.sales_contact_id != request.user.id:
+            message = "You are not assigned to this client."
+            logger.error(message)
+            return Response({"error": message},
+                            status=status.HTTP_403_FORBIDDEN)
+        if role_name not in ("Management", "Sales"):
+            message = "You do not have permission to create event."
+            logger.error(message)
+            return Response({"error": message},
+                            status=status.HTTP_403_FORBIDDEN)
 
-        contract_obj = self.get_contract_obj(contract_id)
+        support_ids = users_with_role(user_ids(items, 'support_contact'), "Support")
+        return {'contract': contract_obj, 'role_name': role_name, 'support_ids': support_ids}
 
-        if isinstance(contract_obj, Response):
-            return contract_obj
+    def build_bulk_instance(self, validated_data, item, context):
+        errors = {}
+        support_contact_id = referenced_user(item, 'support_contact', context['support_ids'])
+        if item.get('support_contact') and support_contact_id is None:
+            errors['support_contact'] = ["Invalid Support contact ID."]
+        elif support_contact_id is None and context['role_name'] == "Management":
+            errors['support_contact'] = ["Support contact is required for Management Users."]
+        return Event(contract=context['contract'], support_contact_id=support_contact_id,
+                     **validated_data), errors
 
+    @action(detail=True, methods=['patch'], url_path="assign-support")
+    def assign_support_member(self, request, client_id=None, contract_id=None, pk=None):
+        """ Function assign support member to an event by management team"""
         event_obj = self.get_object()
         if not event_obj.event_completed:
             partial = True
@@ -164,7 +201,7 @@ class EventViewSet(ModelViewSet):
                 support_contact = CustomUsers.objects.get(id=support_contact_id, role__role_name="Support")
                 event_obj.support_contact = support_contact
                 event_obj.save()
-                
+
             except CustomUsers.DoesNotExist:
                 message = "Invalid Support contact ID."
                 logger.error(message)
@@ -178,19 +215,9 @@ class EventViewSet(ModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, *args, **kwargs):
-        client_obj = self.get_client_obj(kwargs.get('client_id'))
-        if isinstance(client_obj, Response):
-            return client_obj
-
-        contract_obj = self.get_contract_obj(kwargs.get('contract_id'))
-        if isinstance(contract_obj, Response):
-            return contract_obj
-        
         event_obj = self.get_object()
-        if isinstance(event_obj, Response):
-            return event_obj
 
-        if request.user != event_obj.support_contact and request.user.role.role_name != 'Management':
+        if event_obj.support_contact_id != request.user.id and request.user.role.role_name != 'Management':
             return Response({"message": "You do not have permission to delete this event, you are not its owner!"},
                             status=status.HTTP_403_FORBIDDEN)
 
@@ -198,4 +225,73 @@ class EventViewSet(ModelViewSet):
         return Response({
                 'Message': 'Event has been deleted successfully'
             }, status=status.HTTP_200_OK)
-    
+
+
+def sse_message(message):
+    """ Format message as a server-sent event, its type as the event name"""
+    data = {key: value for key, value in message.items() if key not in ('id', 'type')}
+    lines = [f"event: {message['type']}", f"data: {json.dumps(data)}"]
+    if 'id' in message:
+        lines.insert(0, f"id: {message['id']}")
+    return "\n".join(lines) + "\n\n"
+
+
+class SupportStreamView(View):
+    """
+        GET events/stream/: server-sent events of the current support member,
+        pushed instead of polling the event list:
+        - assigned / unassigned when an event gets or loses them as support
+          contact (deleting it included), rescheduled when its date moves,
+          completed when it is completed,
+        - data holds event, contract, event_date and event_completed,
+        - a comment line every EVENT_STREAM_HEARTBEAT seconds keeps proxies
+          from closing an idle stream.
+        Changes are not kept while disconnected: the first message, ready (or
+        resync when the stream fell behind, it then closes), tells the client
+        to fetch its events once. The bus is in-process, serve this view with
+        ASGI in the process handling the event writes. Under WSGI (runserver)
+        the whole stream would be buffered by a worker thread forever, the
+        view answers 501 there.
+    """
+
+    http_method_names = ['get']
+
+    def authenticate(self, request):
+        view = APIView()
+        drf_request = view.initialize_request(request)
+        view.perform_authentication(drf_request)
+        return drf_request.user
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"error": "The event stream is only served under ASGI."}, status=501)
+        try:
+            user = await sync_to_async(self.authenticate)(request)
+        except APIException as exc:
+            return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        if not user.is_authenticated:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        role = getattr(user, 'role', None)
+        if role is None or role.role_name != "Support":
+            return JsonResponse({"error": "Only support members have an event stream."}, status=403)
+
+        subscription = bus.subscribe(int(user.id))
+        response = StreamingHttpResponse(self.stream(subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # nginx would buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, subscription):
+        try:
+            yield sse_message({'type': 'ready'})
+            while True:
+                message = await subscription.get(settings.EVENT_STREAM_HEARTBEAT)
+                if message is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield sse_message(message)
+                if message is RESYNC:
+                    break
+        finally:
+            bus.unsubscribe(subscription)
@@ -0,0 +1,67 @@
+""" Module contains the run_workers command"""
+
+import signal
+import subprocess
+import sys
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from epicevents.metrics import registry
+from jobs.runner import Worker, requeue_stale, worker_name
+
+
+class Command(BaseCommand):
+    help = ("Run the queued jobs with --threads worker threads in each of --processes processes, "
+            "until interrupted (SIGINT / SIGTERM) or, with --burst, until the queue is empty.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=settings.JOBS_WORKER_THREADS)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--burst', action='store_true', help="stop once no job is due")
+
+    def handle(self, *args, **options):
+        if options['processes'] > 1:
+            return self.run_processes(options)
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        if not settings.METRICS_MULTIPROC_DIR:
+            self.stderr.write("METRICS_MULTIPROC_DIR is not set, job metrics will not reach /api/metrics "
+                              "of the web workers")
+        requeue_stale()
+        last_requeue = time.monotonic()
+        workers = [Worker(worker_name(index), stop, burst=options['burst']) for index in range(options['threads'])]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"{len(workers)} workers started")
+        while any(worker.is_alive() for worker in workers):
+            if stop.wait(min(settings.METRICS_WRITE_INTERVAL, settings.JOBS_LEASE_SECONDS / 10)):
+                break
+            # the workers only flush once idle, busy ones would hold back their last observations
+            registry.flush()
+            if time.monotonic() - last_requeue >= settings.JOBS_LEASE_SECONDS / 10:
+                requeue_stale()
+                last_requeue = time.monotonic()
+        for worker in workers:
+            # the job being run is finished first
+            worker.join()
+        registry.flush()
+        self.stdout.write("Workers stopped")
+
+    def run_processes(self, options):
+        command = [sys.executable, sys.argv[0], 'run_workers', '--threads', str(options['threads'])]
+        if options['burst']:
+            command.append('--burst')
+        children = [subprocess.Popen(command) for _ in range(options['processes'])]
+
+        def forward(signum, frame):
+            for child in children:
+                child.send_signal(signum)
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, forward)
+        for child in children:
+            child.wait()
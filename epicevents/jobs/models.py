@@ -0,0 +1,53 @@
+""" Module contains Job Schema"""
+
+from django.db import models
+from django.utils import timezone
+
+
+# Create your models here.
+class Job(models.Model):
+    """
+        A call of a registered job function (see jobs.registry) waiting to
+        be run, or its outcome. Workers claim queued jobs whose run_at is
+        past, see jobs.runner.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    # renewed by the worker while the job runs, see jobs.runner.Lease
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # queue order of the workers
+            models.Index(fields=['status', 'run_at', 'id'], name='job_queue_idx'),
+        ]
+
+
+class JobLock(models.Model):
+    """
+        Single row updated first by every claim on databases without
+        SELECT ... FOR UPDATE SKIP LOCKED (SQLite), so claims run one at a time.
+    """
+
+    locked_at = models.DateTimeField(blank=True, null=True)
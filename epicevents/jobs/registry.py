@@ -0,0 +1,56 @@
+""" Module contains the registry of the job functions and the enqueueing of jobs"""
+
+from django.utils import timezone
+from .models import Job
+
+_registry = {}
+
+
+class JobFunction:
+    """ A registered job function, called by the workers with the payload as keyword arguments"""
+
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, **payload):
+        return self.func(**payload)
+
+    def enqueue(self, run_at=None, **payload):
+        return enqueue(self.name, payload, run_at=run_at)
+
+
+def job(name=None, max_attempts=3):
+    """
+        Decorator registering a function as a job, under name (by default
+        its dotted path). Functions must be importable by the workers: they
+        are defined in the jobs.py module of an app, imported at startup.
+    """
+    def register(func):
+        job_name = name or f"{func.__module__}.{func.__qualname__}"
+        if job_name in _registry and _registry[job_name].func is not func:
+            raise ValueError(f"Job {job_name} is already registered")
+        _registry[job_name] = JobFunction(func, job_name, max_attempts)
+        return _registry[job_name]
+    return register
+
+
+def get_job(name):
+    """ Return the JobFunction registered as name, None when there is none"""
+    return _registry.get(name)
+
+
+def enqueue(name, payload=None, run_at=None):
+    """
+        Queue a call of the job registered as name with payload (JSON data).
+        The row is inserted in the current transaction, so the job only runs
+        once the changes it depends on are committed, and not at all after a
+        rollback.
+    """
+    job_function = get_job(name)
+    if job_function is None:
+        raise ValueError(f"Unknown job {name}")
+    return Job.objects.create(name=name, payload=payload or {}, max_attempts=job_function.max_attempts,
+                              run_at=run_at or timezone.now())
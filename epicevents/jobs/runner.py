@@ -0,0 +1,169 @@
+""" Module contains the workers claiming and running the queued jobs"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from epicevents.metrics import registry
+from .models import Job, JobLock
+from .registry import get_job
+
+logger = logging.getLogger("jobs")
+
+
+def claim(worker_name):
+    """
+        Mark the next due job running for worker_name and return it, None
+        when the queue is empty. On PostgreSQL rows locked by other workers
+        are skipped (SELECT ... FOR UPDATE SKIP LOCKED), elsewhere the claim
+        first updates the JobLock row so claims run one at a time.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queued = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            job = queued.select_for_update(skip_locked=True).first()
+        else:
+            if not JobLock.objects.filter(pk=1).update(locked_at=now):
+                JobLock.objects.get_or_create(pk=1)
+            job = queued.first()
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.worker = worker_name
+        job.save(update_fields=['status', 'attempts', 'started_at', 'heartbeat_at', 'worker'])
+    return job
+
+
+def owned(job):
+    """ Queryset of the row of job while this claim of it still holds, requeue_stale ends it"""
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker, attempts=job.attempts)
+
+
+def renew_lease(job):
+    """ Push back the requeue of job by requeue_stale, return False when the job was taken back"""
+    return bool(owned(job).update(heartbeat_at=timezone.now()))
+
+
+class Lease(threading.Thread):
+    """
+        Thread renewing the lease of a running job every third of
+        JOBS_LEASE_SECONDS until done is set, so a job running longer than
+        the lease is not queued again and run twice at once.
+    """
+
+    def __init__(self, job):
+        super().__init__(name=f"lease-{job.pk}", daemon=True)
+        self.job = job
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            while not self.done.wait(settings.JOBS_LEASE_SECONDS / 3):
+                if not renew_lease(self.job) and not self.done.is_set():
+                    logger.warning("Job %s (%s) lost its lease", self.job.pk, self.job.name)
+                    break
+        except Exception:
+            logger.exception("Job %s (%s) lease could not be renewed", self.job.pk, self.job.name)
+        finally:
+            connection.close()
+
+
+def backoff(attempts):
+    """ Return the delay before the retry following attempt number attempts"""
+    return min(settings.JOBS_BACKOFF_MAX, settings.JOBS_BACKOFF_BASE * 2 ** (attempts - 1))
+
+
+def run_job(job):
+    """ Run a claimed job, then record it done, queued again for a retry or failed"""
+    job_function = get_job(job.name)
+    wait = max(0.0, (job.started_at - job.run_at).total_seconds())
+    start = time.perf_counter()
+    lease = Lease(job)
+    lease.start()
+    try:
+        if job_function is None:
+            raise LookupError(f"Unknown job {job.name}")
+        job_function(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job_function is not None and job.attempts < job.max_attempts:
+            outcome = 'retry'
+            updated = owned(job).update(status=Job.QUEUED, last_error=error, worker='',
+                                        run_at=now + timedelta(seconds=backoff(job.attempts)))
+            logger.warning("Job %s (%s) failed, attempt %s of %s", job.pk, job.name, job.attempts,
+                           job.max_attempts)
+        else:
+            outcome = 'failed'
+            updated = owned(job).update(status=Job.FAILED, last_error=error, finished_at=now)
+            logger.error("Job %s (%s) failed after %s attempts\n%s", job.pk, job.name, job.attempts, error)
+    else:
+        outcome = 'done'
+        updated = owned(job).update(status=Job.DONE, finished_at=timezone.now())
+    finally:
+        lease.done.set()
+    if not updated:
+        logger.warning("Job %s (%s) was taken back from %s, its %s outcome is dropped",
+                       job.pk, job.name, job.worker, outcome)
+    registry.observe_job(job.name, outcome, wait, time.perf_counter() - start)
+    return outcome
+
+
+def requeue_stale():
+    """ Queue again the running jobs whose lease was not renewed for JOBS_LEASE_SECONDS, return the count"""
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING,
+                               heartbeat_at__lt=now - timedelta(seconds=settings.JOBS_LEASE_SECONDS))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, last_error="Worker lost")
+    return failed + stale.update(status=Job.QUEUED, worker='', run_at=now)
+
+
+def worker_name(index):
+    """ Return the name of worker thread index, unique across the processes and hosts sharing the queue"""
+    suffix = f"-{os.getpid()}-{index}"
+    max_length = Job._meta.get_field('worker').max_length
+    return socket.gethostname()[:max_length - len(suffix)] + suffix
+
+
+class Worker(threading.Thread):
+    """
+        Thread running jobs until stop is set. Without a due job it sleeps
+        JOBS_POLL_INTERVAL seconds, or returns when burst is set.
+    """
+
+    def __init__(self, name, stop, burst=False):
+        super().__init__(name=name, daemon=True)
+        self.stop = stop
+        self.burst = burst
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    job = claim(self.name)
+                except Exception:
+                    logger.exception("Worker %s could not claim a job", self.name)
+                    self.stop.wait(settings.JOBS_POLL_INTERVAL)
+                    continue
+                if job is None:
+                    registry.flush()
+                    if self.burst:
+                        break
+                    self.stop.wait(settings.JOBS_POLL_INTERVAL)
+                    continue
+                run_job(job)
+        finally:
+            connection.close()
@@ -0,0 +1,115 @@
+import os
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .models import Job
+from .registry import enqueue, job
+from .runner import backoff, claim, renew_lease, requeue_stale, run_job, worker_name
+
+calls = []
+
+
+@job('jobs.tests.record', max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@job('jobs.tests.fail', max_attempts=2)
+def fail():
+    raise ValueError("failed on purpose")
+
+
+# Create your tests here.
+@override_settings(JOBS_BACKOFF_BASE=5, JOBS_BACKOFF_MAX=600, JOBS_LEASE_SECONDS=600)
+class RunnerTest(TestCase):
+    """ Claim, retries and leases of the queued jobs"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_claim(self):
+        later = enqueue('jobs.tests.record', {'value': 2}, run_at=timezone.now() + timedelta(hours=1))
+        due = enqueue('jobs.tests.record', {'value': 1})
+
+        claimed = claim("worker-0")
+        self.assertEqual(claimed.pk, due.pk)
+        due.refresh_from_db()
+        self.assertEqual((due.status, due.attempts, due.worker), (Job.RUNNING, 1, "worker-0"))
+        self.assertIsNotNone(due.heartbeat_at)
+        # running and not yet due jobs are not claimed
+        self.assertIsNone(claim("worker-1"))
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.QUEUED)
+
+    def test_done(self):
+        enqueue('jobs.tests.record', {'value': 1})
+        self.assertEqual(run_job(claim("worker-0")), 'done')
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_backoff(self):
+        self.assertEqual([backoff(attempts) for attempts in (1, 2, 3, 10)], [5, 10, 20, 600])
+
+    def test_retry_then_failed(self):
+        queued = enqueue('jobs.tests.fail')
+        start = timezone.now()
+        self.assertEqual(run_job(claim("worker-0")), 'retry')
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.worker), (Job.QUEUED, ''))
+        self.assertIn("failed on purpose", queued.last_error)
+        self.assertGreaterEqual(queued.run_at, start + timedelta(seconds=5))
+        # not due before its backoff
+        self.assertIsNone(claim("worker-0"))
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(run_job(claim("worker-0")), 'failed')
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_unknown_job_fails(self):
+        Job.objects.create(name='jobs.tests.missing')
+        self.assertEqual(run_job(claim("worker-0")), 'failed')
+        self.assertIn("Unknown job", Job.objects.get().last_error)
+
+    def test_requeue_stale(self):
+        enqueue('jobs.tests.record', {'value': 1})
+        enqueue('jobs.tests.record', {'value': 2})
+        enqueue('jobs.tests.record', {'value': 3})
+        stale, last_attempt, alive = claim("worker-0"), claim("worker-1"), claim("worker-2")
+        expired = timezone.now() - timedelta(seconds=601)
+        Job.objects.filter(pk__in=[stale.pk, last_attempt.pk]).update(heartbeat_at=expired)
+        Job.objects.filter(pk=last_attempt.pk).update(attempts=2)
+
+        self.assertEqual(requeue_stale(), 2)
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {stale.pk: Job.QUEUED, last_attempt.pk: Job.FAILED, alive.pk: Job.RUNNING})
+
+    def test_renewed_lease_is_not_requeued(self):
+        enqueue('jobs.tests.record', {'value': 1})
+        running = claim("worker-0")
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(seconds=601))
+        self.assertTrue(renew_lease(running))
+        self.assertEqual(requeue_stale(), 0)
+
+    def test_requeued_job_outcome_is_dropped(self):
+        enqueue('jobs.tests.record', {'value': 1})
+        first = claim("worker-0")
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(seconds=601))
+        requeue_stale()
+        self.assertFalse(renew_lease(first))
+
+        second = claim("worker-1")
+        run_job(first)
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.worker), (Job.RUNNING, "worker-1"))
+        run_job(second)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_worker_name(self):
+        self.assertEqual(worker_name(3), f"{os.uname().nodename}-{os.getpid()}-3")
+        with mock.patch('socket.gethostname', return_value="h" * 200):
+            name = worker_name(12)
+        self.assertEqual(len(name), Job._meta.get_field('worker').max_length)
+        self.assertTrue(name.endswith(f"h-{os.getpid()}-12"))
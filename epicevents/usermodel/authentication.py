@@ -0,0 +1,136 @@
+""" Module contains JWT authentication class building users from role claims"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from .models import CustomUsers, Roles
+
+CLAIMS_VERSION_KEY = "jwt-claims-version:{}"
+# cached for users who may not authenticate (deleted, inactive), no token carries it
+REVOKED = -1
+
+
+def claims_version_of(user):
+    return user.claims_version if user.is_active else REVOKED
+
+
+def current_claims_version(user_id):
+    """
+        Return the claims_version the tokens of user_id must carry, REVOKED
+        when the user may not authenticate. Read from the default cache, and
+        from the database when the entry is missing or was evicted.
+    """
+    key = CLAIMS_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        user = CustomUsers.objects.filter(pk=user_id).only('claims_version', 'is_active').first()
+        version = REVOKED if user is None else claims_version_of(user)
+        # never overwrites a version published in the meantime
+        cache.add(key, version)
+    return version
+
+
+def remember_claims_version(user):
+    """ Cache the claims version of a user logging in, unless one is already cached"""
+    cache.add(CLAIMS_VERSION_KEY.format(user.pk), claims_version_of(user))
+
+
+def publish_claims_versions(versions):
+    """ Record {user id: claims version} once the change is committed"""
+    cache.set_many({CLAIMS_VERSION_KEY.format(user_id): version for user_id, version in versions.items()})
+
+
+def forget_claims_version(user):
+    """ Drop the cached version of a new user, whose id may have been used by a user since rolled back"""
+    cache.delete(CLAIMS_VERSION_KEY.format(user.pk))
+
+
+class TokenRoleUser(TokenUser):
+    """ Stateless user exposing the role claims as an unsaved Roles instance"""
+
+    @cached_property
+    def role_id(self):
+        return self.token.get('role_id')
+
+    @cached_property
+    def role(self):
+        if self.role_id is None:
+            return None
+        return Roles(id=self.role_id, role_name=self.token.get('role_name'))
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+        JWT authentication trusting the role claims set by RoleRefreshToken.
+        - Safe methods get a TokenRoleUser built from the claims, so reads
+          run no authentication or role query at all.
+        - Other methods load the user with its role in one query.
+        Tokens are rejected as soon as their claims_version differs from the
+        one of the user, bumped by usermodel.signals when its role, staff
+        flag or active state (or the name of its role) changes. Reads check
+        it in the default cache, falling back to the database for evicted
+        entries. With several workers the cache must be shared (e.g. Redis),
+        the epicevents.E002 check refuses to start otherwise. Set
+        JWT_STATELESS_READS = False to always load the user, writes always do.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        if 'role_id' not in validated_token:
+            # token issued before role claims existed
+            return self.get_user(validated_token), validated_token
+
+        if request.method in SAFE_METHODS and settings.JWT_STATELESS_READS:
+            self.check_claims(validated_token)
+            return TokenRoleUser(validated_token), validated_token
+
+        user = self.get_user(validated_token)
+        if claims_version_of(user) != validated_token.get('claims_version', 0):
+            raise AuthenticationFailed("User role has changed, please log in again.",
+                                       code="role_changed")
+        return user, validated_token
+
+    def check_claims(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        version = current_claims_version(user_id)
+        if version == REVOKED:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        # tokens issued before claims versions existed carry the first one
+        if version != validated_token.get('claims_version', 0):
+            raise AuthenticationFailed("User role has changed, please log in again.",
+                                       code="role_changed")
+
+    def get_user(self, validated_token):
+        # load the role with the user, permissions dereference it on every write
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        try:
+            user = self.user_model.objects.select_related('role').get(
+                **{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
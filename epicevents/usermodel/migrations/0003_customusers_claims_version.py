@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usermodel', '0002_alter_customusers_role'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customusers',
+            name='claims_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
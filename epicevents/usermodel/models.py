@@ -2,10 +2,11 @@
 
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group, Permission
+from epicevents.models import AtomicSaveMixin
 
 
 # Create your models here.
-class Roles(models.Model):
+class Roles(AtomicSaveMixin, models.Model):
     """ Role model class"""
 
     role_name = models.CharField(max_length=30)
@@ -14,10 +15,12 @@ class Roles(models.Model):
         return self.role_name
 
 
-class CustomUsers(AbstractUser):
+class CustomUsers(AtomicSaveMixin, AbstractUser):
     """ User model class"""
    
     role = models.ForeignKey(Roles, on_delete=models.CASCADE, related_name='users', blank=True, null=True)
+    # carried by the tokens, bumped when the role claims change to revoke them
+    claims_version = models.PositiveIntegerField(default=0, editable=False)
 
     # to fix conflicts of revers accessor while making migrations
     groups = models.ManyToManyField(Group, related_name='custom_users_groups', blank=True)
@@ -9,6 +9,9 @@ class RoleBasedPermission(BasePermission):
         - Everyon has read-only access to all models.
         - Sales team can edit clients and realted contracts/events
         - Support team can edit events they own.
+        Ownership is checked on the *_id columns, viewsets select_related the
+        client of contracts so no object check runs a query. The same rules
+        are available in SQL through the filter_for_user() querysets.
     """
 
     def has_permission(self, request, view):
@@ -27,17 +30,31 @@ class RoleBasedPermission(BasePermission):
         if request.user.is_staff:
             return True
 
+        role = getattr(request.user, 'role', None)
+        role_name = role.role_name if role is not None else None
+
         # Sales team can edit clients and related contracts/events
-        if request.user.role.role_name == "Sales":
-            if hasattr(obj, "sales_contact") and obj.sales_contact == request.user:
+        if role_name == "Sales":
+            if hasattr(obj, "sales_contact_id") and obj.sales_contact_id == request.user.id:
                 return True
 
-            if hasattr(obj, "client") and obj.client.sales_contact == request.user:
+            # Client has a client_id attribute too, its reverse accessor of contracts
+            if hasattr(obj, "client") and obj.client.sales_contact_id == request.user.id:
                 return True
 
         # Support team can only edit events they own.
-        if request.user.role.role_name == "Support":
-            if hasattr(obj, "support_contact") and obj.support_contact == request.user:
+        if role_name == "Support":
+            if hasattr(obj, "support_contact_id") and obj.support_contact_id == request.user.id:
                 return True
 
         return False
+
+
+class ManagementPermission(BasePermission):
+    """ Only Management users and staff, for the reporting endpoints"""
+
+    def has_permission(self, request, view):
+        if request.user.is_staff:
+            return True
+        role = getattr(request.user, 'role', None)
+        return role is not None and role.role_name == "Management"
@@ -0,0 +1,12 @@
+""" Module contains class to serialize user data"""
+
+from rest_framework import serializers
+from .models import CustomUsers
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """ Public summary of a team member, used to expand sales/support contacts"""
+
+    class Meta:
+        model = CustomUsers
+        fields = ['id', 'username', 'first_name', 'last_name', 'email']
@@ -0,0 +1,55 @@
+""" Module contains signal receivers keeping JWT role claims revocable"""
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from epicevents.signals import track_previous
+from .authentication import REVOKED, forget_claims_version, publish_claims_versions
+from .models import CustomUsers, Roles
+
+
+CLAIM_FIELDS = ('role_id', 'is_staff', 'is_active')
+
+track_previous(CustomUsers, CLAIM_FIELDS + ('claims_version',))
+track_previous(Roles, ('role_name',))
+
+
+@receiver(pre_save, sender=CustomUsers)
+def keep_stored_claims_version(sender, instance, **kwargs):
+    """ Never write back the claims_version of an instance loaded before a bump"""
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        instance.claims_version = previous.claims_version
+
+
+@receiver(post_save, sender=CustomUsers)
+def bump_changed_user_claims(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        forget_claims_version(instance)
+        return
+    if any(getattr(previous, field) != getattr(instance, field) for field in CLAIM_FIELDS):
+        # the row is locked since pre_save, previous.claims_version is the stored one
+        sender.objects.filter(pk=instance.pk).update(claims_version=F('claims_version') + 1)
+        instance.claims_version = previous.claims_version + 1
+        versions = {instance.pk: instance.claims_version if instance.is_active else REVOKED}
+        transaction.on_commit(lambda: publish_claims_versions(versions))
+
+
+@receiver(post_delete, sender=CustomUsers)
+def revoke_deleted_user_claims(sender, instance, **kwargs):
+    versions = {instance.pk: REVOKED}
+    transaction.on_commit(lambda: publish_claims_versions(versions))
+
+
+@receiver(post_save, sender=Roles)
+def bump_renamed_role_claims(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None or previous.role_name == instance.role_name:
+        return
+    users = CustomUsers.objects.filter(role_id=instance.pk)
+    users.update(claims_version=F('claims_version') + 1)
+    versions = {pk: version if is_active else REVOKED
+                for pk, version, is_active in users.values_list('pk', 'claims_version', 'is_active')}
+    transaction.on_commit(lambda: publish_claims_versions(versions))
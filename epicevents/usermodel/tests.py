@@ -1,3 +1,179 @@
+from types import SimpleNamespace
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from client.models import Client
+from contract.models import Contract
+from event.models import Event
+from .models import CustomUsers, Roles
+from .permissions import RoleBasedPermission
+from .tokens import RoleRefreshToken
+
 
 # Create your tests here.
+class RoleClaimsTest(TestCase):
+    """ Role claims of the login tokens, and their revocation by claims_version"""
+
+    url = "/api/clients/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sales = Roles.objects.create(role_name="Sales")
+        cls.support = Roles.objects.create(role_name="Support")
+        cls.user = CustomUsers.objects.create_user(username="sales", password="pw12345!", role=cls.sales)
+
+    def setUp(self):
+        # versions published by the previous tests outlive their rollback
+        cache.clear()
+        self.api_client = APIClient()
+        response = self.api_client.post("/api/login/", {'username': "sales", 'password': "pw12345!"})
+        self.assertEqual(response.status_code, 200)
+        self.token = response.data['access']
+        self.api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+    def change(self, instance, **fields):
+        """ Save fields of instance and publish the change as its commit would"""
+        for name, value in fields.items():
+            setattr(instance, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+
+    def assertRevoked(self, code="role_changed"):
+        response = self.api_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], code)
+
+    def test_claims(self):
+        token = AccessToken(self.token)
+        self.assertEqual((token['role_id'], token['role_name'], token['is_staff'], token['claims_version']),
+                         (self.sales.pk, "Sales", False, 0))
+
+    def test_stateless_read(self):
+        # the list query only, no user or role query
+        with self.assertNumQueries(1):
+            self.assertEqual(self.api_client.get(self.url).status_code, 200)
+
+    def test_evicted_version(self):
+        cache.clear()
+        # read again from the database, then cached
+        with self.assertNumQueries(2):
+            self.assertEqual(self.api_client.get(self.url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.api_client.get(self.url).status_code, 200)
+
+    def test_role_change(self):
+        self.change(self.user, role=self.support)
+        self.assertEqual(CustomUsers.objects.get(pk=self.user.pk).claims_version, 1)
+        self.assertRevoked()
+        # still revoked once the cached version is evicted
+        cache.clear()
+        self.assertRevoked()
+        # and on the write path, which loads the user
+        response = self.api_client.post(self.url, {})
+        self.assertEqual((response.status_code, response.data['code']), (401, "role_changed"))
+
+        token = RoleRefreshToken.for_user(self.user).access_token
+        self.api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(self.api_client.get("/api/events/").status_code, 200)
+
+    def test_unchanged_claims(self):
+        self.change(self.user, first_name="First")
+        self.assertEqual(CustomUsers.objects.get(pk=self.user.pk).claims_version, 0)
+        self.assertEqual(self.api_client.get(self.url).status_code, 200)
+
+    def test_stale_instance(self):
+        stale = CustomUsers.objects.get(pk=self.user.pk)
+        self.change(self.user, role=self.support)
+        self.change(self.user, role=self.sales)
+        # saving a copy loaded before the changes keeps the bumped version
+        self.change(stale, first_name="First")
+        self.assertEqual(CustomUsers.objects.get(pk=self.user.pk).claims_version, 2)
+        cache.clear()
+        self.assertRevoked()
+
+    def test_role_rename(self):
+        self.change(self.sales, role_name="Sales team")
+        self.assertRevoked()
+
+    def test_deactivated(self):
+        self.change(self.user, is_active=False)
+        self.assertRevoked("user_inactive")
+        cache.clear()
+        self.assertRevoked("user_inactive")
+
+    def test_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertRevoked("user_inactive")
+        cache.clear()
+        self.assertRevoked("user_inactive")
+
+
+class OwnershipTest(TestCase):
+    """ RoleBasedPermission object checks and the filter_for_user() querysets agree"""
+
+    @classmethod
+    def setUpTestData(cls):
+        roles = {name: Roles.objects.create(role_name=name) for name in ("Management", "Sales", "Support")}
+        cls.users = [CustomUsers.objects.create_user(username="manager", password="pw12345!",
+                                                     role=roles["Management"], is_staff=True)]
+        cls.users += [CustomUsers.objects.create_user(username=f"{name.lower()}{i}", password="pw12345!",
+                                                      role=roles[name])
+                      for name in ("Sales", "Support") for i in range(2)]
+        cls.users.append(CustomUsers.objects.create_user(username="norole", password="pw12345!"))
+        _, sales0, sales1, support0, support1, _ = cls.users
+
+        clients = [Client.objects.create(first_name="a", last_name="b", email=f"client{i}@example.com",
+                                         company_name="Company", sales_contact=sales)
+                   for i, sales in enumerate((sales0, sales1))]
+        due = timezone.now()
+        # the contract of sales1 on a client of sales0, both may edit it
+        contracts = [Contract.objects.create(client=clients[0], sales_contact=sales0, amount=1, payment_due=due),
+                     Contract.objects.create(client=clients[0], sales_contact=sales1, amount=1, payment_due=due),
+                     Contract.objects.create(client=clients[1], sales_contact=sales1, amount=1, payment_due=due)]
+        for contract, support in zip(contracts, (support0, support1, None)):
+            Event.objects.create(contract=contract, support_contact=support)
+
+    def allowed(self, user, queryset):
+        """ Return the pks of queryset user may change, by the object permission"""
+        request = SimpleNamespace(method='PATCH', user=user)
+        permission = RoleBasedPermission()
+        return {obj.pk for obj in queryset if permission.has_object_permission(request, None, obj)}
+
+    def test_filter_for_user(self):
+        for model, queryset in ((Client, Client.objects.all()),
+                                (Contract, Contract.objects.select_related('client')),
+                                (Event, Event.objects.all())):
+            rows = list(queryset)
+            for user in self.users:
+                with self.subTest(model=model.__name__, user=user.username):
+                    # the *_id columns are compared, no related row is read
+                    with self.assertNumQueries(0):
+                        allowed = self.allowed(user, rows)
+                    self.assertEqual(set(model.objects.filter_for_user(user).values_list('pk', flat=True)), allowed)
+
+    def test_owners(self):
+        manager, sales0, sales1, support0, support1, norole = self.users
+        contracts = Contract.objects.select_related('client').order_by('pk')
+        self.assertEqual(self.allowed(sales0, Client.objects.all()), {Client.objects.get(sales_contact=sales0).pk})
+        first, second, third = contracts
+        # owner of the client, or of the contract on another's client
+        self.assertEqual(self.allowed(sales0, contracts), {first.pk, second.pk})
+        self.assertEqual(self.allowed(sales1, contracts), {second.pk, third.pk})
+        self.assertEqual(self.allowed(support1, Event.objects.all()), {Event.objects.get(support_contact=support1).pk})
+        self.assertEqual(self.allowed(sales0, Event.objects.all()), set())
+        self.assertEqual(self.allowed(norole, contracts), set())
+        self.assertEqual(len(self.allowed(manager, Event.objects.all())), 3)
+
+    def test_other_sales_client(self):
+        api_client = APIClient()
+        api_client.force_authenticate(self.users[2])
+        client_obj = Client.objects.get(sales_contact=self.users[1])
+        response = api_client.patch(f"/api/clients/{client_obj.pk}/", {'company_name': "Taken"}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_read_only(self):
+        request = SimpleNamespace(method='GET', user=self.users[3])
+        self.assertTrue(RoleBasedPermission().has_object_permission(request, None, Client.objects.first()))
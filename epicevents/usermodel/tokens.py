@@ -0,0 +1,23 @@
+""" Module contains JWT token classes carrying the user role as claims"""
+
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import remember_claims_version
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+        Refresh token embedding role_id, role_name, is_staff and
+        claims_version claims. The claims are copied to the access token,
+        which lets RoleClaimsJWTAuthentication serve reads without loading
+        the user.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['role_id'] = user.role_id
+        token['role_name'] = user.role.role_name if user.role_id else None
+        token['is_staff'] = user.is_staff
+        token['claims_version'] = user.claims_version
+        remember_claims_version(user)
+        return token
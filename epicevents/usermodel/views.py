@@ -7,8 +7,8 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from .models import CustomUsers
+from .tokens import RoleRefreshToken
 
 app_logger = logging.getLogger("epicevents")
 logger = logging.getLogger("usermodel")
@@ -49,7 +49,7 @@ class TeamLoginView(APIView):
                 "error": "Invalid Credentials"
             }, status=status.HTTP_401_UNAUTHORIZED)
 
-        refresh_token = RefreshToken.for_user(user)
+        refresh_token = RoleRefreshToken.for_user(user)
         logger.info("'%s' logged-in successfully !!", user.get_username())
         return Response({
                     'refresh_token': str(refresh_token),